@@ -19,6 +19,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.tabs.setTabsClosable(True)
         self.tabs.tabCloseRequested.connect(self.tabs.removeTab)
         self.setCentralWidget(self.tabs)
+        self.setStatusBar(QtWidgets.QStatusBar())
         # NOTE: some actions should be disabled when no maptabs are open
         # TODO: add a method to connect self.actions to the active tab
         # & connect this method to self.tabs.currentChanged(...)
@@ -249,6 +250,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self.actions["View/Settings"] = view_menu.addAction("&OpenGL Settings")
         self.actions["View/Settings"].setEnabled(False)
         # self.actions["View/Settings"].triggered.connect(ui.
+        self.actions["View/Frame Stats"] = view_menu.addAction("&Frame Stats")
+        self.actions["View/Frame Stats"].setCheckable(True)
+        self.actions["View/Frame Stats"].triggered.connect(self.show_frame_stats)
+        self.tabs.currentChanged.connect(self.sync_frame_stats)
         open_url = QtGui.QDesktopServices.openUrl
         help_menu = self.main_menu.addMenu("&Help")
         self.actions["Help/Offline"] = help_menu.addAction("Offline Help")
@@ -309,6 +314,19 @@ class MainWindow(QtWidgets.QMainWindow):
         # cut copy paste | cordon | TL <TL> | DD 3D DW DA |
         # compile helpers 2D_models fade CM prop_detail NO_DRAW
 
+    def show_frame_stats(self, visible):
+        """Toggle the CPU / GPU timings overlay on the active tab's viewport"""
+        tab = self.tabs.currentWidget()
+        if tab is None:
+            self.actions["View/Frame Stats"].setChecked(False)
+            return
+        tab.viewport.set_frame_stats_visible(visible)
+
+    def sync_frame_stats(self, index):
+        tab = self.tabs.widget(index)
+        visible = tab is not None and not tab.viewport.frame_stats.isHidden()
+        self.actions["View/Frame Stats"].setChecked(visible)
+
     def open(self, filename):  # allows loading via drag & drop
         raw_filename, extension = os.path.splitext(filename)
         short_filename = os.path.basename(filename)
@@ -1,12 +1,16 @@
+import concurrent.futures
+import functools
 import math
+import multiprocessing
 import os
+import time
 
 import OpenGL.GL as gl
-from OpenGL.GLU import gluPerspective
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 from ..utilities import camera
 from ..utilities import render
+from ..utilities.render.profiler import format_stats
 from ..utilities import vector
 
 
@@ -18,21 +22,55 @@ camera.keybinds = {camera.FORWARD: [QtCore.Qt.Key_W],
                    camera.DOWN: [QtCore.Qt.Key_E]}
 
 view_modes = ["flat", "textured", "wireframe"]
+render_modes = {"flat": "flat", "textured": "textured", "wireframe": "flat"}
+# ^ {view_mode: render_manager.render_mode}
 # "silhouette" view mode, lights on flat gray brushwork & props
 
 
-class MapViewport3D(QtWidgets.QOpenGLWidget):  # initialised in ui/tabs.py
+def new_render_manager():
+    """A render.Manager for one map, configured from preferences; share it between that map's viewports"""
+    preferences = QtWidgets.QApplication.instance().preferences
+    draw_distance = float(preferences.value("Viewports/DrawDistance", "4096"))
+    field_of_view = float(preferences.value("Viewports/FieldOfView", "90"))
+    memory_limit = int(preferences.value("Viewports/MemoryLimit", "128"))  # Megabytes
+    upload_budget = float(preferences.value("Viewports/UploadBudget", "4"))  # milliseconds per frame
+    base_vertex = QtGui.QOpenGLContext.openGLModuleType() == QtGui.QOpenGLContext.LibGL
+    # ^ GLES can't draw with base vertex; known before any viewport has a context
+    workers = preferences.value("Viewports/BufferizeWorkers", "auto")
+    workers = max(os.cpu_count() - 1, 1) if workers == "auto" else int(workers)
+    # ^ leaves a core for the UI; 0 bufferizes on the UI thread
+    render_manager = render.Manager(draw_distance, field_of_view, memory_limit, upload_budget, base_vertex,
+                                    bufferize_pool(workers))
+    cache_folder = QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.CacheLocation)
+    render_manager.shader_cache.folder = os.path.join(cache_folder, "shaders")
+    # ^ linked shader programs are reused between tabs & launches
+    return render_manager
+
+
+@functools.lru_cache(maxsize=None)
+def bufferize_pool(workers):
+    """Worker processes shared by every map, bufferizing brushes while the UI stays responsive; None if workers is 0"""
+    if workers == 0:
+        return None
+    return concurrent.futures.ProcessPoolExecutor(workers, multiprocessing.get_context("spawn"))
+    # ^ spawned, not forked; a fork would copy Qt's threads & OpenGL state into each worker
+
+
+class MapViewport3D(QtWidgets.QOpenGLWidget):  # initialised in ui/workspace.py
     raycast = QtCore.pyqtSignal(vector.vec3, vector.vec3)  # emits ray
+    picked = QtCore.pyqtSignal(object)  # emits render.picking.Pick, when gpu_picking is on
+    upload_progress = QtCore.pyqtSignal(object)  # emits render.upload.UploadProgress while loading
 
-    def __init__(self, parent=None, fps=60):
+    def __init__(self, render_manager, parent=None, fps=60):
         super(MapViewport3D, self).__init__(parent=parent)
         preferences = QtWidgets.QApplication.instance().preferences
         camera.sensitivity = float(preferences.value("Input/MouseSensitivity", "2.0"))
         # ^ camera sensitivity cannot be set until the app is active
-        draw_distance = float(preferences.value("Viewports/DrawDistance", "4096"))
-        field_of_view = float(preferences.value("Viewports/FieldOfView", "90"))
-        memory_limit = int(preferences.value("Viewports/MemoryLimit", "128"))  # Megabytes
-        self.render_manager = render.Manager(draw_distance, field_of_view, memory_limit)
+        self.render_manager = render_manager
+        # ^ shared by every viewport of the same map, see new_render_manager
+        self.view = render.View(render_manager)
+        # ^ this viewport's camera matrices, render mode & per-context GL objects
+        self.view.on_change = self.schedule_frame
         # uniform scaled & tinted cuboids to substitute model bounds at a distance...
         # INPUT HANDLING
         self.camera = camera.freecam((0, 0, 0), (0, 0, 0), 16)
@@ -45,19 +83,44 @@ class MapViewport3D(QtWidgets.QOpenGLWidget):  # initialised in ui/tabs.py
         self.mouse_vector = vector.vec2()
         self.setFocusPolicy(QtCore.Qt.ClickFocus)
         # ^ to get mouse inputs, user must click on the viewport
-        # REFRESH TIMER
-        self.dt = 1 / fps
-        self.timer = QtCore.QTimer()
-        self.timer.setInterval(1000 // fps)
-        self.timer.timeout.connect(self.update)
-        # be aware, the timer does not have an accumulator
-        # desynchronisations will occur
+        self.gpu_picking = preferences.value("Viewports/GPUPicking", "false").lower() == "true"
+        # ^ opt-in: clicks select what the GPU drew under the cursor (picked), instead of raycasting on the CPU (raycast)
+        # FRAME PACING
+        self.render_on_demand = preferences.value("Viewports/RenderOnDemand", "true").lower() == "true"
+        # ^ only repaint when something changes, otherwise repaint as fast as the display allows
+        self.dt = 1 / fps  # camera tick, in seconds
+        self.accumulator = 0  # seconds of real time the camera has yet to tick through
+        self.last_frame = None  # time.perf_counter() at the last paintGL, None when idle
+        self.frame_scheduled = False
+        self.frameSwapped.connect(self.next_frame)
+        # FRAME STATS OVERLAY
+        self.frame_stats = QtWidgets.QLabel(self)
+        # ^ a child widget, so drawing the overlay never touches the view's GL state
+        self.frame_stats.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        self.frame_stats.setStyleSheet("QLabel { color: white; background-color: rgba(0, 0, 0, 160); padding: 4px }")
+        self.frame_stats.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+        self.frame_stats.move(4, 4)
+        self.frame_stats.hide()
+        self.frame_stats_timer = QtCore.QTimer()
+        self.frame_stats_timer.setInterval(250)  # redrawing text every frame would cost more than it measures
+        self.frame_stats_timer.timeout.connect(self.update_frame_stats)
 
-    def update(self):  # called on timer once initializeGL is run
-        self.makeCurrent()
-        self.render_manager.update()
-        self.doneCurrent()
-        super(MapViewport3D, self).update()  # calls PaintGL
+    def schedule_frame(self):
+        """Ask Qt for a repaint; requests are merged until paintGL runs"""
+        if not self.frame_scheduled:
+            self.frame_scheduled = True
+            self.update()  # calls paintGL
+
+    def animating(self):
+        """Does the next frame need drawing, even if nothing else asks for it?"""
+        return not self.render_on_demand or self.camera_moving or self.view.busy
+
+    def next_frame(self):  # connected to frameSwapped, paced by the display's refresh rate
+        if self.animating():
+            self.schedule_frame()
+        else:
+            self.last_frame = None  # going idle, don't count the wait as camera time
+            self.view.profiler.idle()
 
     # OpenGL Methods
     def initializeGL(self):
@@ -70,10 +133,10 @@ class MapViewport3D(QtWidgets.QOpenGLWidget):  # initialised in ui/tabs.py
         else:
             raise NotImplementedError(f"OpenGL version ({major}.{minor}) too low!")
         app = QtWidgets.QApplication.instance()
-        shader_folder = os.path.join(app.folder, f"shaders/{self.shader_version}/")
-        self.render_manager.initialise(shader_folder)
+        shader_folder = os.path.join(app.folder, "shaders/glsl/")
+        self.view.initialise(shader_folder, self.shader_version)
+        # ^ the first viewport of a map also makes the map's shared buffers & programs
         self.set_view_mode("flat")  # sets shaders & GL state
-        self.timer.start()
 
     # calling the slot by it's name creates a QVariant Error
     # which for some reason does not trace correctly
@@ -81,19 +144,27 @@ class MapViewport3D(QtWidgets.QOpenGLWidget):  # initialised in ui/tabs.py
     def set_view_mode(self, view_mode):  # C++: void setViewMode(QString)
         self.view_mode = view_mode
         self.makeCurrent()
-        if view_mode == "flat":
-            gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_FILL)
-            gl.glDisable(gl.GL_TEXTURE_2D)
-        elif view_mode == "textured":
-            gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_FILL)
-            gl.glEnable(gl.GL_TEXTURE_2D)
-            # add textures to buffers
-        elif view_mode == "wireframe":
+        if view_mode == "wireframe":
             gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_LINE)
-            gl.glDisable(gl.GL_TEXTURE_2D)
+        else:
+            gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_FILL)
+        self.view.set_render_mode(render_modes[view_mode])
+        # ^ compiles that render mode's shaders, the first time it's selected
         self.doneCurrent()
+        self.schedule_frame()
 
     def paintGL(self):
+        self.frame_scheduled = False
+        profiler = self.view.profiler
+        # REAL TIME
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.accumulator += min(now - self.last_frame, 0.25)
+            # ^ a long stall shouldn't fling the camera across the map
+        self.last_frame = now
+        ticks = int(self.accumulator / self.dt)
+        self.accumulator -= ticks * self.dt
+        # ^ camera moves in whole ticks, the remainder carries into the next frame
         mouse = QtGui.QCursor.pos()
         self.current_mouse_position = vector.vec2(mouse.x(), mouse.y())
         self.mouse_vector = self.current_mouse_position - self.last_mouse_position
@@ -105,39 +176,64 @@ class MapViewport3D(QtWidgets.QOpenGLWidget):  # initialised in ui/tabs.py
             self.last_mouse_position = vector.vec2(center.x(), center.y())
         self.moved_last_tick = True
         # ^ get accurate mouse input for frame
-        gl.glLoadIdentity()
-        fov = self.render_manager.field_of_view
-        aspect = self.render_manager.aspect
-        draw_distance = self.render_manager.draw_distance
-        gluPerspective(fov, aspect, 0.1, draw_distance)
         # UPDATE CAMERA
-        ms = self.timer.remainingTime() / self.timer.interval() / 1000
-        if self.camera_moving:  # TOGGLED ON: take user inputs
-            self.camera.update(self.mouse_vector, self.keys, self.dt + ms)
-            if self.moved_last_tick is False:  # prevent drift
-                self.mouse_vector = vector.vec2()
-            self.moved_last_tick = False
-        self.camera.set()
-        # ^ cannot call gluPerspective in render.manager.draw
-        # -- this order of operations must be preserved
-        # if rendering a skybox, it must be rendering after camera rotation & before camera position
+        with profiler.cpu("camera"):
+            if self.camera_moving:  # TOGGLED ON: take user inputs
+                self.camera.update(self.mouse_vector, self.keys, ticks * self.dt)
+                if self.moved_last_tick is False:  # prevent drift
+                    self.mouse_vector = vector.vec2()
+                self.moved_last_tick = False
+            self.view.view_matrix = self.camera.view_matrix()
+        # if rendering a skybox, it must use the camera's rotation without it's position
         # -- may also want to stencil render skybox brushes
-        self.render_manager.draw()
+        # UPDATE BUFFERS & CAMERA UNIFORMS
+        loading = len(self.render_manager.buffer_update_queue) > 0
+        with profiler.cpu("update"):
+            self.view.update()
+        if loading and (len(self.render_manager.buffer_update_queue) > 0 or len(self.render_manager.bufferizing) == 0):
+            # ^ don't say it's loaded while batches are still being bufferized
+            self.upload_progress.emit(self.render_manager.buffer_update_queue.progress())
+        with profiler.cpu("draw"):
+            self.view.draw()
+        profiler.end_frame()
         super(MapViewport3D, self).paintGL()
 
-    def resizeGL(self, width, height):
-        self.render_manager.aspect = width / height
+    def resizeGL(self, width, height):  # Qt repaints after resizing
+        self.view.aspect = width / height
+
+    # Frame Stats
+    @QtCore.pyqtSlot(bool, name="setFrameStatsVisible")  # connected to UI
+    def set_frame_stats_visible(self, visible):  # C++: void setFrameStatsVisible(bool)
+        """Show / hide the timings overlay; the profiler only runs while it is visible"""
+        self.view.profiler.enable(visible)
+        self.frame_stats.setVisible(visible)
+        if visible:
+            self.update_frame_stats()
+            self.frame_stats_timer.start()
+        else:
+            self.frame_stats_timer.stop()
+
+    def toggle_frame_stats(self):
+        self.set_frame_stats_visible(self.frame_stats.isHidden())
+
+    def update_frame_stats(self):
+        self.frame_stats.setText(format_stats(self.get_frame_stats()))
+        self.frame_stats.adjustSize()
+
+    def get_frame_stats(self):
+        """Rolling timings for the last few seconds of frames, see render.profiler.Profiler.stats
+        empty until the profiler is enabled with set_frame_stats_visible(True)"""
+        return self.view.profiler.stats()
 
     # Qt Signals
     def do_raycast(self, click_x, click_y):
-        camera_right = vector.vec3(x=1).rotate(*-self.camera.rotation)
-        camera_up = vector.vec3(z=1).rotate(*-self.camera.rotation)
-        camera_forward = vector.vec3(y=1).rotate(*-self.camera.rotation)
+        camera_right, camera_up, camera_forward = self.camera.basis()
+        # ^ read from the camera's cached view matrix, no trig per ray
         width, height = self.width(), self.height()
         x_offset = camera_right * ((click_x * 2 - width) / width)
         x_offset *= width / height  # aspect ratio
         y_offset = camera_up * ((click_y * 2 - height) / height)
-        fov_scalar = math.tan(math.radians(self.render_manager.field_of_view / 2))
+        fov_scalar = math.tan(math.radians(self.view.field_of_view / 2))
         x_offset *= fov_scalar
         y_offset *= fov_scalar
         ray_origin = self.camera.position
@@ -149,6 +245,7 @@ class MapViewport3D(QtWidgets.QOpenGLWidget):  # initialised in ui/tabs.py
         # BUG? auto repeat can "give the camera velocity" by jamming a key down virtually?
         # ^ obsered once by @snake-biscuits
         self.keys.add(event.key())
+        self.schedule_frame()
 
         def free_mouse():
             self.setMouseTracking(False)
@@ -166,10 +263,12 @@ class MapViewport3D(QtWidgets.QOpenGLWidget):  # initialised in ui/tabs.py
             else:
                 free_mouse()
         elif event.key() == QtCore.Qt.Key_Escape and self.camera_moving:
+            self.camera_moving = False
             free_mouse()
 
     def keyReleaseEvent(self, event):
         self.keys.discard(event.key())
+        self.schedule_frame()
 
     def mouseReleaseEvent(self, event):
         if event.button() == QtCore.Qt.LeftButton:  # defined in settings
@@ -177,8 +276,12 @@ class MapViewport3D(QtWidgets.QOpenGLWidget):  # initialised in ui/tabs.py
             if self.camera_moving:
                 x = self.width() / 2
                 y = self.height() / 2
-            ray_origin, ray_direction = self.do_raycast(x, self.height() - y)
-            self.raycast.emit(ray_origin, ray_direction)
+            if self.gpu_picking:
+                scale = self.devicePixelRatioF()  # the framebuffer is in physical pixels
+                self.view.pick(int(x * scale), int((self.height() - y) * scale), self.picked.emit)
+            else:
+                ray_origin, ray_direction = self.do_raycast(x, self.height() - y)
+                self.raycast.emit(ray_origin, ray_direction)
         super(MapViewport3D, self).mouseReleaseEvent(event)
 
     def wheelEvent(self, event):
@@ -191,13 +294,16 @@ class MapViewport3D(QtWidgets.QOpenGLWidget):  # initialised in ui/tabs.py
             QtGui.QCursor.setPos(self.mapToGlobal(center))
         super(MapViewport3D, self).leaveEvent(event)
 
-    def hideEvent(self, event):
+    def hideEvent(self, event):  # frameSwapped stops with painting, so hidden viewports stay idle
         super(MapViewport3D, self).hideEvent(event)
-        self.timer.stop()
+        self.frame_stats_timer.stop()
+        self.last_frame = None
 
     def showEvent(self, event):
         super(MapViewport3D, self).showEvent(event)
-        self.timer.start()
+        self.schedule_frame()
+        if not self.frame_stats.isHidden():
+            self.frame_stats_timer.start()
 
 
 class MapViewport2D(QtWidgets.QOpenGLWidget):  # QtWidgets.QGraphicsView ?
@@ -1,11 +1,13 @@
 """QtPyHammer Workspace that holds and manages an open .vmf file"""
 import enum
+import os
 
 from PyQt5 import QtWidgets
 
 from . import viewport
 from ..ops.vmf import VmfInterface
 from ..utilities import raycast
+from ..utilities.render import bufferize
 
 
 class SELECTION_MODE(enum.Enum):
@@ -27,8 +29,12 @@ class VmfTab(QtWidgets.QWidget):
         # UI
         layout = QtWidgets.QVBoxLayout()  # holds the viewport
         # ^ 2 QSplitter(s) will be used for quad viewports
-        self.viewport = viewport.MapViewport3D(self)
+        self.render_manager = viewport.new_render_manager()
+        # ^ one copy of the map's geometry on the GPU, pass it to every viewport of this map
+        self.viewport = viewport.MapViewport3D(self.render_manager, self)
         self.viewport.raycast.connect(self.select)
+        self.viewport.picked.connect(self.select_picked)
+        self.viewport.upload_progress.connect(self.show_upload_progress)
         # self.viewport.setViewMode.connect(...)
         self.viewport.setFocus()  # not working as intended
         layout.addWidget(self.viewport)
@@ -41,11 +47,47 @@ class VmfTab(QtWidgets.QWidget):
 
     def select(self, ray_origin, ray_direction):
         """Get the object hit by ray"""
-        ray_length = self.viewport.render_manager.draw_distance
+        ray_length = self.render_manager.draw_distance
         ray = raycast.Ray(ray_origin, ray_direction, ray_length)
         selection = raycast.raycast(ray, self.map_file)
-        self.map_file.selection.add(selection)
-        # TODO: highlight selection in renderer
+        if selection is not None:
+            self.add_to_selection(selection)
+
+    def select_picked(self, pick):
+        """Select what the GPU drew under the cursor, see render.picking"""
+        if pick.renderable is None:
+            return
+        renderable_type, renderable_id = pick.renderable
+        if renderable_type == "brush":
+            self.add_to_selection(("brush", renderable_id, pick.face))
+        elif renderable_type == "displacement":  # (brush.id, face.id)
+            self.add_to_selection(("brush", *renderable_id))
+        else:
+            self.add_to_selection((renderable_type, renderable_id, None))
+
+    def add_to_selection(self, selection):
+        """selection = ("type", major_id, minor_id), highlighted in every viewport"""
+        self.selection.add(selection)
+        renderable_type, major_id, minor_id = selection
+        if self.selection_mode == SELECTION_MODE.FACE and renderable_type == "brush":
+            brush = [b for b in self.map_file.brushes if b.id == major_id][0]
+            face_span = bufferize.face_spans(brush)[minor_id]
+            self.render_manager.select_faces((renderable_type, major_id), [face_span])
+        else:  # TODO: select the whole object / group
+            self.render_manager.select((renderable_type, major_id))
+
+    def show_upload_progress(self, progress):
+        """Show how much of the map is still being sent to the GPU"""
+        main_window = self.window()
+        if not isinstance(main_window, QtWidgets.QMainWindow):
+            return  # no status bar to show progress on
+        short_filename = os.path.basename(self.filename)
+        if progress.bytes_pending == 0:
+            main_window.statusBar().showMessage(f"Loaded {short_filename}", 2000)
+            return
+        megabytes = progress.bytes_pending / 10 ** 6
+        time_left = "" if progress.eta is None else f" (~{progress.eta:.1f}s left)"
+        main_window.statusBar().showMessage(f"Loading {short_filename}: {megabytes:.1f} MB to go{time_left}")
 
     def save_to_file(self):
         print(f"Saving {self.filename}... ", end="")
@@ -64,5 +106,5 @@ class VmfTab(QtWidgets.QWidget):
 
     def close(self):
         # TODO: ask the user if they want to save first
-        # release used memory eg. self.viewport.render_manager buffers
+        # release used memory eg. self.render_manager buffers
         super(VmfTab, self).close()
@@ -1,6 +1,9 @@
 """Classes for creating and using cameras in 3D"""
-import OpenGL.GL as gl
+from typing import Tuple
 
+import numpy as np
+
+from . import transform
 from . import vector
 
 FORWARD = 0x00
@@ -29,12 +32,13 @@ def clamp(value, minimum, maximum):
 
 class freecam:
     """Quake / Source free motion camera"""
-    __slots__ = ["position", "rotation", "speed"]
+    __slots__ = ["position", "rotation", "speed", "_view_matrix"]
 
     def __init__(self, position, rotation, speed=0.75):
         self.position = vector.vec3(*position)
         self.rotation = vector.vec3(*rotation)
         self.speed = speed
+        self._view_matrix = transform.CachedMatrix(self.build_view_matrix)
 
     def update(self, mousepos, keys, dt):
         """Take inputs and move at self.speed"""
@@ -52,14 +56,26 @@ class freecam:
         local_move.x = -(pressed(LEFT) - pressed(RIGHT))
         local_move.y = -(pressed(BACK) - pressed(FORWARD))
         local_move.z = -(pressed(DOWN) - pressed(UP))
-        global_move = local_move.rotate(*-self.rotation)
+        if local_move.x == local_move.y == local_move.z == 0:
+            return
+        right, up, forward = self.basis()
+        global_move = right * local_move.x + forward * local_move.y + up * local_move.z
         self.position += global_move * self.speed * dt
 
-    def set(self):
-        gl.glRotate(-90, 1, 0, 0)  # make Y+ forward
-        gl.glRotate(self.rotation.x, 1, 0, 0)
-        gl.glRotate(self.rotation.z, 0, 0, 1)
-        gl.glTranslate(*-self.position)
+    def view_matrix(self) -> np.ndarray:
+        """world -> camera transform, only rebuilt when position or rotation change"""
+        return self._view_matrix(*self.position, *self.rotation)
+
+    @staticmethod
+    def build_view_matrix(x, y, z, pitch, roll, yaw) -> np.ndarray:
+        return (transform.rotate(-90, 1, 0, 0)  # make Y+ forward
+                @ transform.rotate(pitch, 1, 0, 0)
+                @ transform.rotate(yaw, 0, 0, 1)
+                @ transform.translate(-x, -y, -z))
+
+    def basis(self) -> Tuple[vector.vec3, vector.vec3, vector.vec3]:
+        """(right, up, forward) in world space, read from the view matrix"""
+        return view_basis(self.view_matrix())
 
     def __repr__(self):
         pos = [round(x, 2) for x in self.last_position]
@@ -73,40 +89,59 @@ class freecam:
 
 class firstperson:
     """First-person camera"""
-    __slots__ = ["rotation"]
+    __slots__ = ["rotation", "_view_matrix"]
 
     def __init__(self, rotation=(0, 0, 0)):
         self.rotation = vector.vec3(*rotation)
+        self._view_matrix = transform.CachedMatrix(self.build_view_matrix)
 
     def update(self, mouse):
         global sensitivity
         self.rotation.z += mouse.x * sensitivity
         self.rotation.x += mouse.y * sensitivity
 
-    def set(self, position):
-        gl.glRotate(self.rotation.x - 90, 1, 0, 0)
-        gl.glRotate(self.rotation.z, 0, 0, 1)
-        gl.glTranslate(-position.x, -position.y, -position.z)
+    def view_matrix(self, position) -> np.ndarray:
+        """world -> camera transform, looking out from position"""
+        return self._view_matrix(*position, *self.rotation)
+
+    @staticmethod
+    def build_view_matrix(x, y, z, pitch, roll, yaw) -> np.ndarray:
+        return (transform.rotate(pitch - 90, 1, 0, 0)
+                @ transform.rotate(yaw, 0, 0, 1)
+                @ transform.translate(-x, -y, -z))
 
 
 class thirdperson:
     """Third-person Camera"""
-    __slots__ = ["position", "rotation", "radius", "offset"]
+    __slots__ = ["position", "rotation", "radius", "offset", "_view_matrix"]
 
     def __init__(self, position, rotation, radius, offset=(0, 0)):
         self.position = vector.vec3(*position)
         self.rotation = vector.vec3(*rotation)
         self.radius = radius
-        self.offset = vector.vec2(offset)
+        self.offset = vector.vec2(*offset)
+        self._view_matrix = transform.CachedMatrix(self.build_view_matrix)
 
     def update(self):
         """write your own implementation"""
         raise NotImplementedError("thirdperson is a baseclass, write your own update function")
 
-    def set(self):
-        gl.glRotate(self.rotation.x, 1, 0, 0)
-        gl.glRotate(self.rotation.y, 0, 1, 0)
-        gl.glRotate(self.rotation.z, 0, 0, 1)
-        gl.glTranslate(-self.position.x, -self.position.y, -self.position.z)
-        gl.glTranslate(0, 0, -self.radius)
-        gl.glTranslate(self.offset.x, self.offset.y, 0)
+    def view_matrix(self) -> np.ndarray:
+        """world -> camera transform, only rebuilt when the camera changes"""
+        return self._view_matrix(*self.position, *self.rotation, self.radius, *self.offset)
+
+    @staticmethod
+    def build_view_matrix(x, y, z, pitch, roll, yaw, radius, offset_x, offset_y) -> np.ndarray:
+        return (transform.rotate(pitch, 1, 0, 0)
+                @ transform.rotate(roll, 0, 1, 0)
+                @ transform.rotate(yaw, 0, 0, 1)
+                @ transform.translate(-x, -y, -z)
+                @ transform.translate(0, 0, -radius)
+                @ transform.translate(offset_x, offset_y, 0))
+
+
+def view_basis(view_matrix: np.ndarray) -> Tuple[vector.vec3, vector.vec3, vector.vec3]:
+    """(right, up, forward) in world space; the rows of view_matrix's rotation
+    OpenGL cameras look down -Z, so forward is the negated 3rd row"""
+    right, up, back = view_matrix[:3, :3].tolist()
+    return vector.vec3(*right), vector.vec3(*up), -vector.vec3(*back)
@@ -1,5 +1,6 @@
 from __future__ import annotations
-from typing import Union
+import math
+from typing import Iterable, List, Union
 
 from . import vector
 
@@ -109,3 +110,43 @@ class AxisAlignedBoundingBox:
         z = (self.mins.z, self.maxs.z)
         for i in range(8):
             yield vector.vec3(x[i & 4 >> 2], y[i & 2 >> 1], z[i & 1])
+
+
+class Frustum:
+    """Six inward facing planes bounding what a camera can see"""
+    planes: List[Plane]
+    OUTSIDE, INTERSECTS, INSIDE = -1, 0, 1
+
+    def __init__(self, planes: List[Plane]):
+        self.planes = planes
+
+    @classmethod
+    def from_matrix(cls, matrix: Iterable) -> Frustum:
+        """Extracts planes from a column-major MVP matrix, see transform.column_major"""
+        # Gribb & Hartmann, "Fast Extraction of Viewing Frustum Planes from the World-View-Projection Matrix"
+        m = [[float(x) for x in column] for column in matrix]
+        rows = [[m[column][row] for column in range(4)] for row in range(4)]
+        planes = list()
+        for row in rows[:3]:  # left, right, bottom, top, near, far
+            for sign in (1, -1):
+                a, b, c, d = [w + sign * r for w, r in zip(rows[3], row)]
+                length = math.sqrt(a ** 2 + b ** 2 + c ** 2)
+                planes.append(Plane((a / length, b / length, c / length), -d / length))
+        return cls(planes)
+
+    def classify(self, aabb: AxisAlignedBoundingBox) -> int:
+        """Frustum.OUTSIDE, Frustum.INTERSECTS or Frustum.INSIDE"""
+        result = Frustum.INSIDE
+        mins, maxs = aabb.mins, aabb.maxs
+        for plane in self.planes:
+            nx, ny, nz = plane.normal.x, plane.normal.y, plane.normal.z
+            # corners furthest along & furthest against the plane's normal
+            furthest = (nx * (maxs.x if nx > 0 else mins.x) + ny * (maxs.y if ny > 0 else mins.y)
+                        + nz * (maxs.z if nz > 0 else mins.z))
+            if furthest < plane.distance:
+                return Frustum.OUTSIDE
+            nearest = (nx * (mins.x if nx > 0 else maxs.x) + ny * (mins.y if ny > 0 else maxs.y)
+                       + nz * (mins.z if nz > 0 else maxs.z))
+            if nearest < plane.distance:
+                result = Frustum.INTERSECTS
+        return result
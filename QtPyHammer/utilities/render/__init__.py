@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-__all__ = ["Manager", "Span", "Renderable", "RenderableId", "RenderableChildId"]
+__all__ = ["Manager", "View", "Span", "Renderable", "RenderableId", "RenderableChildId"]
 import collections
 
 from .manager import Manager
+from .view import View
 
 
 class Span:
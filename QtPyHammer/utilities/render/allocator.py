@@ -0,0 +1,116 @@
+"""Free space management for GPU buffers"""
+from __future__ import annotations
+import bisect
+from typing import Dict, Generator, List, Tuple, Union
+
+
+class Allocator:
+    """Tracks which bytes of a buffer are in use, handing out best-fit spans
+    spans are (start, length) tuples, in bytes"""
+    size: int
+    used: int
+    _free_by_start: List[Tuple[int, int]]  # [(start, length)], sorted by start
+    _free_by_length: List[Tuple[int, int]]  # [(length, start)], sorted by length
+
+    def __init__(self, size: int):
+        self.size = size
+        self.used = 0
+        self._free_by_start = [(0, size)] if size > 0 else []
+        self._free_by_length = [(size, 0)] if size > 0 else []
+
+    def __repr__(self) -> str:
+        return f"<Allocator {self.used}/{self.size} bytes used, {len(self._free_by_start)} gaps>"
+
+    def allocate(self, length: int, alignment: int = 1) -> Union[int, None]:
+        """Claims the smallest gap that fits length, returns start (or None if nothing fits)"""
+        if length < 1:
+            raise RuntimeError("Can't allocate a span smaller than 1 byte")
+        i = bisect.bisect_left(self._free_by_length, (length, -1))
+        # ^ first gap that could fit; later gaps only matter if alignment padding gets in the way
+        for j in range(i, len(self._free_by_length)):  # slicing would copy every gap on each allocation
+            gap_length, gap_start = self._free_by_length[j]
+            start = -(-gap_start // alignment) * alignment  # round up to alignment
+            if start + length <= gap_start + gap_length:
+                self._claim(gap_start, gap_length, start, length)
+                return start
+        return None
+
+    def reserve(self, start: int, length: int):
+        """Claims a specific span, which must be entirely free"""
+        i = bisect.bisect_right(self._free_by_start, (start, self.size + 1)) - 1
+        if i < 0 or sum(self._free_by_start[i]) < start + length:
+            raise RuntimeError(f"Can't reserve {(start, length)}, span is not free")
+        self._claim(*self._free_by_start[i], start, length)
+
+    def free(self, start: int, length: int):
+        """Releases a span, merging it with any gaps it touches"""
+        end = start + length
+        if start < 0 or end > self.size:
+            raise RuntimeError(f"{(start, length)} is outside of buffer (size={self.size})")
+        i = bisect.bisect_left(self._free_by_start, (start, 0))
+        previous_gap = self._free_by_start[i - 1] if i > 0 else None
+        next_gap = self._free_by_start[i] if i < len(self._free_by_start) else None
+        if (previous_gap is not None and sum(previous_gap) > start) or (next_gap is not None and next_gap[0] < end):
+            raise RuntimeError(f"Can't free {(start, length)}, span overlaps free space")
+        self.used -= length
+        if previous_gap is not None and sum(previous_gap) == start:  # coalesce with previous gap
+            self._remove_gap(*previous_gap)
+            start, length = previous_gap[0], previous_gap[1] + length
+        if next_gap is not None and next_gap[0] == end:  # coalesce with next gap
+            self._remove_gap(*next_gap)
+            length += next_gap[1]
+        self._add_gap(start, length)
+
+    def grow(self, size: int):
+        """Extends the buffer to size bytes, adding the new space to the gap at the end"""
+        if size < self.size:
+            raise RuntimeError(f"Can't shrink an Allocator (size={self.size}) to {size} bytes")
+        if size == self.size:
+            return
+        start, length = self.size, size - self.size
+        if len(self._free_by_start) > 0 and sum(self._free_by_start[-1]) == self.size:
+            last_gap = self._free_by_start[-1]  # coalesce with the gap at the end
+            self._remove_gap(*last_gap)
+            start, length = last_gap[0], last_gap[1] + length
+        self._add_gap(start, length)
+        self.size = size
+
+    def gaps(self) -> Generator[Tuple[int, int], None, None]:
+        """yields each free (start, length) span, sorted by start"""
+        yield from self._free_by_start
+
+    def spans(self) -> Generator[Tuple[int, int], None, None]:
+        """yields each used (start, length) span, sorted by start"""
+        position = 0
+        for gap_start, gap_length in self._free_by_start:
+            if gap_start > position:
+                yield (position, gap_start - position)
+            position = gap_start + gap_length
+        if position < self.size:
+            yield (position, self.size - position)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        free = self.size - self.used
+        largest_gap = self._free_by_length[-1][0] if len(self._free_by_length) > 0 else 0
+        return {"size": self.size, "used": self.used, "free": free,
+                "gaps": len(self._free_by_start), "largest_gap": largest_gap,
+                "fragmentation": 1 - largest_gap / free if free > 0 else 0.0}
+        # ^ fragmentation: 0 when all free space is one gap, approaching 1 as it splinters
+
+    def _claim(self, gap_start: int, gap_length: int, start: int, length: int):
+        """Splits the gap around start & length"""
+        self._remove_gap(gap_start, gap_length)
+        if start > gap_start:  # alignment padding / space before the claimed span
+            self._add_gap(gap_start, start - gap_start)
+        end, gap_end = start + length, gap_start + gap_length
+        if end < gap_end:
+            self._add_gap(end, gap_end - end)
+        self.used += length
+
+    def _add_gap(self, start: int, length: int):
+        bisect.insort(self._free_by_start, (start, length))
+        bisect.insort(self._free_by_length, (length, start))
+
+    def _remove_gap(self, start: int, length: int):
+        del self._free_by_start[bisect.bisect_left(self._free_by_start, (start, length))]
+        del self._free_by_length[bisect.bisect_left(self._free_by_length, (length, start))]
@@ -1,82 +1,193 @@
-import itertools
+"""Converts editor objects into vertex & index data, ready for upload to the GPU"""
+import functools
+
+import numpy as np
 
 from .. import vector
+from .vertex_format import formats
 
 
 def brush(brush):
-    vertices = []  # [(*position, *normal, *uv, *colour), ...]
-    indices = []
-    for face in brush.faces:
-        polygon_indices = []
-        normal = face.plane[0]
-        for i, vertex in enumerate(face.polygon):
-            uv = face.uv_at(vertex)
-            assembled_vertex = (*vertex, *normal, *uv, *brush.colour)
-            if assembled_vertex not in vertices:
-                vertices.append(assembled_vertex)
-                polygon_indices.append(len(vertices) - 1)
-            else:
-                polygon_indices.append(vertices.index(assembled_vertex))
-        indices.extend(loop_triangle_fan(polygon_indices))
-    vertices = tuple(itertools.chain(*vertices))
+    vertices, indices, face_vertices = brush_batch([brush])[0]
     return vertices, indices
 
 
+def brush_faces(brush):
+    """brush(brush), & {face.id: (first_vertex, vertex_count)} of each face's vertices"""
+    return brush_batch([brush])[0]
+
+
+def brush_batch(brushes):
+    """[(vertices, indices, face_vertices)] of each brush, see brush_faces
+    every corner of every brush is assembled & welded in one go; numpy calls per brush would cost more than they save
+    faces never share vertices (their normals differ), so each face's vertices follow the last face's"""
+    faces = [face for brush in brushes for face in brush.faces]
+    face_counts = np.array([len(brush.faces) for brush in brushes], dtype=np.int64)
+    corner_counts = np.array([len(face.polygon) for face in faces], dtype=np.int64)
+    brush_of = np.repeat(np.repeat(np.arange(len(brushes)), face_counts), corner_counts)  # brush index of each corner
+    face_of = np.repeat(np.arange(len(faces)), corner_counts)  # face index of each corner
+    positions = np.array([tuple(corner) for face in faces for corner in face.polygon], dtype=np.float64).reshape(-1, 3)
+    normals = np.array([tuple(face.plane[0]) for face in faces], dtype=np.float64).reshape(-1, 3)
+    axes = np.array([[*axis.vector, axis.offset, axis.scale] for face in faces for axis in (face.uaxis, face.vaxis)],
+                    dtype=np.float64).reshape(-1, 2, 5)[face_of]
+    uvs = (np.einsum("ij,ikj->ik", positions, axes[..., :3]) + axes[..., 3]) / axes[..., 4]
+    # ^ face.uv_at for every corner at once: (dot(position, axis.vector) + axis.offset) / axis.scale
+    colours = np.array([brush.colour for brush in brushes], dtype=np.float64).reshape(-1, 3)[brush_of]
+    vertices, corner_vertices = weld(np.hstack([brush_of[:, np.newaxis], positions, normals[face_of], uvs, colours]))
+    # ^ [(brush index, *position, *normal, *uv, *colour)]; the brush index stops neighbouring brushes welding together
+    vertices = formats["brush"].pack(vertices.reshape(-1, 12)[:, 1:])
+    corner_vertices = corner_vertices.astype(np.int64)
+    vertex_ends = np.cumsum(np.bincount(brush_of[np.unique(corner_vertices, return_index=True)[1]],
+                                        minlength=len(brushes)))
+    # ^ welded vertices are in order of first appearance, so each brush's vertices follow the last brush's
+    vertex_starts = np.concatenate([[0], vertex_ends[:-1]])
+    corner_starts = np.cumsum(corner_counts) - corner_counts
+    triangles = [start + fan(count) for start, count in zip(corner_starts.tolist(), corner_counts.tolist())]
+    triangles = np.concatenate([np.zeros(0, dtype=np.int64), *triangles])
+    # ^ every face's triangle fan, as corners
+    indices = corner_vertices[triangles]
+    index_ends = np.concatenate([[0], np.cumsum(np.bincount(face_of[triangles], minlength=len(faces)))]).tolist()
+    # ^ [0, *index after each face]
+    seen = np.concatenate([[0], np.maximum.accumulate(corner_vertices) + 1])  # vertices seen after n corners
+    face_ends = seen[corner_starts + corner_counts]  # vertices seen after each face
+    out = []
+    face_start = 0
+    for i, brush in enumerate(brushes):
+        vertex_start, face_end = int(vertex_starts[i]), face_start + int(face_counts[i])
+        index_start, index_end = index_ends[face_start], index_ends[face_end]
+        ends = face_ends[face_start:face_end].tolist()
+        firsts = [vertex_start, *ends[:-1]]
+        face_vertices = {face.id: (first - vertex_start, end - first)
+                         for face, first, end in zip(brush.faces, firsts, ends)}
+        out.append((vertices[vertex_start:int(vertex_ends[i])],
+                    (indices[index_start:index_end] - vertex_start).astype(np.uint32), face_vertices))
+        face_start = face_end
+    return out
+
+
+def brushes(brushes) -> tuple:
+    """(brush_data, displacement_data, translucent_ids, face_vertices) for render.Manager.add_bufferized
+    brush_data = {brush.id: (vertices, indices)}, displacement_data = {(brush.id, face.id): (vertices, indices)}
+    face_vertices = {brush.id: {face.id: (first_vertex, vertex_count)}}, see brush_faces
+    takes & returns only picklable data, so batches of brushes can be bufferized by worker processes"""
+    brush_data, displacement_data, translucent_ids, face_vertices = dict(), dict(), list(), dict()
+    for solid, (vertices, indices, faces) in zip(brushes, brush_batch(brushes)):
+        brush_data[solid.id], face_vertices[solid.id] = (vertices, indices), faces
+        if translucent(solid):
+            translucent_ids.append(solid.id)
+        if solid.is_displacement:
+            for face in solid.faces:
+                if hasattr(face, "displacement"):
+                    displacement_data[(solid.id, face.id)] = displacement(face)
+    return brush_data, displacement_data, translucent_ids, face_vertices
+
+
+def face_spans(brush):
+    """{face.id: (first_index, index_count)} of each face's triangles in the indices brush(brush) returns"""
+    spans = dict()
+    first_index = 0
+    for face in brush.faces:
+        index_count = len(loop_triangle_fan(list(range(len(face.polygon)))))
+        spans[face.id] = (first_index, index_count)
+        first_index += index_count
+    return spans
+
+
+def face_at(face_vertices, vertex):
+    """face.id of the face using vertex, from {face.id: (first_vertex, vertex_count)} made by brush_faces"""
+    for face_id, (first_vertex, vertex_count) in face_vertices.items():
+        if first_vertex <= vertex < first_vertex + vertex_count:
+            return face_id
+    return None
+
+
+translucent_materials = {"TOOLS/TOOLSAREAPORTAL", "TOOLS/TOOLSBLOCKLIGHT", "TOOLS/TOOLSBLOCK_LOS",
+                         "TOOLS/TOOLSBLOCKBULLETS", "TOOLS/TOOLSCLIP", "TOOLS/TOOLSFOG", "TOOLS/TOOLSHINT",
+                         "TOOLS/TOOLSINVISIBLE", "TOOLS/TOOLSNPCCLIP", "TOOLS/TOOLSOCCLUDER",
+                         "TOOLS/TOOLSPLAYERCLIP", "TOOLS/TOOLSSKIP", "TOOLS/TOOLSTRIGGER"}
+# ^ tool textures Hammer draws see-through, so the level they sit in stays visible
+
+
+def translucent(brush) -> bool:
+    """Is every face of brush a see-through tool texture?"""
+    return len(brush.faces) > 0 and all(face.material.upper() in translucent_materials for face in brush.faces)
+
+
 def displacement(face):
-    vertices = []
-    # ^ [(*position, *normal, *uv, blend_alpha, 0, 0), ...]
+    # vertices = [(*position, *normal, *uv, blend_alpha), ...]
     quad = tuple(vector.vec3(*P) for P in face.polygon)
     start = vector.vec3(*face.displacement.start)
     if start not in quad:  # start = closest point on quad to start
         start = sorted(quad, key=lambda P: (start - P).magnitude())[0]
     starting_index = quad.index(start) - 1
     quad = quad[starting_index:] + quad[:starting_index]
-    A, B, C, D = quad
-    DA = D - A
-    CB = C - B
     displacement = face.displacement
     power2 = 2 ** displacement.power
-    for i, normal_row, distance_row, alpha_row in zip(itertools.count(), displacement.normals,
-                                                      displacement.distances, displacement.alphas):
-        left_vert = A + (DA * i / power2)
-        right_vert = B + (CB * i / power2)
-        for j, normal, distance, alpha in zip(itertools.count(), normal_row,
-                                              distance_row, alpha_row):
-            barymetric = vector.lerp(right_vert, left_vert, j / power2)
-            # check: do we need to apply subdivision too?
-            position = vector.vec3(*barymetric) + (normal * distance)
-            # theta =  math.degrees(math.acos(vector.dot(face.plane[0], (0, 0, 1))))
-            # normal = (normal * distance).normalise()
-            # normal = normal.rotate(*[-theta * x for x in face.plane[0]])
-            normal = face.plane[0]
-            uv = face.uv_at(barymetric)
-            alpha = alpha / 255
-            vertices.append((*position, *normal, *uv, alpha, 0, 0))
-    vertices = list(itertools.chain(*vertices))
-    indices = disp_indices(displacement.power)
+    steps = np.arange(power2 + 1, dtype=np.float64) / power2
+    # uvs are affine in position, so interpolate them just like the corners they came from
+    corners = np.array([(*P, *face.uv_at(P)) for P in quad], dtype=np.float64)
+    A, B, C, D = corners
+    left_verts = A + np.outer(steps, D - A)  # one per row
+    right_verts = B + np.outer(steps, C - B)
+    barymetric = right_verts[:, np.newaxis] + (left_verts - right_verts)[:, np.newaxis] * steps[:, np.newaxis]
+    # ^ [row][column][*position, *uv]
+    # check: do we need to apply subdivision too?
+    normals = np.array([[tuple(n) for n in row] for row in displacement.normals], dtype=np.float64)
+    distances = np.array(displacement.distances, dtype=np.float64)
+    positions = barymetric[..., :3] + normals * distances[..., np.newaxis]
+    vertices = np.zeros((power2 + 1, power2 + 1, 9), dtype=np.float32)
+    vertices[..., 0:3] = positions
+    vertices[..., 3:6] = smooth_normals(positions, barymetric[..., :3], face.plane[0])
+    vertices[..., 6:8] = barymetric[..., 3:]
+    vertices[..., 8] = np.array(displacement.alphas, dtype=np.float64) / 255
+    vertices = formats["displacement"].pack(vertices.reshape(-1, 9))
+    indices, _ = disp_lods(displacement.power)
+    # ^ every level of detail, sharing these vertices; render.Manager.level_of_detail picks one to draw
     return vertices, indices
 
 
 def obj_model(obj_model):
     # obj_model is expected to be an Obj object (utilities/obj.py)
-    vertex_data = []  # [(*position, *normal, *uv, *colour)]
-    index_data = []
+    corners = []  # [(v_index, vn_index, vt_index)], 3 per triangle
     for polygon in obj_model.faces:
-        indices = []
-        for v_index, vn_index, vt_index in polygon:
-            position = obj_model.vertices[v_index] if v_index is not None else (0, 0, 0)
-            normal = obj_model.normals[vn_index] if vn_index is not None else (0, 0, 0)
-            uv = obj_model.uvs[vt_index] if vt_index is not None else (0, 0)
-            vertex = (*position, *normal, *uv, *(.75, .75, .75))
-            if vertex not in vertex_data:
-                vertex_data.append(vertex)
-                indices.append(len(vertex_data) - 1)
-            else:
-                vertex_index = vertex_data.index(vertex)
-                indices.append(vertex_index)
-        index_data.extend(loop_triangle_fan(indices))
-    vertex_data = tuple(itertools.chain(*vertex_data))
-    return vertex_data, index_data
+        corners.extend(loop_triangle_fan(polygon))
+    if len(corners) == 0:
+        return np.zeros(0, dtype=formats["obj_model"].dtype), np.zeros(0, dtype=np.uint32)
+    corners = np.array(corners, dtype=np.float64)  # None becomes nan
+    corners = np.nan_to_num(corners, nan=-1).astype(np.int64)
+    # missing attributes (index -1) point at an appended row of zeros
+    positions = np.array([*obj_model.vertices, (0, 0, 0)], dtype=np.float32).reshape(-1, 3)
+    normals = np.array([*obj_model.normals, (0, 0, 0)], dtype=np.float32).reshape(-1, 3)
+    uvs = np.array([uv[:2] for uv in obj_model.uvs] + [(0, 0)], dtype=np.float32).reshape(-1, 2)
+    v_index, vn_index, vt_index = corners.T
+    colour = np.full((len(corners), 3), .75, dtype=np.float32)
+    assembled = np.hstack([positions[v_index], normals[vn_index], uvs[vt_index], colour])
+    # ^ [(*position, *normal, *uv, *colour)]
+    vertices, indices = weld(assembled)
+    return formats["obj_model"].pack(vertices), indices
+
+
+def weld(assembled_vertices):
+    """Merges identical rows of a (vertex_count, vertex_size) array
+    returns flat float32 vertices & uint32 indices, vertices kept in order of first appearance"""
+    assembled_vertices = np.ascontiguousarray(assembled_vertices, dtype=np.float32) + np.float32(0)
+    # ^ adding 0 turns -0.0 into 0.0, so both compare equal as bytes
+    row_size = assembled_vertices.itemsize * assembled_vertices.shape[1]
+    rows = assembled_vertices.view(np.dtype((np.void, row_size))).reshape(-1)
+    # ^ comparing whole rows as raw bytes is much faster than np.unique(axis=0)
+    unique, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    order = np.argsort(first)  # np.unique sorts rows, restore the original order
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    vertices = assembled_vertices[first[order]].reshape(-1)
+    indices = rank[inverse.reshape(-1)].astype(np.uint32)
+    return vertices, indices
+
+
+@functools.lru_cache(maxsize=None)
+def fan(corner_count):
+    """loop_triangle_fan of corners 0 to corner_count - 1, as an array"""
+    return np.array(loop_triangle_fan(list(range(corner_count))), dtype=np.int64)
 
 
 def loop_triangle_fan(vertices):
@@ -87,8 +198,10 @@ def loop_triangle_fan(vertices):
     return out
 
 
+@functools.lru_cache(maxsize=None)
 def disp_indices(power):
-    """output length = ((2 ** power) + 1) ** 2"""
+    """output length = ((2 ** power) + 1) ** 2
+    cached per power, the returned array is shared & read-only"""
     power2 = 2 ** power
     power2A = power2 + 1
     power2B = power2 + 2
@@ -130,15 +243,68 @@ def disp_indices(power):
                 tris.append(offset + power2C)
                 tris.append(offset + 2)
                 tris.append(offset + power2B)
+    tris = np.array(tris, dtype=np.uint32)
+    tris.flags.writeable = False
+    return tris
+
+
+@functools.lru_cache(maxsize=None)
+def disp_lods(power):
+    """(indices, level_lengths): every level of detail for a displacement of power, one after the other
+    level 0 is disp_indices(power), each level after halves the resolution of the interior
+    edges always keep every vertex, so neighbours at different levels meet without cracks
+    cached per power, the returned array is shared & read-only"""
+    levels = [disp_indices(power)] + [disp_lod_indices(power, 2 ** level) for level in range(1, power)]
+    indices = np.concatenate(levels)
+    indices.flags.writeable = False
+    return indices, tuple(len(level) for level in levels)
+
+
+def disp_lod_indices(power, step):
+    """triangles for a displacement of power, using every step-th row & column of vertices
+    cells along the edges are stitched to every edge vertex with a fan, step must be less than 2 ** power"""
+    power2 = 2 ** power
+    power2A = power2 + 1
+
+    def side(start, end, fine):  # vertices from start up to (but not including) end
+        (r0, c0), (r1, c1) = start, end
+        if not fine:
+            return [start]
+        length = max(abs(r1 - r0), abs(c1 - c0))
+        dr, dc = (r1 - r0) // length, (c1 - c0) // length
+        return [(r0 + dr * i, c0 + dc * i) for i in range(length)]
+
+    tris = []
+    for r0 in range(0, power2, step):
+        for c0 in range(0, power2, step):
+            r1, c1 = r0 + step, c0 + step
+            corners = [(r0, c0), (r1, c0), (r1, c1), (r0, c1)]
+            # ^ anticlockwise in (row, column), the same winding as disp_indices
+            fine = [c0 == 0, r1 == power2, c1 == power2, r0 == 0]
+            # ^ which side of the cell, from each corner to the next, is on the edge of the displacement
+            if not any(fine):
+                a, b, c, d = corners
+                tris.extend([a, b, d, b, c, d])
+                continue
+            hub = [i for i in range(4) if not fine[i] and not fine[i - 1]][0]
+            # ^ a corner with neither of it's sides on the edge, fanned from; step < power2 means there is one
+            ring = []
+            for i in range(hub, hub + 4):
+                ring.extend(side(corners[i % 4], corners[(i + 1) % 4], fine[i % 4]))
+            for a, b in zip(ring[1:-1], ring[2:]):
+                tris.extend([ring[0], a, b])
+    tris = np.array([r * power2A + c for r, c in tris], dtype=np.uint32)
     return tris
 
 
-def square_neighbours(x, y, edge_length):  # edge_length = (2^power) + 1
-    """yields the indicies of neighbouring points in a displacement"""
-    # for displacement smooth normal calculation (get index of neighbour in list)
-    for i in range(x - 1, x + 2):
-        if i >= 0 and i < edge_length:
-            for j in range(y - 1, y + 2):
-                if j >= 0 and j < edge_length:
-                    if not (i != x and j != y):
-                        yield i * edge_length + j
+def smooth_normals(positions, flat_positions, face_normal):
+    """(rows, columns, 3) unit normals of a displacement's (rows, columns, 3) positions
+    from np.gradient of each row & column: central differences inside, one-sided along the edges
+    flat_positions (the undisplaced grid) decides which way is out, so they face the same way as face_normal"""
+    normals = np.cross(*np.gradient(positions, axis=(1, 0)))
+    flat_normal = np.cross(*np.gradient(flat_positions, axis=(1, 0)))[0, 0]
+    if np.dot(flat_normal, face_normal) < 0:
+        normals = -normals
+    lengths = np.linalg.norm(normals, axis=-1, keepdims=True)
+    return np.where(lengths > 0, normals / np.where(lengths > 0, lengths, 1), face_normal)
+    # ^ a vertex pinched flat by it's neighbours keeps the face normal
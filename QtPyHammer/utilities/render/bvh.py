@@ -0,0 +1,200 @@
+"""Bounding Volume Hierarchy for culling renderables outside the camera's view"""
+from __future__ import annotations
+from typing import Any, Dict, Generator, List, Union
+
+import numpy as np
+
+from ..physics import AxisAlignedBoundingBox, Frustum
+
+
+class Node:
+    __slots__ = ["bounds", "parent", "children", "item"]
+    bounds: AxisAlignedBoundingBox
+    parent: Union[Node, None]
+    children: List[Node]  # empty for leaves, otherwise always 2
+    item: Any  # only set on leaves
+
+    def __init__(self, bounds: AxisAlignedBoundingBox, item: Any = None):
+        self.bounds = bounds
+        self.parent = None
+        self.children = list()
+        self.item = item
+
+    @property
+    def is_leaf(self) -> bool:
+        return len(self.children) == 0
+
+
+class BoundingVolumeHierarchy:
+    """Binary tree of AABBs, each branch bounding both of it's children
+    leaves are inserted & removed one at a time, so the tree never needs a full rebuild"""
+    root: Union[Node, None]
+    leaves: Dict[Any, Node]  # {item: leaf}
+    version: int  # bumped by every change, so queries can be cached
+
+    def __init__(self):
+        self.root = None
+        self.leaves = dict()
+        self.version = 0
+
+    def __contains__(self, item: Any) -> bool:
+        return item in self.leaves
+
+    def __len__(self) -> int:
+        return len(self.leaves)
+
+    def insert(self, item: Any, bounds: AxisAlignedBoundingBox):
+        if item in self.leaves:
+            self.remove(item)
+        leaf = Node(bounds, item)
+        self.leaves[item] = leaf
+        self.version += 1
+        if self.root is None:
+            self.root = leaf
+            return
+        # walk down to the cheapest sibling, by surface area
+        node = self.root
+        while not node.is_leaf:
+            combined_area = merged_area(node.bounds, bounds)
+            cost = 2 * combined_area  # cost of pairing with node
+            inherited = 2 * (combined_area - surface_area(node.bounds))
+            # ^ growth every ancestor of a deeper sibling would pay
+            child_costs = list()
+            for child in node.children:
+                growth = merged_area(child.bounds, bounds)
+                if not child.is_leaf:
+                    growth -= surface_area(child.bounds)
+                child_costs.append(growth + inherited)
+            if cost < min(child_costs):
+                break
+            node = node.children[child_costs.index(min(child_costs))]
+        # pair leaf & node under a new branch
+        branch = Node(node.bounds + bounds)
+        branch.parent = node.parent
+        if node.parent is None:
+            self.root = branch
+        else:
+            siblings = node.parent.children
+            siblings[siblings.index(node)] = branch
+        branch.children = [node, leaf]
+        node.parent = leaf.parent = branch
+        self.refit(branch.parent)
+
+    def insert_many(self, items: Dict[Any, AxisAlignedBoundingBox]):
+        """Adds a whole batch of {item: bounds} as one balanced subtree
+        much faster than insert-ing each item when loading a map"""
+        if len(items) < 2:
+            for item, bounds in items.items():
+                self.insert(item, bounds)
+            return
+        for item in items:
+            if item in self.leaves:
+                self.remove(item)
+        leaves = [Node(bounds, item) for item, bounds in items.items()]
+        self.leaves.update({leaf.item: leaf for leaf in leaves})
+        self.version += 1
+        subtree = build_leaves(leaves)
+        if self.root is None:
+            self.root = subtree
+        else:
+            branch = Node(self.root.bounds + subtree.bounds)
+            branch.children = [self.root, subtree]
+            self.root.parent = subtree.parent = branch
+            self.root = branch
+            # ^ cheap, but many batches stack up a spine of subtrees; rebuild once they've all arrived
+
+    def rebuild(self):
+        """Builds the whole tree again, top-down, from it's leaves
+        balanced however the leaves arrived, e.g. after a map streams in as many small batches"""
+        leaves = list(self.leaves.values())
+        self.version += 1
+        if len(leaves) == 0:
+            self.root = None
+            return
+        self.root = build_leaves(leaves)
+        self.root.parent = None
+
+    def remove(self, item: Any):
+        leaf = self.leaves.pop(item)
+        self.version += 1
+        branch = leaf.parent
+        if branch is None:
+            self.root = None
+            return
+        # replace the branch with leaf's sibling
+        sibling = branch.children[0] if branch.children[1] is leaf else branch.children[1]
+        sibling.parent = branch.parent
+        if branch.parent is None:
+            self.root = sibling
+        else:
+            siblings = branch.parent.children
+            siblings[siblings.index(branch)] = sibling
+            self.refit(sibling.parent)
+
+    def refit(self, node: Union[Node, None]):
+        """Recalculates bounds from node up to the root"""
+        while node is not None:
+            left, right = node.children
+            node.bounds = left.bounds + right.bounds
+            node = node.parent
+
+    def query(self, frustum: Frustum) -> Generator[Any, None, None]:
+        """yields each item with bounds touching frustum"""
+        if self.root is None:
+            return
+        stack = [self.root]
+        while len(stack) > 0:
+            node = stack.pop()
+            result = frustum.classify(node.bounds)
+            if result == Frustum.OUTSIDE:
+                continue
+            if result == Frustum.INSIDE:  # no need to test anything below this node
+                yield from self.items(node)
+            elif node.is_leaf:
+                yield node.item
+            else:
+                stack.extend(node.children)
+
+    def items(self, node: Node) -> Generator[Any, None, None]:
+        """yields the item of every leaf below node"""
+        stack = [node]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node.is_leaf:
+                yield node.item
+            else:
+                stack.extend(node.children)
+
+
+def build_leaves(leaves: List[Node]) -> Node:
+    """The root of a new subtree over leaves, see build"""
+    centres = np.array([[*(leaf.bounds.mins + leaf.bounds.maxs)] for leaf in leaves]) / 2
+    return build(leaves, centres, np.arange(len(leaves)))
+
+
+def build(leaves: List[Node], centres: np.ndarray, indices: np.ndarray) -> Node:
+    """Top-down build, splitting leaves[indices] in half along the axis their centres are most spread out on"""
+    if len(indices) == 1:
+        return leaves[indices[0]]
+    axis = np.argmax(np.ptp(centres[indices], axis=0))
+    indices = indices[np.argsort(centres[indices, axis], kind="stable")]
+    half = len(indices) // 2
+    left, right = build(leaves, centres, indices[:half]), build(leaves, centres, indices[half:])
+    branch = Node(left.bounds + right.bounds)
+    branch.children = [left, right]
+    left.parent = right.parent = branch
+    return branch
+
+
+def surface_area(aabb: AxisAlignedBoundingBox) -> float:
+    mins, maxs = aabb.mins, aabb.maxs
+    x, y, z = maxs.x - mins.x, maxs.y - mins.y, maxs.z - mins.z
+    return 2 * (x * y + y * z + z * x)
+
+
+def merged_area(a: AxisAlignedBoundingBox, b: AxisAlignedBoundingBox) -> float:
+    """surface_area(a + b), without building the merged AABB"""
+    x = max(a.maxs.x, b.maxs.x) - min(a.mins.x, b.mins.x)
+    y = max(a.maxs.y, b.maxs.y) - min(a.mins.y, b.mins.y)
+    z = max(a.maxs.z, b.maxs.z) - min(a.mins.z, b.mins.z)
+    return 2 * (x * y + y * z + z * x)
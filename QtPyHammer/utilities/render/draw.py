@@ -1,3 +1,4 @@
+import numpy as np
 import OpenGL.GL as gl  # imagine a python binding with gl.Begin not gl.glBegin
 
 
@@ -43,33 +44,86 @@ def dot_grid_generator(min_x, min_y, max_x, max_y, scale):
     max_x = snap(max_x)
     min_y = snap(min_y)
     max_y = snap(max_y)
-    for x in range(min_x, min_y + 1, scale):
-        for y in range(min_x, min_y + 1, scale):
+    for x in range(min_x, max_x + 1, scale):
+        for y in range(min_y, max_y + 1, scale):
             yield x, y
 
 
-def dot_grid(min_x, min_y, max_x, max_y, scale=64, colour=(.5, .5, .5)):
-    gl.glBegin(gl.GL_POINTS)
-    gl.glColor(*colour)
-    for x, y in dot_grid_generator(min_x, min_y, max_x, max_y, scale):
-        # you don't have to generate the grid every frame by the way
-        gl.glVertex(x, y)
-    gl.glEnd()
+def dot_grid_vertices(min_x, min_y, max_x, max_y, scale, colour=(.5, .5, .5)):
+    """the points of dot_grid_generator, as helper vertices"""
+    xs = np.arange(min_x // scale * scale, max_x // scale * scale + 1, scale)
+    ys = np.arange(min_y // scale * scale, max_y // scale * scale + 1, scale)
+    vertices = np.zeros((len(xs), len(ys), 6), dtype=np.float32)
+    vertices[..., 0] = xs[:, np.newaxis]
+    vertices[..., 1] = ys[np.newaxis, :]
+    vertices[..., 3:] = colour
+    return vertices.reshape(-1, 6)
 
 
-def origin_marker(scale=128):
-    gl.glLineWidth(2)
-    gl.glBegin(gl.GL_LINES)
-    gl.glColor(1, 0, 0)
-    gl.glVertex(0, 0, 0)
-    gl.glVertex(scale, 0, 0)
-    gl.glColor(0, 1, 0)
-    gl.glVertex(0, 0, 0)
-    gl.glVertex(0, scale, 0)
-    gl.glColor(0, 0, 1)
-    gl.glVertex(0, 0, 0)
-    gl.glVertex(0, 0, scale)
-    gl.glEnd()
+def origin_marker_vertices(scale=128):
+    """red, green & blue lines along the +X, +Y & +Z axes, as helper vertices"""
+    vertices = []
+    for axis in range(3):
+        colour = [0, 0, 0]
+        colour[axis] = 1
+        end = [0, 0, 0]
+        end[axis] = scale
+        vertices.extend([(0, 0, 0, *colour), (*end, *colour)])
+    return np.array(vertices, dtype=np.float32)
+
+
+class Helper:
+    """Editor geometry (grids, markers etc.) kept in it's own buffer & vertex array
+    vertices are (x, y, z, r, g, b) & only re-uploaded when set is given different arguments
+    draw with the "helper" shader"""
+    def __init__(self, mode, vertex_function, line_width=1):
+        self.mode = mode  # GL_POINTS, GL_LINES etc.
+        self.vertex_function = vertex_function
+        self.line_width = line_width
+        self.arguments = None  # the arguments vertex_function was last called with
+        self.vertex_array = None  # OpenGL handles, generated on the first upload
+        self.buffer = None
+        self.count = 0
+
+    def set(self, *args):
+        """Regenerate vertices, if args have changed"""
+        if args == self.arguments:
+            return
+        self.arguments = args
+        vertices = self.vertex_function(*args)
+        previous_array_buffer = gl.glGetIntegerv(gl.GL_ARRAY_BUFFER_BINDING)
+        if self.vertex_array is None:
+            self.vertex_array = gl.glGenVertexArrays(1)
+            self.buffer = gl.glGenBuffers(1)
+            gl.glBindVertexArray(self.vertex_array)
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.buffer)
+            gl.glEnableVertexAttribArray(0)  # vertex_position
+            gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, gl.GLvoidp(0))
+            gl.glEnableVertexAttribArray(3)  # vertex_colour
+            gl.glVertexAttribPointer(3, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, gl.GLvoidp(12))
+            gl.glBindVertexArray(0)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.buffer)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, vertices.nbytes, vertices, gl.GL_STATIC_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, previous_array_buffer)
+        self.count = len(vertices)
+
+    def draw(self):
+        if self.count == 0:
+            return
+        gl.glLineWidth(self.line_width)
+        gl.glBindVertexArray(self.vertex_array)
+        gl.glDrawArrays(self.mode, 0, self.count)
+        gl.glBindVertexArray(0)
+
+
+def dot_grid():
+    """Helper for a grid of points, grid.set(min_x, min_y, max_x, max_y, scale)"""
+    return Helper(gl.GL_POINTS, dot_grid_vertices)
+
+
+def origin_marker():
+    """Helper for the origin marker, marker.set(scale)"""
+    return Helper(gl.GL_LINES, origin_marker_vertices, line_width=2)
 
 
 def ray(origin, direction, distance=4096):
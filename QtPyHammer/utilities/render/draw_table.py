@@ -0,0 +1,113 @@
+"""Where each renderable of one type is in the shared buffers, & whether it's drawn, as NumPy arrays indexed by slot"""
+from __future__ import annotations
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+
+SELECTED = 1
+HOVERED = 2
+# ^ flags in the first byte of each slot's state, see the "renderable_state" attribute in shaders/glsl/*.vert
+
+
+class DrawTable:
+    """One row per slot; a renderable keeps it's slot until it's removed, then the slot is reused
+    visible is a bitmask over slots, so hiding or showing thousands of renderables is one vectorized step
+    each View turns the visible rows inside it's frustum into draw commands, see View.draw_commands"""
+    columns = ("index_start", "index_length", "base_vertex", "vertex_count", "index_size")
+    # ^ index_start & index_length in bytes, base_vertex & vertex_count in vertices, index_size in bytes per index
+    slots: Dict[tuple, int]  # {renderable: slot}
+    renderables: List[tuple]  # [renderable, or None if the slot is free]
+    rows: np.ndarray  # int64 (slots, 5), see columns
+    centres: np.ndarray  # float64 (slots, 3), the centre of each renderable's bounds
+    visible: np.ndarray  # bool (slots,), True if the slot is drawn
+    states: np.ndarray  # uint8 (slots, 4), flags & a tint's (r, g, b); uploaded for shaders, see Manager.upload_states
+
+    def __init__(self):
+        self.slots = dict()
+        self.renderables = list()
+        self.free = list()
+        # ^ [slot], pop() hands out the lowest new slot, or the last one freed
+        self.rows = np.zeros((0, len(self.columns)), dtype=np.int64)
+        self.centres = np.zeros((0, 3), dtype=np.float64)
+        self.visible = np.zeros(0, dtype=bool)
+        self.states = np.zeros((0, 4), dtype=np.uint8)
+        self.version = 0
+        # ^ changes whenever rows or visible do, so views know to rebuild their draw commands
+        self.changed_states = None
+        # ^ (first, end) slots with states changed since the last upload, or None
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __contains__(self, renderable: tuple) -> bool:
+        return renderable in self.slots
+
+    def place(self, renderable: tuple, index_span: tuple, vertex_span: tuple, stride: int, index_size: int) -> int:
+        """Records where renderable's indices & vertices are, giving it a slot if it doesn't have one
+        new slots aren't visible until set_visible says so"""
+        slot = self.slots.get(renderable)
+        if slot is None:
+            if len(self.free) == 0:
+                self.grow()
+            slot = self.free.pop()
+            self.slots[renderable] = slot
+            self.renderables[slot] = renderable
+        (index_start, index_length), (vertex_start, vertex_length) = index_span, vertex_span
+        self.rows[slot] = (index_start, index_length, vertex_start // stride, vertex_length // stride, index_size)
+        self.version += 1
+        return slot
+
+    def grow(self):
+        """Doubles the number of slots"""
+        old_size = len(self.renderables)
+        new_size = max(old_size * 2, 64)
+        extra = new_size - old_size
+        self.rows = np.concatenate([self.rows, np.zeros((extra, len(self.columns)), dtype=np.int64)])
+        self.centres = np.concatenate([self.centres, np.zeros((extra, 3), dtype=np.float64)])
+        self.visible = np.concatenate([self.visible, np.zeros(extra, dtype=bool)])
+        self.states = np.concatenate([self.states, np.zeros((extra, 4), dtype=np.uint8)])
+        self.renderables.extend([None] * extra)
+        self.free = list(range(new_size - 1, old_size - 1, -1)) + self.free
+
+    def remove(self, renderable: tuple):
+        slot = self.slots.pop(renderable)
+        self.renderables[slot] = None
+        self.rows[slot] = 0
+        self.visible[slot] = False
+        if self.states[slot].any():  # the next renderable in this slot starts plain
+            self.states[slot] = 0
+            self.touch_states(np.array([slot]))
+        self.free.append(slot)
+        self.version += 1
+
+    def slots_of(self, renderables: Iterable[tuple]) -> np.ndarray:
+        return np.array([self.slots[renderable] for renderable in renderables], dtype=np.int64)
+
+    def set_visible(self, slots: np.ndarray, visible: bool = True):
+        self.visible[slots] = visible
+        self.version += 1
+
+    def set_state(self, slots: np.ndarray, flag: int, on: bool = True, tint: tuple = None):
+        """Sets or clears flag for each slot, & optionally it's tint as (r, g, b) bytes
+        only the 4 byte states from the first to the last changed slot are uploaded again, never vertices"""
+        if on:
+            self.states[slots, 0] |= flag
+        else:
+            self.states[slots, 0] &= ~np.uint8(flag)
+        if tint is not None:
+            self.states[slots, 1:] = tint
+        self.touch_states(slots)
+
+    def touch_states(self, slots: np.ndarray):
+        """Widens changed_states to cover slots"""
+        if len(slots) == 0:
+            return
+        first, end = int(slots.min()), int(slots.max()) + 1
+        if self.changed_states is not None:
+            first, end = min(first, self.changed_states[0]), max(end, self.changed_states[1])
+        self.changed_states = (first, end)
+
+    def spans(self) -> List[tuple]:
+        """[(index_start, index_length)] of each visible slot, sorted"""
+        return sorted(map(tuple, self.rows[self.visible, :2].tolist()))
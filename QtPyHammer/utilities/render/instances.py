@@ -0,0 +1,95 @@
+"""Per-instance attributes, for drawing many copies of one model in a single call"""
+from __future__ import annotations
+from typing import Dict, Iterable, List
+
+import numpy as np
+import OpenGL.GL as gl
+
+
+class Instances:
+    """Every instance of one model, packed into an instance attribute buffer
+    drawn with glDrawElementsInstanced, see obj_model.vert"""
+    attributes = {"position": (5, 0, 3), "rotation": (6, 3, 3), "scale": (7, 6, 1), "tint": (8, 7, 3)}
+    # ^ {attribute: (shader location, offset, size)}, offset & size in floats
+    # rotation is (pitch, yaw, roll) in degrees, like Source's "angles" keyvalue
+    defaults = {"position": (0, 0, 0), "rotation": (0, 0, 0), "scale": (1,), "tint": (1, 1, 1)}
+    stride = 10 * 4  # bytes per instance
+    data: np.ndarray  # float32 (instances, 10), one row per instance
+    rows: Dict[int, int]  # {instance_id: row}
+    ids: List[int]  # [instance_id for each row]
+
+    def __init__(self):
+        self.data = np.zeros((0, 10), dtype=np.float32)
+        self.rows = dict()
+        self.ids = list()
+        self.next_id = 0
+        self.dirty = False  # data has changed since the last upload
+        self.buffer = None  # OpenGL buffer handle, generated by upload
+        self.buffer_size = 0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, **attributes) -> int:
+        """Returns an instance_id for changing or removing this instance later"""
+        instance_id = self.next_id
+        self.next_id += 1
+        self.rows[instance_id] = len(self.data)
+        self.ids.append(instance_id)
+        row = np.concatenate([self.defaults[a] for a in self.attributes]).astype(np.float32)
+        self.data = np.vstack([self.data, row])
+        self.update(instance_id, **attributes)
+        return instance_id
+
+    def update(self, instance_id: int, **attributes: Iterable[float]):
+        """e.g. instances.update(instance_id, position=(x, y, z), scale=2)"""
+        row = self.data[self.rows[instance_id]]
+        for attribute, value in attributes.items():
+            if attribute not in self.attributes:
+                raise RuntimeError(f"Instances have no '{attribute}' attribute")
+            location, offset, size = self.attributes[attribute]
+            row[offset:offset + size] = value
+        self.dirty = True
+
+    def remove(self, instance_id: int):
+        row = self.rows.pop(instance_id)
+        last_row = len(self.data) - 1
+        moved_id = self.ids.pop()
+        if row != last_row:  # fill the hole with the last instance
+            self.data[row] = self.data[last_row]
+            self.ids[row] = moved_id
+            self.rows[moved_id] = row
+        self.data = self.data[:last_row]
+        self.dirty = True
+
+    def upload(self):
+        """Copy data into this model's instance buffer, if it has changed"""
+        if not self.dirty:
+            return
+        if self.buffer is None:
+            self.buffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, self.buffer)
+        # NOTE: GL_COPY_WRITE_BUFFER, so GL_ARRAY_BUFFER stays bound to the vertex buffer
+        if self.data.nbytes > self.buffer_size:  # grow, with room for more instances
+            self.buffer_size = max(self.data.nbytes, self.buffer_size * 2)
+            gl.glBufferData(gl.GL_COPY_WRITE_BUFFER, self.buffer_size, None, gl.GL_DYNAMIC_DRAW)
+        if self.data.nbytes > 0:
+            gl.glBufferSubData(gl.GL_COPY_WRITE_BUFFER, 0, self.data.nbytes, self.data)
+        gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, 0)
+        self.dirty = False
+
+    def bind(self):
+        """Point the instance attributes at this model's instance buffer"""
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.buffer)
+        for location, offset, size in self.attributes.values():
+            gl.glEnableVertexAttribArray(location)
+            gl.glVertexAttribPointer(location, size, gl.GL_FLOAT, gl.GL_FALSE, self.stride, gl.GLvoidp(offset * 4))
+            gl.glVertexAttribDivisor(location, 1)
+
+    @classmethod
+    def unbind(cls):
+        """Disable instance attributes, leaving a single instance at the origin for non-instanced draws"""
+        for attribute, (location, offset, size) in cls.attributes.items():
+            gl.glDisableVertexAttribArray(location)
+            gl.glVertexAttribDivisor(location, 0)
+            gl.glVertexAttrib4f(location, *cls.defaults[attribute], *[0] * (3 - size), 1)
@@ -1,28 +1,59 @@
-import itertools
-import os
+import time
+import weakref
 
 import numpy as np
 import OpenGL.GL as gl  # imagine a python binding with gl.Begin not gl.glBegin
-from OpenGL.GL.shaders import compileShader, compileProgram
 
 from . import bufferize
-from . import draw
+from ..physics import AxisAlignedBoundingBox
+from .allocator import Allocator
+from .bvh import BoundingVolumeHierarchy
+from .draw_table import DrawTable, HOVERED, SELECTED
+from .instances import Instances
+from .shader_cache import ProgramCache
+from .shaders import ShaderLibrary
+from .upload import UploadScheduler
+from .vertex_format import formats
 
 
 class Manager:
-    """Manages OpenGL buffers and gives handles for rendering & hiding objects"""
-    def __init__(self, draw_distance: float, field_of_view: float, memory_limit: int):
+    """Manages OpenGL buffers and gives handles for rendering & hiding objects
+    one Manager per map, shared by every View (viewport) of that map"""
+    camera_binding = 0  # uniform buffer binding point of the "Camera" block in every shader
+    selection_tint = (255, 64, 64)  # (r, g, b) bytes, selections are red, like in Hammer
+    face_tint = (1.0, .3, .3)  # multiplies the colour of selected faces, see View.draw_faces
+    bufferize_batch = 4096  # brushes per job given to the executor, smaller maps & edits are bufferized right away
+    # ^ a cold process pool takes ~1s to spawn, about as long as bufferizing 10,000 brushes on the calling thread
+
+    def __init__(self, draw_distance: float, field_of_view: float, memory_limit: int, upload_budget: float = 4.0,
+                 base_vertex: bool = True, executor=None):
         self.draw_distance = draw_distance
         self.field_of_view = field_of_view
+        # ^ defaults for each View
         MB = 10 ** 6  # ~ 1 Megabyte
         self.memory_limit = memory_limit * MB
         # ^ can't check against the GPU's limits until AFTER init_GL is called
-        self.render_mode = "flat"
-        self.buffer_update_queue = []
-        # ^ [(buffer, start, length, data)]
-        # goes directly into glBufferSubData()
-        self.vertex_buffer_size = self.memory_limit // 2
-        self.index_buffer_size = self.memory_limit // 2
+        self.buffer_update_queue = UploadScheduler(upload_budget)
+        # ^ .append((buffer, start, length, data))
+        # goes into glBufferSubData(), upload_budget milliseconds' worth each frame
+        self.buffer_size_limit = self.memory_limit // 2
+        # ^ hard cap on each buffer; buffers start small & double in size as they fill
+        initial_buffer_size = min(8 * MB, self.buffer_size_limit)
+        self.buffer = {"vertex": None, "index": None}
+        # ^ {buffer: OpenGL buffer handle}, generated in initialise
+        self.buffer_target = {"vertex": gl.GL_ARRAY_BUFFER, "index": gl.GL_COPY_WRITE_BUFFER}
+        # ^ where uploads & compaction find each buffer, see bind_upload_targets
+        # NOTE: not GL_ELEMENT_ARRAY_BUFFER, that binding belongs to whichever vertex array is bound
+        self.buffer_gpu_size = {"vertex": 0, "index": 0}
+        # ^ {buffer: bytes}, resized to match buffer_allocation_map in update
+        self.compaction_pending = False
+        self.deferred_renderables = []
+        # ^ [(renderable_type, renderables)], waiting for compaction to make room
+        self.executor = executor
+        # ^ concurrent.futures.Executor that bufferizes big batches of brushes, see add_brushes
+        # -- None bufferizes everything on the calling thread
+        self.bufferizing = list()
+        # ^ [Future] of bufferize.brushes, collected by update as they finish
         self.buffer_location = {}
         # ^ renderable: {"vertex": (start, length),
         #                "index":  (start, length)}
@@ -33,224 +64,368 @@ class Manager:
         # for tinting in the editor (selection, displacement draw mode etc.)...
         # we need to identify the sub-objects of a givern renderable
         # sub-spans, which would be calculated in a given renderable's bufferize function
+        # -- brush.faces: bufferize.face_spans, see select_faces
 
         # OBJ MODEL: obj_model.o[], obj_model.g[]
         # BRUSH: brush.faces
         # DISPLACEMENT: displacement.triangle  (is_walkable tint)
 
         # converting buffer data out into other objects could be VERY cool
-        self.buffer_allocation_map = {"vertex": {"brush": [],
-                                                 "displacement": [],
-                                                 "obj_model": []},
-                                      "index": {"brush": [],
-                                                "displacement": [],
-                                                "obj_model": []}}
-        # ^ buffer: {type: [(start, length)]}
-        self.draw_calls = {"brush": [], "displacement": [], "obj_model": []}
-        # ^ {renderable_type: [span, ...]}
-        # where span = (start, length)
+        self.lod_distance = 1024
+        # ^ displacements closer than this are drawn in full, each doubling of distance halves their resolution
+        self.base_vertex = base_vertex
+        # ^ draw with glMultiDrawElementsBaseVertex? GLES 3.0 can't, GLES 3.2 has no multi draws
+        # with it, indices stay local to their renderable; without, they are rebased on the CPU before upload
+        # renderables are added before initialise, so this has to be known from the start
+        self.local_indices = dict()
+        # ^ {renderable: uint32 indices}, as bufferized, before rebasing; kept only without base vertex
+        # -- compaction moves vertices, see rebase_indices
+        self.buffer_allocation_map = {"vertex": Allocator(initial_buffer_size),
+                                      "index": Allocator(initial_buffer_size)}
+        # ^ {buffer: Allocator}, tracks used & free spans (start, length) in each buffer
+        self.tables = {"brush": DrawTable(), "displacement": DrawTable(), "obj_model": DrawTable()}
+        # ^ {renderable_type: DrawTable}, a slot for every renderable in buffer_location
+        # -- table.visible is set for every slot the opaque pass draws, see set_drawn
         self.dont_draw = set()
-        # ^ {renderable, ...}
+        # ^ {renderable, ...} hidden by hide
+        self.translucent = set()
+        # ^ {("brush", brush.id), ...} see-through tool brushes, never visible in tables["brush"]
+        # -- each View draws them blended, back to front, after everything opaque (see View.translucent_draws)
+        self.displaced = set()
+        # ^ {("brush", brush.id), ...} brushes drawn as their displacements instead, never visible in tables["brush"]
+        self.state_buffer = {renderable_type: None for renderable_type in self.tables}
+        # ^ {renderable_type: OpenGL buffer handle}, a copy of each table.states, see upload_states
+        self.state_buffer_size = {renderable_type: None for renderable_type in self.tables}
+        # ^ {renderable_type: bytes}, re-specified whenever a table grows; None until the first upload
+        self.slot_buffer = None
+        # ^ OpenGL buffer handle, uint32 0, 1, 2... one per slot of the largest table
+        # -- read per instance, so base_instance hands each draw it's slot, for picking (see View.draw_picks)
+        self.slot_buffer_size = 0
+        # ^ slots in slot_buffer
+        self.hovered = set()
+        # ^ {renderable, ...} with the HOVERED flag, see hover
+        self.selected_faces = dict()
+        # ^ {("brush", brush.id): {(first_index, index_count), ...}} see select_faces
+        self.faces_version = 0
+        # ^ changes with selected_faces, so views know to rebuild their face commands
+        self.face_vertices = dict()
+        # ^ {("brush", brush.id): {face.id: (first_vertex, vertex_count)}} from bufferize.brush_faces
+        # -- which face a pick hit, without bufferizing the brush again; see View.resolve_pick
+
+        self.bvh = BoundingVolumeHierarchy()
+        # ^ bounds of every renderable in buffer_location, queried by View.cull each frame
 
         self.dynamics = dict()
-        # {renderable: {"position": [x, y, z]}}
-
-    def initialise(self, shader_folder):
-        gl.glClearColor(0.0, 0.0, 0.0, 0.0)
-        gl.glEnable(gl.GL_CULL_FACE)
-        gl.glEnable(gl.GL_DEPTH_TEST)
-        gl.glFrontFace(gl.GL_CW)
-        gl.glCullFace(gl.GL_BACK)
-        gl.glPointSize(4)
-        gl.glPolygonMode(gl.GL_BACK, gl.GL_LINE)
-        self.compile_shaders(shader_folder)
-
-    def compile_shaders(self, folder):
-
-        def make_shader(file, shader_type):
-            return compileShader(open(os.path.join(folder, file), "rb"), shader_type)
-
-        # shader construction could be automated some
-        # the shader names have a clear format: f"{renderable}.vert", f"{style}_{renderable}.frag"
-        # use os.listdir to assemble all shaders?
-        vert_brush = make_shader("brush.vert", gl.GL_VERTEX_SHADER)
-        vert_displacement = make_shader("displacement.vert", gl.GL_VERTEX_SHADER)
-        vert_obj_model = make_shader("obj_model.vert", gl.GL_VERTEX_SHADER)
-        frag_flat_brush = make_shader("flat_brush.frag", gl.GL_FRAGMENT_SHADER)
-        frag_flat_displacement = make_shader("flat_displacement.frag", gl.GL_FRAGMENT_SHADER)
-        frag_flat_obj_model = make_shader("flat_obj_model.frag", gl.GL_FRAGMENT_SHADER)
-        frag_stripey_brush = make_shader("stripey_brush.frag", gl.GL_FRAGMENT_SHADER)
-        self.shader = {"flat": {}, "stripey": {}, "textured": {}, "shaded": {}}
-        # ^ {"render_mode": {"target": program}}
-        self.shader["flat"]["brush"] = compileProgram(vert_brush, frag_flat_brush)
-        self.shader["flat"]["displacement"] = compileProgram(vert_displacement, frag_flat_displacement)
-        self.shader["flat"]["obj_model"] = compileProgram(vert_obj_model, frag_flat_obj_model)
-        self.shader["stripey"]["brush"] = compileProgram(vert_brush, frag_stripey_brush)
-        for render_mode_dict in self.shader.values():
-            for program in render_mode_dict.values():
-                gl.glLinkProgram(program)
-        self.uniform = {"flat": {"brush": {}, "displacement": {},
-                                 "obj_model": {"location": None}},
-                        "stripey": {"brush": {}},
-                        "textured": {},
-                        "shaded": {}}
-        # ^ style: {target: {uniform: location}}
-        for style, targets in self.uniform.items():
-            for target in targets:
-                shader = self.shader[style][target]
-                gl.glUseProgram(shader)
-                for uniform in self.uniform[style][target]:
-                    self.uniform[style][target][uniform] = gl.glGetUniformLocation(shader, uniform)
-                self.uniform[style][target]["matrix"] = gl.glGetUniformLocation(shader, "MVP_matrix")
-        gl.glUseProgram(0)
+        # ^ {renderable: Instances}, see add_instance
+        self.shader_cache = ProgramCache()
+        # ^ set .folder to keep linked programs between launches, see shader_cache.py
+        self.shaders = None
+        # ^ ShaderLibrary, made by compile_shaders
+        self.shader_init_time = None
+        # ^ milliseconds the last compile_shaders took
+        self.placeholder_texture = None
+        # ^ 1x1 white texture, bound by every View until materials are loaded
+        self.initialised = False
+        # ^ shared resources are made once, by the first View to initialise
+        self.views = weakref.WeakSet()
+        # ^ {View}, every viewport drawing from this manager
+
+    def changed(self):
+        """Something visible has changed, every view's next frame will look different"""
+        for view in list(self.views):
+            view.changed()
+
+    @property
+    def busy(self) -> bool:
+        """Work left for update, which needs more frames to finish"""
+        return len(self.buffer_update_queue) > 0 or self.compaction_pending or len(self.bufferizing) > 0
+
+    def index_dtype(self, vertex_count):
+        """uint16 if base vertex draws can keep indices local & vertex_count fits, otherwise uint32"""
+        return np.uint16 if self.base_vertex and vertex_count <= 2 ** 16 else np.uint32
+
+    @property
+    def draw_calls(self):
+        """{renderable_type: [(start, length)]} merged index spans of everything the opaque pass draws"""
+        return {renderable_type: merge_spans(table.spans()) for renderable_type, table in self.tables.items()}
+
+    def level_of_detail(self, slots, camera_position):
+        """(index starts, index lengths) to draw each displacement in slots of tables["displacement"] at
+        displacements hold every level of detail in their index span, see bufferize.disp_lods"""
+        table = self.tables["displacement"]
+        index_starts, index_lengths, base_vertices, vertex_counts, index_sizes = table.rows[slots].T
+        starts, lengths = index_starts.copy(), index_lengths.copy()
+        powers = np.rint(np.log2(np.maximum(np.sqrt(vertex_counts) - 1, 1))).astype(np.int64)
+        distances = np.linalg.norm(table.centres[slots] - camera_position, axis=1)
+        levels = np.floor(np.log2(np.maximum(distances / self.lod_distance, 1))).astype(np.int64)
+        powers[(powers < 1) | ((2 ** powers + 1) ** 2 != vertex_counts)] = 0
+        # ^ not a grid of displacement vertices, every index is drawn
+        for power in np.unique(powers[powers > 0]):
+            level_lengths = np.array(bufferize.disp_lods(int(power))[1], dtype=np.int64)
+            level_starts = np.cumsum(level_lengths) - level_lengths
+            is_power = powers == power
+            level = np.minimum(levels[is_power], len(level_lengths) - 1)
+            starts[is_power] += level_starts[level] * index_sizes[is_power]
+            lengths[is_power] = level_lengths[level] * index_sizes[is_power]
+        return starts, lengths
+
+    def initialise(self, shader_folder, glsl_version):
+        """Makes the buffers, programs & textures every View shares; see View.initialise"""
+        if self.base_vertex and gl.glGetString(gl.GL_VERSION).startswith(b"OpenGL ES"):
+            raise RuntimeError("OpenGL ES can't draw with base vertex, make the Manager with base_vertex=False")
+        self.compile_shaders(shader_folder, glsl_version)
+        self.placeholder_texture = gl.glGenTextures(1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.placeholder_texture)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGBA8, 1, 1, 0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, b"\xff" * 4)
+        # ^ white, every sampler reads this until materials are loaded
         # Buffers
-        self.VERTEX_BUFFER, self.INDEX_BUFFER = gl.glGenBuffers(2)
-        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.VERTEX_BUFFER)
-        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.vertex_buffer_size, None, gl.GL_DYNAMIC_DRAW)
-        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.INDEX_BUFFER)
-        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, self.index_buffer_size, None, gl.GL_DYNAMIC_DRAW)
-        # https://github.com/snake-biscuits/QtPyHammer/wiki/Rendering:-Vertex-Format
-        gl.glEnableVertexAttribArray(0)  # vertex_position
-        gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 44, gl.GLvoidp(0))
-        gl.glEnableVertexAttribArray(1)  # vertex_normal (brush only)
-        gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_TRUE, 44, gl.GLvoidp(12))
-        gl.glEnableVertexAttribArray(2)  # vertex_uv
-        gl.glVertexAttribPointer(2, 2, gl.GL_FLOAT, gl.GL_FALSE, 44, gl.GLvoidp(24))
-        gl.glEnableVertexAttribArray(3)  # editor_colour
-        gl.glVertexAttribPointer(3, 3, gl.GL_FLOAT, gl.GL_FALSE, 44, gl.GLvoidp(32))
-        gl.glEnableVertexAttribArray(4)  # blend_alpha (displacement only)
-        gl.glVertexAttribPointer(4, 1, gl.GL_FLOAT, gl.GL_FALSE, 44, gl.GLvoidp(32))
-
-    def draw(self):
-        gl.glUseProgram(0)
-        draw.dot_grid(-2048, 2048, -2048, 2048, 64)
-        draw.origin_marker()
-        # TODO: dither transparency for tooltextures (skip, hint, trigger, clip)
-        for renderable_type, spans in self.draw_calls.items():
-            gl.glUseProgram(self.shader[self.render_mode][renderable_type])
-            for start, length in spans:
-                count = length // 4
-                gl.glDrawElements(gl.GL_TRIANGLES, count, gl.GL_UNSIGNED_INT, gl.GLvoidp(start))
-        # render models separately, since they are instanced
-        for renderable in self.dynamics:
-            # translate with shader uniforms
-            renderable_type, _id = renderable
-            location_uniform = self.uniform[self.render_mode][renderable_type]["location"]
-            position = self.dynamics[renderable]["position"]
-            gl.glUniform3f(location_uniform, *position)
-            gl.glUseProgram(self.shader[self.render_mode][renderable[0]])
-            start, length = self.buffer_location[renderable]["index"]
-            count = length // 4
-            gl.glDrawElements(gl.GL_TRIANGLES, count, gl.GL_UNSIGNED_INT, gl.GLvoidp(start))
+        for buffer in self.buffer:
+            self.buffer[buffer] = self.new_buffer(buffer)
+        for renderable_type in self.state_buffer:
+            self.state_buffer[renderable_type] = gl.glGenBuffers(1)
+        self.slot_buffer = gl.glGenBuffers(1)
+        self.upload_states()
+        self.initialised = True
+
+    def compile_shaders(self, folder, glsl_version):
+        """Finds the shaders in folder, but only compiles the "flat" render mode every View starts with
+        other render modes are compiled the first time View.set_render_mode selects them"""
+        start = time.perf_counter()
+        self.shaders = ShaderLibrary(folder, glsl_version, self.shader_cache, {"Camera": self.camera_binding})
+        self.helper_shader = self.shaders.program("flat", "helper")
+        for renderable_type in self.tables:
+            self.shaders.program("flat", renderable_type)
+        self.shader_init_time = (time.perf_counter() - start) * 1000
+
+    def new_buffer(self, buffer):
+        """Generates an empty buffer, sized to fit everything buffer_allocation_map has handed out"""
+        size = self.buffer_allocation_map[buffer].size
+        handle = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, handle)
+        gl.glBufferData(gl.GL_COPY_WRITE_BUFFER, size, None, gl.GL_DYNAMIC_DRAW)
+        self.buffer_gpu_size[buffer] = size
+        return handle
 
     def update(self):
-        """Updates buffers & shader uniforms"""
+        """Uploads waiting data to the shared buffers, called by each View before it draws"""
+        self.upload_states()
+        self.bind_upload_targets()
+        if self.compaction_pending:
+            self.compact()
+            deferred, self.deferred_renderables = self.deferred_renderables, []
+            for renderable_type, renderables in deferred:
+                self.add_renderables(renderable_type, renderables)
+        self.collect_bufferized()
+        self.resize_buffers()  # grown space must exist on the GPU before it's written to
         if len(self.buffer_update_queue) > 0:
-            # do one buffer update
-            update = self.buffer_update_queue.pop(0)
-            buffer, start, length, data = update
-            gl.glBufferSubData(buffer, start, length, data)
-        # update shader uniforms
-        model_view_matrix = gl.glGetFloatv(gl.GL_MODELVIEW_MATRIX)
-        for renderable_type in self.shader[self.render_mode]:
-            gl.glUseProgram(self.shader[self.render_mode][renderable_type])
-            if "matrix" in self.uniform[self.render_mode][renderable_type]:
-                location = self.uniform[self.render_mode][renderable_type]["matrix"]
-                gl.glUniformMatrix4fv(location, 1, gl.GL_FALSE, model_view_matrix)
-
-    def track_span(self, buffer, renderable_type, span_to_track):
-        # adds span_to_track to self.buffer_allocation_map
-        # allowing for proper memory management of buffers to continue
-        target = self.buffer_allocation_map[buffer][renderable_type]
-        updated_map = add_span(target, span_to_track)
-        self.buffer_allocation_map[buffer][renderable_type] = updated_map
-
-    def untrack_span(self, buffer, renderable_type, span_to_untrack):
-        # removes span from self.buffer_allocation_map
-        # doesn't affect draw_calls or buffer_location
-        # the data remains in the buffer, allowing for an "undo"
-        # so long as the data hasn't been overwritten
-        target = self.buffer_allocation_map[buffer][renderable_type]
-        updated_map = remove_span(target, span_to_untrack)
-        self.buffer_allocation_map[buffer][renderable_type] = updated_map
+            self.buffer_update_queue.drain()
+        for instances in self.dynamics.values():
+            instances.upload()
+
+    def upload_states(self):
+        """Copies changed table.states into state_buffer; the whole table after it grows
+        & grows slot_buffer to count past the largest table"""
+        for renderable_type, table in self.tables.items():
+            size = table.states.nbytes
+            if size != self.state_buffer_size[renderable_type]:
+                gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, self.state_buffer[renderable_type])
+                gl.glBufferData(gl.GL_COPY_WRITE_BUFFER, max(size, 4), table.states if size > 0 else None,
+                                gl.GL_DYNAMIC_DRAW)
+                # ^ the same handle, so vertex arrays reading it don't need binding again
+                self.state_buffer_size[renderable_type] = size
+            elif table.changed_states is not None:
+                first, end = table.changed_states
+                gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, self.state_buffer[renderable_type])
+                gl.glBufferSubData(gl.GL_COPY_WRITE_BUFFER, first * 4, (end - first) * 4, table.states[first:end])
+            table.changed_states = None
+        slots = max(max(len(table.renderables) for table in self.tables.values()), 1)
+        if slots != self.slot_buffer_size:
+            gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, self.slot_buffer)
+            gl.glBufferData(gl.GL_COPY_WRITE_BUFFER, slots * 4, np.arange(slots, dtype=np.uint32), gl.GL_STATIC_DRAW)
+            self.slot_buffer_size = slots
+        gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, 0)
+
+    def bind_upload_targets(self):
+        """Binds each buffer to it's buffer_target, for uploads & compaction"""
+        for buffer, target in self.buffer_target.items():
+            gl.glBindBuffer(target, self.buffer[buffer])
 
     def update_mapping(self, buffer, renderable_type, start, ids, lengths):
-        """Updates self.buffer_location & self.draw_calls"""
-        span = (start, sum(lengths))
-        self.track_span(buffer, renderable_type, span)
-        if buffer == "index":
-            self.draw_calls[renderable_type] = add_span(self.draw_calls[renderable_type], span)
-            if renderable_type == "displacement":  # hide displacement brush
-                brush_ids = {brush_id for brush_id, side_id in ids}
-                brush_spans = []
-                for brush_id in brush_ids:
-                    span = self.buffer_location[("brush", brush_id)]["index"]
-                    brush_spans = add_span(brush_spans, span)
-                for span in brush_spans:
-                    self.draw_calls["brush"] = remove_span(self.draw_calls["brush"], span)
+        """Updates self.buffer_location, & self.tables once the indices are mapped"""
         for renderable_id, length in zip(ids, lengths):
             renderable = (renderable_type, renderable_id)
             if renderable not in self.buffer_location:
                 self.buffer_location[renderable] = dict()
             self.buffer_location[renderable][buffer] = (start, length)
             start += length
+        if buffer == "index":  # vertices are always mapped first
+            renderables = [(renderable_type, renderable_id) for renderable_id in ids]
+            self.place(renderables)
+            self.set_drawn([r for r in renderables if r not in self.dont_draw and r not in self.translucent], True)
+            if renderable_type == "displacement":  # displacements replace their brush
+                brushes = {("brush", brush_id) for brush_id, side_id in ids}
+                self.displaced.update(brushes)
+                self.set_drawn(brushes, False)
+
+    def place(self, renderables):
+        """Copies where each renderable is in buffer_location into it's DrawTable"""
+        for renderable in renderables:
+            table, stride = self.tables[renderable[0]], formats[renderable[0]].stride
+            location = self.buffer_location[renderable]
+            vertex_count = location["vertex"][1] // stride
+            index_size = np.dtype(self.index_dtype(vertex_count)).itemsize
+            table.place(renderable, location["index"], location["vertex"], stride, index_size)
+
+    def set_drawn(self, renderables, drawn):
+        """Sets the visible bit of each renderable's slot, one vectorized step per renderable type"""
+        by_type = {renderable_type: [] for renderable_type in self.tables}
+        for renderable in renderables:
+            by_type[renderable[0]].append(renderable)
+        for renderable_type, group in by_type.items():
+            if len(group) > 0:
+                table = self.tables[renderable_type]
+                table.set_visible(table.slots_of(group), drawn)
 
-    def find_gaps(self, buffer="vertex", preferred_type=None, minimum_size=1):
-        """Generator which yields a (start, length) span for each gap which meets requirements"""
-        if minimum_size < 1:
-            raise RuntimeError("Can't search for gap smaller than 1 byte")
+    def allocate(self, buffer, lengths, alignment=1):
+        """Returns a start for each length, claiming the best fitting gaps in buffer
+        grows buffer when nothing fits, returns None if it still can't fit (claiming nothing)"""
         # "spans" are spaces in buffers holding data that is being used
         # "gaps" are unused spaces in memory that data can be assigned to
         # both are recorded with a tuple: (start, length)
-        limit_of = {"vertex": self.vertex_buffer_size, "index": self.index_buffer_size}
-        limit = limit_of[buffer]
-        buffer_map = self.buffer_allocation_map[buffer]
-        if sum([len(buffer_map[r]) for r in buffer_map]) == 0:
-            # buffer is empty, preffered_type doesn't matter
-            yield (0, limit)
-            return
-        if preferred_type not in (None, *buffer_map.keys()):
-            raise RuntimeError("Invalid preferred_type: {}".format(preferred_type))
-        span_type = {start: type for type in buffer_map for start in buffer_map[type]}
-        # ^ {"type": [*spans]} -> {span: "type"}
-        filled_spans = sorted(span_type, key=lambda s: s[0])
-        # ^ all occupied spans, sorted by start
-        prev_span = filled_spans.pop(0)
-        prev_span_end = sum(prev_span)
-        for span in filled_spans:
-            span_start, span_length = span
-            gap_start = prev_span_end + 1
-            gap_length = span_start - gap_start
-            if gap_length >= minimum_size:
-                gap = (gap_start, gap_length)
-                if preferred_type in (None, span_type[span], span_type[prev_span]):
-                    # this gap touches our preferred_type
-                    yield gap
-            prev_span = span
-            prev_span_end = span_start + span_length
-        if prev_span_end < limit:  # gap at tail of buffer
-            gap_start = prev_span_end
-            gap = (gap_start, limit - gap_start)
-            if preferred_type in (None, span_type[prev_span]):
-                # this gap touches our preferred_type
-                yield gap
+        # NOTE: consecutive allocations from the same gap are contiguous & get written in one go
+        allocator = self.buffer_allocation_map[buffer]
+        starts = []
+        for length in lengths:
+            start = allocator.allocate(length, alignment)
+            if start is None and self.grow(buffer, length + alignment):
+                start = allocator.allocate(length, alignment)
+            if start is None:
+                for claimed_start, claimed_length in zip(starts, lengths):
+                    allocator.free(claimed_start, claimed_length)
+                return None
+            starts.append(start)
+        return starts
+
+    def grow(self, buffer, length):
+        """Doubles the size of buffer (up to buffer_size_limit), so at least length more bytes fit
+        returns False if buffer is already at the limit; the GPU copy is resized in update"""
+        allocator = self.buffer_allocation_map[buffer]
+        if allocator.size >= self.buffer_size_limit:
+            return False
+        allocator.grow(min(max(allocator.size * 2, allocator.size + length), self.buffer_size_limit))
+        return True
+
+    def resize_buffers(self):
+        """Grows GPU buffers to match buffer_allocation_map, copying over their contents"""
+        for buffer, size in self.buffer_gpu_size.items():
+            if self.buffer_allocation_map[buffer].size != size:
+                self.move_spans(buffer, [(0, 0, size)])
+
+    def move_spans(self, buffer, moves):
+        """Replaces buffer with a new buffer, copying each (old_start, new_start, length) across"""
+        old_buffer = self.buffer[buffer]
+        self.buffer[buffer] = self.new_buffer(buffer)  # bound to GL_COPY_WRITE_BUFFER
+        gl.glBindBuffer(gl.GL_COPY_READ_BUFFER, old_buffer)
+        for old_start, new_start, length in merge_moves(moves):
+            gl.glCopyBufferSubData(gl.GL_COPY_READ_BUFFER, gl.GL_COPY_WRITE_BUFFER, old_start, new_start, length)
+        gl.glBindBuffer(gl.GL_COPY_READ_BUFFER, 0)
+        gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, 0)
+        gl.glDeleteBuffers(1, [old_buffer])
+        self.bind_upload_targets()  # each View rebinds it's vertex array when it next draws
+
+    def compact(self):
+        """Moves every live span to the front of its buffer, leaving all free space in one gap
+        must be called while the GL context is current, set compaction_pending to run in update"""
+        self.resize_buffers()  # queued writes can land in space allocated since the last update
+        self.buffer_update_queue.flush()  # data has to be on the GPU before it can be moved
+        old_location = self.buffer_location
+        new_location = {renderable: dict() for renderable in old_location}
+        for buffer in ("vertex", "index"):
+            allocator = Allocator(self.buffer_allocation_map[buffer].size)
+            moves = []
+            for renderable in sorted(old_location, key=lambda r: old_location[r][buffer]):
+                start, length = old_location[renderable][buffer]
+                alignment = formats[renderable[0]].stride if buffer == "vertex" else 4
+                new_start = allocator.allocate(length, alignment)  # one gap, so spans pack from 0
+                moves.append((start, new_start, length))
+                new_location[renderable][buffer] = (new_start, length)
+            self.buffer_allocation_map[buffer] = allocator
+            self.move_spans(buffer, moves)
+        if not self.base_vertex:
+            self.rebase_indices(old_location, new_location)
+        self.buffer_location = new_location
+        self.rebuild_draw_calls()
+        self.compaction_pending = False
+
+    def rebase_indices(self, old_location, new_location):
+        """Re-uploads the indices of each renderable compaction moved the vertices of, from local_indices
+        without base vertex, indices point at vertices by absolute position, so they have to follow their vertices
+        GLES can't read buffers back, so they're rebuilt from the copy kept when they were added"""
+        writes = []
+        # ^ [[start, [indices]]], neighbouring spans merged into one write
+        for renderable, location in sorted(new_location.items(), key=lambda item: item[1]["index"]):
+            vertex_start = location["vertex"][0]
+            if vertex_start == old_location[renderable]["vertex"][0]:
+                continue
+            indices = self.local_indices[renderable] + np.uint32(vertex_start // formats[renderable[0]].stride)
+            start = location["index"][0]
+            if len(writes) > 0 and writes[-1][0] + sum(i.nbytes for i in writes[-1][1]) == start:
+                writes[-1][1].append(indices)
+            else:
+                writes.append([start, [indices]])
+        target = self.buffer_target["index"]
+        for start, write_data in writes:
+            data = np.concatenate(write_data)
+            gl.glBufferSubData(target, start, data.nbytes, data)
+
+    def rebuild_draw_calls(self):
+        """Refreshes every DrawTable from buffer_location, leaving hidden renderables invisible
+        slots are kept, only the rows & visible bits change"""
+        for table in self.tables.values():
+            for renderable in [r for r in table.slots if r not in self.buffer_location]:
+                table.remove(renderable)
+        self.place(self.buffer_location)
+        self.displaced = {("brush", _id[0]) for renderable_type, _id in self.buffer_location
+                          if renderable_type == "displacement"}
+        drawn = {renderable for renderable in self.buffer_location
+                 if renderable not in self.dont_draw and renderable not in self.translucent
+                 and renderable not in self.displaced}
+        for renderable_type, table in self.tables.items():
+            table.visible[:] = False
+        self.set_drawn(drawn, True)
+
+    def buffer_stats(self):
+        """{buffer: {"size", "used", "free", "gaps", "largest_gap", "fragmentation", "limit"}}"""
+        return {buffer: {**allocator.stats(), "limit": self.buffer_size_limit}
+                for buffer, allocator in self.buffer_allocation_map.items()}
 
     def add_brushes(self, *brushes):
-        brush_data = dict()
-        # ^ {brush.id: (vertex_data, index_data)}
-        displacement_data = dict()
-        # ^ {(brush.id, face.id): (vertex_data, index_data)}
-        for brush in brushes:
-            brush_data[brush.id] = bufferize.brush(brush)
-            if brush.is_displacement:
-                for face in brush.faces:
-                    if not hasattr(face, "displacement"):
-                        continue
-                    data = bufferize.displacement(face)
-                    displacement_data[(brush.id, face.id)] = data
+        """Bufferizes brushes & queues their uploads
+        with an executor, big batches are bufferized on it's workers instead, arriving over later updates"""
+        if self.executor is None or len(brushes) <= self.bufferize_batch:
+            self.add_bufferized(*bufferize.brushes(brushes))
+            return
+        for i in range(0, len(brushes), self.bufferize_batch):
+            self.bufferizing.append(self.executor.submit(bufferize.brushes, brushes[i:i + self.bufferize_batch]))
+        self.changed()  # views keep updating until every batch is collected
+
+    def add_bufferized(self, brush_data, displacement_data, translucent_ids, face_vertices):
+        """Adds what bufferize.brushes returned"""
+        self.translucent.update(("brush", brush_id) for brush_id in translucent_ids)
+        self.face_vertices.update({("brush", brush_id): faces for brush_id, faces in face_vertices.items()})
         self.add_renderables("brush", brush_data)
         self.add_renderables("displacement", displacement_data)
 
+    def collect_bufferized(self):
+        """Adds each batch the executor has finished bufferizing, in the order they finish"""
+        finished = [future for future in self.bufferizing if future.done()]
+        for future in finished:
+            self.bufferizing.remove(future)
+            self.add_bufferized(*future.result())  # raises anything that went wrong on the worker
+        if len(finished) > 0 and len(self.bufferizing) == 0:
+            self.bvh.rebuild()  # one balanced tree for the whole map, not a batch at a time
+
     def add_obj_models(self, *obj_models):
         obj_model_data = dict()
         # ^ {_id: (vertex_data, index_data)}
@@ -263,100 +438,213 @@ class Manager:
         # renderables = {_id: (vertices, indices)}
         # self.buffer_location[(renderable_type, _id)]
         # _id may be an int or tuple of ints ("displacement", (brush.id, face.id))
-        vertex_gaps = self.find_gaps(buffer="vertex")
-        vertex_gaps = {g: [0, [], []] for g in vertex_gaps}
-        index_gaps = self.find_gaps(buffer="index", preferred_type=renderable_type)
-        index_gaps = {g: [0, [], []] for g in index_gaps}
-        index_gaps.update({g: [0, [], []] for g in self.find_gaps(buffer="index")})
-        # ^ gap: [used_length, [ids], [data]]
-        for _id in renderables:
-            vertex_data, index_data = renderables[_id]
-            vertex_data_length = len(vertex_data) * 4
-            for gap in vertex_gaps:
-                gap_start, gap_length = gap
-                used_length = vertex_gaps[gap][0]
-                free_length = gap_length - used_length
-                if vertex_data_length <= free_length:
-                    vertex_gaps[gap][0] += vertex_data_length
-                    vertex_gaps[gap][1].append(_id)
-                    vertex_gaps[gap][2].append(vertex_data)
-                    index_offset = (gap_start + used_length) // 44
-                    break
-            index_data_length = len(index_data) * 4
-            for gap in index_gaps:
-                gap_start, gap_length = gap
-                used_length = index_gaps[gap][0]
-                free_length = gap_length - used_length
-                if index_data_length <= free_length:
-                    index_gaps[gap][0] += index_data_length
-                    index_gaps[gap][1].append(_id)
-                    index_data = [i + index_offset for i in index_data]
-                    index_gaps[gap][2].append(index_data)
-                    break
-        for gap in vertex_gaps:
-            if vertex_gaps[gap][0] == 0:
-                continue  # no data to write in this gap
-            start = gap[0]
-            used_length = vertex_gaps[gap][0]
-            flattened_data = list(itertools.chain(*vertex_gaps[gap][2]))
-            vertex_data = np.array(flattened_data, dtype=np.float32)
-            update = (gl.GL_ARRAY_BUFFER, start, used_length, vertex_data)
-            self.buffer_update_queue.append(update)
-            ids = vertex_gaps[gap][1]
-            lengths = [len(d) * 4 for d in vertex_gaps[gap][2]]
-            self.update_mapping("vertex", renderable_type, start, ids, lengths)
-        for gap in index_gaps:
-            if index_gaps[gap][0] == 0:
-                continue  # no data to write in this gap
-            start = gap[0]
-            used_length = index_gaps[gap][0]
-            flattened_data = list(itertools.chain(*index_gaps[gap][2]))
-            index_data = np.array(flattened_data, dtype=np.uint32)
-            update = (gl.GL_ELEMENT_ARRAY_BUFFER, start, used_length, index_data)
+        if len(self.deferred_renderables) > 0:  # wait for compaction, in order
+            self.deferred_renderables.append((renderable_type, renderables))
+            self.changed()
+            return
+        ids = [_id for _id, (vertices, indices) in renderables.items() if len(indices) > 0]
+        if len(ids) == 0:
+            return  # nothing to draw
+        vertex_format = formats[renderable_type]
+        vertex_data = [vertex_format.vertices(renderables[_id][0]) for _id in ids]
+        index_data = [np.asarray(renderables[_id][1]).astype(self.index_dtype(len(v)), copy=False)
+                      for _id, v in zip(ids, vertex_data)]
+        # ^ local to each renderable, drawn with base vertex; uint16 whenever they fit
+        vertex_lengths = [d.nbytes for d in vertex_data]
+        index_lengths = [d.nbytes for d in index_data]
+        vertex_starts = self.allocate("vertex", vertex_lengths, alignment=vertex_format.stride)
+        # ^ aligned to the stride, so each renderable starts on a whole vertex of it's format
+        index_starts = None if vertex_starts is None else self.allocate("index", index_lengths, alignment=4)
+        if index_starts is None:  # out of space
+            if vertex_starts is not None:
+                for start, length in zip(vertex_starts, vertex_lengths):
+                    self.buffer_allocation_map["vertex"].free(start, length)
+            needed = {"vertex": sum(vertex_lengths), "index": sum(index_lengths)}
+            if not self.compaction_would_fit(needed):
+                raise RuntimeError(f"Out of buffer memory, cannot fit {needed} bytes"
+                                   f" (limit={self.buffer_size_limit} bytes per buffer)")
+            self.compaction_pending = True
+            self.deferred_renderables.append((renderable_type, renderables))
+            self.changed()
+            return
+        if not self.base_vertex:  # indices point at vertices, wherever they landed in the vertex buffer
+            self.local_indices.update({(renderable_type, _id): d for _id, d in zip(ids, index_data)})
+            index_data = [d + start // vertex_format.stride for d, start in zip(index_data, vertex_starts)]
+        self.queue_uploads("vertex", renderable_type, ids, vertex_starts, vertex_data)
+        self.queue_uploads("index", renderable_type, ids, index_starts, index_data)
+        bounds = dict()
+        # ^ {renderable: AxisAlignedBoundingBox}
+        table = self.tables[renderable_type]
+        for _id, vertices in zip(ids, vertex_data):
+            positions = vertices["position"]
+            mins, maxs = positions.min(axis=0), positions.max(axis=0)
+            bounds[(renderable_type, _id)] = AxisAlignedBoundingBox(mins.tolist(), maxs.tolist())
+            table.centres[table.slots[(renderable_type, _id)]] = (mins + maxs) / 2
+        self.bvh.insert_many(bounds)
+        self.changed()
+
+    def compaction_would_fit(self, needed):
+        """Would compacting make room for needed = {buffer: bytes}?"""
+        for buffer, length in needed.items():
+            if self.buffer_size_limit - self.buffer_allocation_map[buffer].used < length:
+                return False
+        return any(a.stats()["fragmentation"] > 0 for a in self.buffer_allocation_map.values())
+        # ^ compacting an unfragmented buffer won't free up anything
+
+    def queue_uploads(self, buffer, renderable_type, ids, starts, data):
+        """Queues buffer writes, merging neighbouring spans, & records where each renderable lives"""
+        target = self.buffer_target[buffer]
+        writes = []
+        # ^ [[start, [ids], [data]]]
+        for _id, start, d in zip(ids, starts, data):
+            if len(writes) > 0 and writes[-1][0] + sum(x.nbytes for x in writes[-1][2]) == start:
+                writes[-1][1].append(_id)
+                writes[-1][2].append(d)
+            else:
+                writes.append([start, [_id], [d]])
+        for start, write_ids, write_data in writes:
+            flattened_data = np.concatenate([d.reshape(-1).view(np.uint8) for d in write_data])
+            # ^ as bytes, neighbours can have different index types
+            update = (target, start, flattened_data.nbytes, flattened_data)
             self.buffer_update_queue.append(update)
-            ids = index_gaps[gap][1]
-            lengths = [len(d) * 4 for d in index_gaps[gap][2]]
-            self.update_mapping("index", renderable_type, start, ids, lengths)
-
-    def hide(self, renderable):
-        # print(f"Hiding {renderable}")
-        self.dont_draw.add(renderable)
-        renderable_type = renderable[0]
-        span = self.buffer_location[renderable]["index"]
-        span_list = self.draw_calls[renderable_type]
-        self.draw_calls[renderable_type] = remove_span(span_list, span)
-
-    def show(self, renderable):
-        assert renderable in self.dont_draw  # a bug worth checking for
-        # print(f"Showing {renderable}")
-        self.dont_draw.discard(renderable)
-        renderable_type = renderable[0]
-        span = self.buffer_location[renderable]["index"]
-        span_list = self.draw_calls[renderable_type]
-        self.draw_calls[renderable_type] = add_span(span_list, span)
+            self.update_mapping(buffer, renderable_type, start, write_ids, [d.nbytes for d in write_data])
+
+    def add_instance(self, renderable, **attributes):
+        """Draw another copy of an obj_model, returns an instance_id for update_instance & remove_instance
+        attributes: position=(x, y, z), rotation=(pitch, yaw, roll), scale=1, tint=(r, g, b)"""
+        if renderable not in self.dynamics:
+            self.dynamics[renderable] = Instances()
+        instance_id = self.dynamics[renderable].add(**attributes)
+        self.changed()
+        return instance_id
+
+    def update_instance(self, renderable, instance_id, **attributes):
+        self.dynamics[renderable].update(instance_id, **attributes)
+        self.changed()
+
+    def remove_instance(self, renderable, instance_id):
+        self.dynamics[renderable].remove(instance_id)
+        self.changed()
+
+    def remove(self, *renderables):
+        """Frees the buffer space used by each renderable"""
+        for renderable in renderables:
+            location = self.buffer_location.pop(renderable)
+            renderable_type = renderable[0]
+            for buffer, span in location.items():
+                self.buffer_allocation_map[buffer].free(*span)
+                # ^ the data stays in the buffer until it's overwritten
+            self.tables[renderable_type].remove(renderable)
+            self.local_indices.pop(renderable, None)
+            self.face_vertices.pop(renderable, None)
+            self.dont_draw.discard(renderable)
+            self.translucent.discard(renderable)
+            self.displaced.discard(renderable)
+            self.hovered.discard(renderable)
+            if self.selected_faces.pop(renderable, None) is not None:
+                self.faces_version += 1
+            self.bvh.remove(renderable)
+        self.changed()
+
+    def hide(self, *renderables):
+        """Stops drawing renderables until they are shown again; hiding a whole visgroup is one step"""
+        self.dont_draw.update(renderables)
+        self.set_drawn(renderables, False)
+        self.changed()
+
+    def show(self, *renderables):
+        assert self.dont_draw.issuperset(renderables)  # a bug worth checking for
+        self.dont_draw.difference_update(renderables)
+        self.set_drawn([r for r in renderables if r not in self.translucent and r not in self.displaced], True)
+        self.changed()
+
+    def set_flag(self, renderables, flag, on, tint=None):
+        """Sets or clears a DrawTable flag on each renderable with a slot, one vectorized step per type"""
+        by_type = {renderable_type: [] for renderable_type in self.tables}
+        for renderable in renderables:
+            if renderable in self.tables[renderable[0]]:
+                by_type[renderable[0]].append(renderable)
+        for renderable_type, group in by_type.items():
+            if len(group) > 0:
+                table = self.tables[renderable_type]
+                table.set_state(table.slots_of(group), flag, on, tint)
+        self.changed()
+
+    def with_displacements(self, renderables):
+        """renderables, plus the displacements drawn in place of any displaced brushes"""
+        brush_ids = {renderable[1] for renderable in renderables if renderable in self.displaced}
+        if len(brush_ids) == 0:
+            return list(renderables)
+        displacements = [r for r in self.tables["displacement"].slots if r[1][0] in brush_ids]
+        return [*renderables, *displacements]
+
+    def select(self, *renderables, tint=None):
+        """Tints renderables until they are deselected; tint = (r, g, b) bytes, selection_tint if None
+        selecting thousands of renderables only rewrites 4 bytes each, see DrawTable.set_state"""
+        tint = self.selection_tint if tint is None else tint
+        self.set_flag(self.with_displacements(renderables), SELECTED, True, tint)
+
+    def deselect(self, *renderables):
+        self.set_flag(self.with_displacements(renderables), SELECTED, False)
+
+    def hover(self, *renderables):
+        """Lightens renderables, & stops lightening whatever was hovered before"""
+        self.set_flag(self.hovered, HOVERED, False)
+        self.hovered = set(self.with_displacements(renderables))
+        self.set_flag(self.hovered, HOVERED, True)
+
+    def select_faces(self, renderable, spans):
+        """Tints faces of a brush, spans = [(first_index, index_count)] from bufferize.face_spans"""
+        self.selected_faces.setdefault(renderable, set()).update(spans)
+        self.faces_version += 1
+        self.changed()
+
+    def deselect_faces(self, *renderables):
+        for renderable in renderables:
+            self.selected_faces.pop(renderable, None)
+        self.faces_version += 1
+        self.changed()
 
 
 def add_span(span_list, span):
-    if len(span_list) == 0:
-        return [span]
+    """Inserts span into a sorted span_list, merging it with any spans it touches"""
     start, length = span
     end = start + length
-    for i, span in enumerate(span_list):
-        S, L = span
+    out = []
+    for S, L in span_list:
         E = S + L
-        if S < end and E < start:
-            continue  # (S, L) is before span_to_track and doesn't touch it
-        elif end < S:  # span leads (S, L) without touching it
-            span_list.insert(i, (start, length))
-            break
-        elif S == end or E == start:  # span leads (S, L) or span tails (S, L)
-            span_list.pop(i)
-            new_start = min(start, S)
-            span_list.insert(i, (new_start, L + length))
-            break
-    else:  # span tails the final (S, L) without touching it
-        span_list.append((start, length))
-    return span_list
+        if E < start or end < S:  # (S, L) doesn't touch span
+            out.append((S, L))
+        else:  # (S, L) touches or overlaps span, merge
+            start, end = min(start, S), max(end, E)
+    out.append((start, end - start))
+    out.sort()
+    return out
+
+
+def merge_spans(spans):
+    """Sorts spans, merging any that touch or overlap"""
+    out = []
+    for start, length in sorted(spans):
+        if len(out) > 0 and out[-1][0] + out[-1][1] >= start:
+            S, L = out[-1]
+            out[-1] = (S, max(S + L, start + length) - S)
+        else:
+            out.append((start, length))
+    return out
+
+
+def merge_moves(moves):
+    """Joins (old_start, new_start, length) moves which are contiguous at both ends"""
+    out = []
+    for old_start, new_start, length in sorted(moves):
+        if len(out) > 0:
+            S, N, L = out[-1]
+            if S + L == old_start and N + L == new_start:
+                out[-1] = (S, N, L + length)
+                continue
+        out.append((old_start, new_start, length))
+    return out
 
 
 def remove_span(span_list, span):
@@ -373,7 +661,7 @@ def remove_span(span_list, span):
             out.append((end, E - end))
             continue
         # basic cases
-        if end < S:  # span leads (S, L)
+        if end <= S:  # span leads (S, L)
             out.append((S, L))
             continue
         if start <= S < end < E:  # span overlaps start of (S, L)
@@ -0,0 +1,117 @@
+"""Which renderable is under the cursor, drawn by the GPU instead of raycasting every brush on the CPU"""
+from __future__ import annotations
+import collections
+import ctypes
+from typing import Callable, Deque, NamedTuple, Tuple
+
+import numpy as np
+import OpenGL.GL as gl
+from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels as read_pixels_raw
+# ^ the wrapped glReadPixels always wants to read into an array it makes, not into the bound pixel buffer
+
+
+class Pick(NamedTuple):
+    renderable: tuple  # e.g. ("brush", brush.id); None if nothing was under the cursor
+    vertex: int  # a corner of the triangle under the cursor, an index into renderable's vertices
+    face: int = None  # face.id of a brush's face under the cursor
+
+
+class Picker:
+    """Draws slot ids into a small integer framebuffer around the cursor, read back through pixel buffer objects
+    results arrive a frame or more after they're requested, so picking never stalls waiting on the GPU
+    a View draws the requests (see View.draw_picks) & polls for results each frame"""
+    size = 5  # pixels across the region drawn around the cursor, the hit closest to the middle wins
+    requests: Deque[Tuple[int, int, Callable]]  # [(x, y, callback)] waiting to be drawn
+    pending: Deque[Tuple[int, int, Callable]]  # [(fence, pixel_buffer, callback)] waiting on the GPU
+
+    def __init__(self):
+        self.framebuffer = None
+        self.renderbuffers = None
+        # ^ (colour, depth), GL_RGBA32UI & GL_DEPTH_COMPONENT24
+        self.requests = collections.deque()
+        self.pending = collections.deque()
+
+    def __len__(self) -> int:
+        return len(self.requests) + len(self.pending)
+
+    def initialise(self):
+        """Makes the framebuffer, in the current context; framebuffers can't be shared between contexts"""
+        previous = gl.glGetIntegerv(gl.GL_DRAW_FRAMEBUFFER_BINDING)
+        self.framebuffer = gl.glGenFramebuffers(1)
+        self.renderbuffers = gl.glGenRenderbuffers(2)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+        for renderbuffer, storage, attachment in zip(self.renderbuffers, (gl.GL_RGBA32UI, gl.GL_DEPTH_COMPONENT24),
+                                                     (gl.GL_COLOR_ATTACHMENT0, gl.GL_DEPTH_ATTACHMENT)):
+            gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, renderbuffer)
+            gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, storage, self.size, self.size)
+            gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, attachment, gl.GL_RENDERBUFFER, renderbuffer)
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, 0)
+        status = gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, previous)  # e.g. a QOpenGLWidget's framebuffer, not 0
+        if status != gl.GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"Picking framebuffer is incomplete ({status})")
+
+    def request(self, x: int, y: int, callback: Callable):
+        """x & y are pixels in the viewport, from the bottom left"""
+        self.requests.append((x, y, callback))
+
+    def begin(self):
+        """Binds & clears the framebuffer, for drawing one request"""
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+        gl.glViewport(0, 0, self.size, self.size)
+        gl.glClearBufferuiv(gl.GL_COLOR, 0, (gl.GLuint * 4)(0, 0, 0, 0))
+        gl.glClearBufferfv(gl.GL_DEPTH, 0, (gl.GLfloat * 1)(1))
+
+    def end(self, callback: Callable):
+        """Starts copying what was drawn into a pixel buffer, callback gets it from poll"""
+        pixel_buffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, pixel_buffer)
+        gl.glBufferData(gl.GL_PIXEL_PACK_BUFFER, self.size * self.size * 16, None, gl.GL_STREAM_READ)
+        gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0)
+        read_pixels_raw(0, 0, self.size, self.size, gl.GL_RGBA_INTEGER, gl.GL_UNSIGNED_INT, ctypes.c_void_p(0))
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self.pending.append((fence, pixel_buffer, callback))
+
+    def poll(self) -> list:
+        """[(ids, callback)] for each request the GPU has finished, in order, without waiting
+        ids is uint32 (size, size, 4): renderable type + 1 (0 for nothing), slot & vertex; see shaders/glsl/pick.frag"""
+        finished = []
+        while len(self.pending) > 0:
+            fence, pixel_buffer, callback = self.pending[0]
+            if gl.glClientWaitSync(fence, 0, 0) not in (gl.GL_ALREADY_SIGNALED, gl.GL_CONDITION_SATISFIED):
+                break  # not done yet, check again next frame
+            self.pending.popleft()
+            gl.glDeleteSync(fence)
+            length = self.size * self.size * 16
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, pixel_buffer)
+            pointer = gl.glMapBufferRange(gl.GL_PIXEL_PACK_BUFFER, 0, length, gl.GL_MAP_READ_BIT)
+            ids = np.frombuffer(ctypes.string_at(pointer, length), dtype=np.uint32).reshape(self.size, self.size, 4)
+            gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+            gl.glDeleteBuffers(1, [pixel_buffer])
+            finished.append((ids, callback))
+        return finished
+
+
+def pick_matrix(x: int, y: int, width: int, height: int, size: int) -> np.ndarray:
+    """Scales & moves clip space, so the size x size pixels centred on pixel (x, y) fill the viewport"""
+    scale_x, scale_y = width / size, height / size
+    centre_x, centre_y = (2 * x + 1) / width - 1, (2 * y + 1) / height - 1
+    # ^ the middle of pixel (x, y), in normalised device coordinates
+    matrix = np.identity(4, dtype=np.float32)
+    matrix[0, 0], matrix[0, 3] = scale_x, -centre_x * scale_x
+    matrix[1, 1], matrix[1, 3] = scale_y, -centre_y * scale_y
+    return matrix
+
+
+def closest_hit(ids: np.ndarray) -> tuple:
+    """(renderable type + 1, slot, vertex) of the hit closest to the middle of ids from Picker.poll, or None"""
+    size = ids.shape[0]
+    hit = ids[..., 0] != 0
+    if not np.any(hit):
+        return None
+    rows, columns = np.indices((size, size)) - size // 2
+    distances = np.where(hit, rows ** 2 + columns ** 2, size ** 2)
+    row, column = np.unravel_index(np.argmin(distances), distances.shape)
+    return tuple(ids[row, column, :3].tolist())
@@ -0,0 +1,134 @@
+"""Rolling CPU & GPU timings for each stage of a frame"""
+from __future__ import annotations
+import collections
+import contextlib
+import time
+from typing import Deque, Dict, List
+
+import OpenGL.GL as gl
+
+
+class Profiler:
+    """Times named stages of each frame, with time.perf_counter (cpu) & GL_TIME_ELAPSED queries (gpu)
+    does nothing while disabled; stage names are shared between cpu & gpu timings
+    with profiler.cpu("update"): ...
+    with profiler.gpu("brush"): ...
+    profiler.end_frame()  # once per frame, with the GL context current"""
+    history: int  # frames of timings to keep
+    cpu_times: Dict[str, Deque[float]]  # {stage: deque([milliseconds])}
+    gpu_times: Dict[str, Deque[float]]
+    frame_times: Deque[float]  # milliseconds between end_frame calls
+    queries_in_flight: int = 4  # frames of GPU queries waiting for results, before timings are dropped
+
+    def __init__(self, history: int = 120):
+        self.history = history
+        self.enabled = False
+        self.gpu_supported = None  # checked the first time gpu timing is needed
+        self.reset()
+
+    def reset(self):
+        self.cpu_times = dict()
+        self.gpu_times = dict()
+        self.frame_times = collections.deque(maxlen=self.history)
+        self.last_frame = None
+        self.free_queries = list()  # query objects ready for reuse
+        self.frame_queries = dict()  # {stage: query}, this frame's queries
+        self.pending_queries = collections.deque()  # [{stage: query}] for previous frames
+
+    def enable(self, enabled: bool = True):
+        if enabled and not self.enabled:
+            self.reset()
+        self.enabled = enabled
+
+    def cpu(self, stage: str):
+        """context manager, timing stage on the CPU"""
+        if not self.enabled:
+            return null_context
+        return self._cpu(stage)
+
+    @contextlib.contextmanager
+    def _cpu(self, stage: str):
+        start = time.perf_counter()
+        yield
+        self.add_time(self.cpu_times, stage, (time.perf_counter() - start) * 1000)
+
+    def gpu(self, stage: str):
+        """context manager, timing stage on the GPU; only one gpu stage can be timed at a time"""
+        if not self.enabled:
+            return null_context
+        if self.gpu_supported is None:
+            self.gpu_supported = not gl.glGetString(gl.GL_VERSION).startswith(b"OpenGL ES")
+            # ^ GL_TIME_ELAPSED is an extension in OpenGL ES
+        if not self.gpu_supported or len(self.pending_queries) >= self.queries_in_flight:
+            return null_context  # results are taking too long to come back, skip this frame
+        return self._gpu(stage)
+
+    @contextlib.contextmanager
+    def _gpu(self, stage: str):
+        if len(self.free_queries) == 0:
+            self.free_queries.extend(gl.glGenQueries(8))
+        query = self.free_queries.pop()
+        self.frame_queries[stage] = query
+        gl.glBeginQuery(gl.GL_TIME_ELAPSED, query)
+        yield
+        gl.glEndQuery(gl.GL_TIME_ELAPSED)
+
+    def end_frame(self):
+        """Record frame time & collect any GPU timings that are ready"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.frame_times.append((now - self.last_frame) * 1000)
+        self.last_frame = now
+        if len(self.frame_queries) > 0:
+            self.pending_queries.append(self.frame_queries)
+            self.frame_queries = dict()
+        while len(self.pending_queries) > 0:  # oldest first, never waiting on the GPU
+            queries = self.pending_queries[0]
+            last_query = list(queries.values())[-1]
+            if not gl.glGetQueryObjectuiv(last_query, gl.GL_QUERY_RESULT_AVAILABLE):
+                break
+            for stage, query in queries.items():
+                nanoseconds = gl.glGetQueryObjectuiv(query, gl.GL_QUERY_RESULT)
+                # NOTE: PyOpenGL can't allocate the output of glGetQueryObjectui64v
+                # 32 bits of nanoseconds only overflow if a stage takes over 4 seconds
+                self.add_time(self.gpu_times, stage, nanoseconds / 10 ** 6)
+                self.free_queries.append(query)
+            self.pending_queries.popleft()
+
+    def idle(self):
+        """Stop the frame clock, so time spent waiting for something to draw isn't counted as a frame"""
+        self.last_frame = None
+
+    def add_time(self, times: Dict[str, Deque[float]], stage: str, milliseconds: float):
+        if stage not in times:
+            times[stage] = collections.deque(maxlen=self.history)
+        times[stage].append(milliseconds)
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{"cpu": {stage: summary}, "gpu": {stage: summary}, "frame": summary}
+        summary = {"last", "mean", "max"} in milliseconds"""
+        return {"cpu": {stage: summarise(times) for stage, times in self.cpu_times.items()},
+                "gpu": {stage: summarise(times) for stage, times in self.gpu_times.items()},
+                "frame": summarise(self.frame_times)}
+
+
+def summarise(times: List[float]) -> Dict[str, float]:
+    if len(times) == 0:
+        return {"last": 0.0, "mean": 0.0, "max": 0.0}
+    return {"last": times[-1], "mean": sum(times) / len(times), "max": max(times)}
+
+
+def format_stats(stats: Dict[str, Dict[str, Dict[str, float]]]) -> str:
+    """Profiler.stats() as a few lines of text, for the viewport overlay"""
+    frame = stats["frame"]
+    fps = 1000 / frame["mean"] if frame["mean"] > 0 else 0
+    lines = [f"frame {frame['mean']:5.2f}ms (max {frame['max']:5.2f}ms) {fps:4.0f} fps"]
+    for clock in ("cpu", "gpu"):
+        for stage, summary in stats[clock].items():
+            lines.append(f"{clock} {stage:<12} {summary['mean']:5.2f}ms (max {summary['max']:5.2f}ms)")
+    return "\n".join(lines)
+
+
+null_context = contextlib.nullcontext()
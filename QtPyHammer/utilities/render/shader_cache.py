@@ -0,0 +1,117 @@
+"""On-disk cache of linked shader programs, so viewports can skip compiling GLSL after the first launch"""
+from __future__ import annotations
+import ctypes
+import hashlib
+import os
+import time
+from typing import Dict, Iterable, Tuple, Union
+
+import numpy as np
+import OpenGL.GL as gl
+from OpenGL.error import GLError
+from OpenGL.GL.shaders import compileShader
+
+
+Stage = Tuple[bytes, int]  # (GLSL source, shader type) e.g. (b"#version 450 core...", GL_VERTEX_SHADER)
+
+
+class ProgramCache:
+    """Links programs from GLSL, or loads them with glProgramBinary if this driver has linked them before
+    binaries are keyed by the GLSL source of every stage + the driver's vendor, renderer & version"""
+    folder: Union[str, None]  # where binaries are saved, None keeps nothing on disk
+    stats: Dict[str, Union[int, float]]  # {"hits", "misses", "load_ms", "compile_ms"}
+
+    def __init__(self, folder: str = None):
+        self.folder = folder
+        self.driver = None  # b"vendor|renderer|version" of the current context, read on first use
+        self.supported = None  # can this driver save program binaries?
+        self.stats = {"hits": 0, "misses": 0, "load_ms": 0.0, "compile_ms": 0.0}
+
+    def program(self, *stages: Stage) -> int:
+        """Returns a linked program, made of stages"""
+        if self.driver is None:
+            self.driver = b"|".join(gl.glGetString(e) for e in (gl.GL_VENDOR, gl.GL_RENDERER, gl.GL_VERSION))
+            self.supported = gl.glGetIntegerv(gl.GL_NUM_PROGRAM_BINARY_FORMATS) > 0
+        use_disk = self.folder is not None and self.supported
+        key = self.key(stages)
+        if use_disk:
+            start = time.perf_counter()
+            program = self.load(key)
+            if program is not None:
+                self.stats["hits"] += 1
+                self.stats["load_ms"] += (time.perf_counter() - start) * 1000
+                return program
+        start = time.perf_counter()
+        program = link(stages, retrievable=use_disk)
+        self.stats["misses"] += 1
+        self.stats["compile_ms"] += (time.perf_counter() - start) * 1000
+        if use_disk:
+            self.save(key, program)
+        return program
+
+    def key(self, stages: Iterable[Stage]) -> str:
+        key = hashlib.sha256(self.driver)
+        for source, shader_type in stages:
+            key.update(shader_type.to_bytes(4, "little"))
+            key.update(hashlib.sha256(source).digest())
+        return key.hexdigest()
+
+    def load(self, key: str) -> Union[int, None]:
+        """Returns None if there is no binary for key, or the driver rejects it"""
+        filename = os.path.join(self.folder, f"{key}.bin")
+        if not os.path.exists(filename):
+            return None
+        with open(filename, "rb") as binary_file:
+            data = binary_file.read()
+        binary_format, binary = int.from_bytes(data[:4], "little"), np.frombuffer(data[4:], dtype=np.uint8)
+        program = gl.glCreateProgram()
+        try:
+            gl.glProgramBinary(program, binary_format, binary, len(binary))
+            linked = gl.glGetProgramiv(program, gl.GL_LINK_STATUS) == gl.GL_TRUE
+        except GLError:  # binary_format isn't one this driver knows
+            linked = False
+        if not linked:
+            # ^ binaries can go stale without the version string changing, e.g. after a driver update
+            gl.glDeleteProgram(program)
+            try:
+                os.remove(filename)  # save will replace it
+            except OSError:
+                pass
+            return None
+        return program
+
+    def save(self, key: str, program: int):
+        length = gl.glGetProgramiv(program, gl.GL_PROGRAM_BINARY_LENGTH)
+        if length == 0:
+            return
+        binary = np.empty(length, dtype=np.uint8)
+        written, binary_format = gl.GLsizei(0), gl.GLenum(0)
+        gl.glGetProgramBinary(program, length, ctypes.byref(written), ctypes.byref(binary_format), binary)
+        filename = os.path.join(self.folder, f"{key}.bin")
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(f"{filename}.tmp", "wb") as binary_file:
+                binary_file.write(binary_format.value.to_bytes(4, "little"))
+                binary_file.write(binary[:written.value].tobytes())
+            os.replace(f"{filename}.tmp", filename)  # other viewports never see half a file
+        except OSError:
+            pass  # the cache is only a speedup, compiling again next launch is fine
+
+
+def link(stages: Iterable[Stage], retrievable: bool = False) -> int:
+    """Compiles & links stages into a program, raising RuntimeError if linking fails"""
+    program = gl.glCreateProgram()
+    if retrievable:
+        gl.glProgramParameteri(program, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, gl.GL_TRUE)
+    shaders = [compileShader(source, shader_type) for source, shader_type in stages]
+    for shader in shaders:
+        gl.glAttachShader(program, shader)
+    gl.glLinkProgram(program)
+    for shader in shaders:
+        gl.glDetachShader(program, shader)
+        gl.glDeleteShader(shader)
+    if gl.glGetProgramiv(program, gl.GL_LINK_STATUS) != gl.GL_TRUE:
+        log = gl.glGetProgramInfoLog(program)
+        gl.glDeleteProgram(program)
+        raise RuntimeError(f"Shader program failed to link: {log}")
+    return program
@@ -0,0 +1,87 @@
+"""Shader variants, built from one set of GLSL sources for every GLSL version & render mode"""
+from __future__ import annotations
+import os
+import re
+from typing import Dict, Set, Tuple
+
+import OpenGL.GL as gl
+
+from .shader_cache import ProgramCache
+
+
+preludes = {"GLSL_450": {gl.GL_VERTEX_SHADER: "#version 450 core\n",
+                         gl.GL_FRAGMENT_SHADER: "#version 450 core\n"},
+            "GLES_300": {gl.GL_VERTEX_SHADER: "#version 300 es\n",
+                         gl.GL_FRAGMENT_SHADER: "#version 300 es\nprecision mediump float;\n"}}
+# ^ {glsl_version: {shader_type: source}}, goes before everything else in each stage
+
+render_modes_pattern = re.compile(r"^// render modes:(.*)$", re.MULTILINE)
+
+
+class ShaderLibrary:
+    """Programs for each (render_mode, renderable), compiled the first time they are asked for
+    folder holds a {renderable}.vert & {renderable}.frag for each renderable
+    each .frag lists the render modes it supports in a comment: // render modes: flat stripey
+    each variant is compiled with the render mode #defined in upper case, e.g. #define STRIPEY"""
+    folder: str
+    version: str  # key into preludes
+    render_modes: Dict[str, Set[str]]  # {renderable: {render_mode}}
+    programs: Dict[Tuple[str, str], int]  # {(render_mode, renderable): program}
+    uniform_blocks: Dict[str, int]  # {block name: binding point}, bound on every program
+
+    def __init__(self, folder: str, version: str, cache: ProgramCache, uniform_blocks: Dict[str, int] = None):
+        if version not in preludes:
+            raise RuntimeError(f"No shader prelude for {version}")
+        self.folder = folder
+        self.version = version
+        self.cache = cache
+        self.uniform_blocks = dict() if uniform_blocks is None else uniform_blocks
+        self.sources = dict()
+        # ^ {filename: GLSL source}
+        self.render_modes = dict()
+        self.programs = dict()
+        self.discover()
+
+    def discover(self):
+        """Find every renderable with both a .vert & .frag, and the render modes it supports"""
+        filenames = set(os.listdir(self.folder))
+        for filename in sorted(filenames):
+            renderable, extension = os.path.splitext(filename)
+            if extension != ".frag" or f"{renderable}.vert" not in filenames:
+                continue
+            match = render_modes_pattern.search(self.source(filename))
+            if match is None:
+                raise RuntimeError(f"{filename} doesn't say which render modes it supports")
+            self.render_modes[renderable] = set(match.group(1).split())
+
+    def source(self, filename: str) -> str:
+        if filename not in self.sources:
+            with open(os.path.join(self.folder, filename)) as source_file:
+                self.sources[filename] = source_file.read()
+        return self.sources[filename]
+
+    def variant(self, render_mode: str, renderable: str) -> str:
+        """The render mode renderable is actually drawn with; "flat" if it has no render_mode variant"""
+        if render_mode in self.render_modes[renderable]:
+            return render_mode
+        return "flat"
+
+    def program(self, render_mode: str, renderable: str) -> int:
+        render_mode = self.variant(render_mode, renderable)
+        key = (render_mode, renderable)
+        if key not in self.programs:
+            stages = [(self.stage(f"{renderable}{extension}", shader_type, render_mode), shader_type)
+                      for extension, shader_type in ((".vert", gl.GL_VERTEX_SHADER), (".frag", gl.GL_FRAGMENT_SHADER))]
+            program = self.cache.program(*stages)
+            for block_name, binding in self.uniform_blocks.items():
+                block = gl.glGetUniformBlockIndex(program, block_name)
+                if block != gl.GL_INVALID_INDEX:
+                    gl.glUniformBlockBinding(program, block, binding)
+            self.programs[key] = program
+        return self.programs[key]
+
+    def stage(self, filename: str, shader_type: int, render_mode: str) -> bytes:
+        """Source for one stage of a variant"""
+        header = f"{preludes[self.version][shader_type]}#define {render_mode.upper()}\n#line 1\n"
+        # ^ #line 1 keeps line numbers in compile errors matching the file
+        return (header + self.source(filename)).encode()
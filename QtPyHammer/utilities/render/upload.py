@@ -0,0 +1,136 @@
+"""Streams buffer writes to the GPU a little at a time"""
+from __future__ import annotations
+import collections
+import math
+import time
+from typing import Dict, List
+
+import numpy as np
+import OpenGL.GL as gl
+
+
+UploadProgress = collections.namedtuple("UploadProgress", ["bytes_pending", "bytes_uploaded", "eta"])
+# ^ eta is in seconds, None until enough uploads have been timed
+
+
+class PendingWrite:
+    """A contiguous run of bytes waiting to be written to a buffer"""
+    __slots__ = ["start", "chunks", "length"]
+    start: int
+    chunks: List[np.ndarray]  # flat uint8 views, concatenated only once uploaded
+    length: int
+
+    def __init__(self, start: int, data: np.ndarray):
+        self.start = start
+        self.chunks = [data]
+        self.length = data.nbytes
+
+    @property
+    def end(self) -> int:
+        return self.start + self.length
+
+    def extend(self, data: np.ndarray):
+        self.chunks.append(data)
+        self.length += data.nbytes
+
+    def pop(self, length: int) -> np.ndarray:
+        """Removes & returns the first length bytes"""
+        data = self.chunks[0] if len(self.chunks) == 1 else np.concatenate(self.chunks)
+        head, tail = data[:length], data[length:]
+        self.chunks = [tail] if len(tail) > 0 else []
+        self.start += len(head)
+        self.length -= len(head)
+        return head
+
+
+class UploadScheduler:
+    """Queues glBufferSubData writes, merging writes that touch
+    & draining as much of the queue as fits in budget milliseconds each frame"""
+    budget: float  # milliseconds per frame
+    pending: Dict[int, collections.deque]  # {target: deque([PendingWrite])}
+    bytes_pending: int
+    bytes_uploaded: int
+    minimum_chunk: int = 64 * 1024
+    # ^ always upload at least this much per frame, so loading can't stall
+
+    def __init__(self, budget: float = 4.0):
+        self.budget = budget
+        self.pending = dict()
+        self.bytes_pending = 0
+        self.bytes_uploaded = 0
+        self.throughput = None  # bytes per millisecond spent in glBufferSubData
+        self.bytes_per_frame = None  # moving averages used to estimate the time left
+        self.frame_interval = None  # seconds
+        self.last_drain = None
+
+    def __len__(self) -> int:
+        return sum(len(writes) for writes in self.pending.values())
+
+    def append(self, update: tuple):
+        """update = (target, start, length, data), same arguments as glBufferSubData"""
+        target, start, length, data = update
+        data = np.ascontiguousarray(data).view(np.uint8).reshape(-1)[:length]
+        writes = self.pending.setdefault(target, collections.deque())
+        if len(writes) > 0 and writes[-1].end == start:
+            writes[-1].extend(data)  # contiguous with the last write, merge
+        else:
+            writes.append(PendingWrite(start, data))
+        self.bytes_pending += length
+
+    def drain(self, budget: float = None):
+        """Write to bound buffers until budget (milliseconds) runs out"""
+        budget = self.budget if budget is None else budget
+        now = time.perf_counter()
+        if self.last_drain is not None:
+            self.frame_interval = moving_average(self.frame_interval, now - self.last_drain)
+        self.last_drain = now
+        uploaded = 0
+        deadline = now + budget / 1000
+        for target, writes in self.pending.items():
+            while len(writes) > 0:
+                remaining_ms = (deadline - time.perf_counter()) * 1000
+                if remaining_ms <= 0 and uploaded > 0:
+                    break
+                write = writes[0]
+                if math.isinf(remaining_ms):
+                    length = write.length
+                elif self.throughput is None:
+                    length = self.minimum_chunk
+                else:  # only take what should fit in the time we have left
+                    length = max(int(self.throughput * remaining_ms), self.minimum_chunk)
+                start = write.start
+                data = write.pop(length)
+                if write.length == 0:
+                    writes.popleft()
+                upload_start = time.perf_counter()
+                gl.glBufferSubData(target, start, len(data), data)
+                upload_time = (time.perf_counter() - upload_start) * 1000
+                if upload_time > 0:
+                    self.throughput = moving_average(self.throughput, len(data) / upload_time)
+                uploaded += len(data)
+        self.pending = {t: w for t, w in self.pending.items() if len(w) > 0}
+        self.bytes_pending -= uploaded
+        self.bytes_uploaded += uploaded
+        if uploaded > 0:
+            self.bytes_per_frame = moving_average(self.bytes_per_frame, uploaded)
+        if self.bytes_pending == 0:
+            self.last_drain = None  # don't count idle time between loads as a frame
+
+    def flush(self):
+        """Upload everything, no matter how long it takes"""
+        self.drain(budget=float("inf"))
+
+    def progress(self) -> UploadProgress:
+        eta = None
+        if self.bytes_pending == 0:
+            eta = 0.0
+        elif self.bytes_per_frame is not None and self.frame_interval is not None:
+            eta = self.bytes_pending / self.bytes_per_frame * self.frame_interval
+        return UploadProgress(self.bytes_pending, self.bytes_uploaded, eta)
+
+
+def moving_average(average: float, sample: float, weight: float = 0.2) -> float:
+    """exponential moving average, starting from the first sample"""
+    if average is None:
+        return sample
+    return average + (sample - average) * weight
@@ -0,0 +1,112 @@
+"""Packed vertex layouts for each renderable type
+bufferize assembles vertices as rows of floats, VertexFormat.pack squeezes them into these layouts
+https://github.com/snake-biscuits/QtPyHammer/wiki/Rendering:-Vertex-Format"""
+from __future__ import annotations
+from typing import Dict, NamedTuple
+
+import numpy as np
+import OpenGL.GL as gl
+
+
+class Attribute(NamedTuple):
+    name: str
+    location: int  # layout(location = ...) in the vertex shader
+    columns: int  # floats per vertex given to VertexFormat.pack
+    gl_type: int  # GL_FLOAT, GL_HALF_FLOAT, GL_UNSIGNED_BYTE or GL_INT_2_10_10_10_REV
+    size: int  # components read by glVertexAttribPointer
+    normalized: bool = False
+
+
+def storage(attribute: Attribute) -> tuple:
+    """numpy (dtype, shape) holding attribute, each padded to a multiple of 4 bytes"""
+    if attribute.gl_type == gl.GL_FLOAT:
+        return ("<f4", (attribute.size,))
+    elif attribute.gl_type == gl.GL_HALF_FLOAT:
+        return ("<f2", (-(-attribute.size // 2) * 2,))
+    elif attribute.gl_type == gl.GL_UNSIGNED_BYTE:
+        return ("u1", (4,))
+    elif attribute.gl_type == gl.GL_INT_2_10_10_10_REV:
+        return ("<u4", ())
+    raise RuntimeError(f"No storage for vertex attributes of type {attribute.gl_type}")
+
+
+class VertexFormat:
+    """Interleaved vertex attributes, as a numpy structured dtype & the glVertexAttribPointer calls to read it"""
+    attributes: Dict[str, Attribute]  # {name: Attribute}, in the order they are packed
+    dtype: np.dtype
+
+    def __init__(self, *attributes: Attribute):
+        self.attributes = {a.name: a for a in attributes}
+        self.dtype = np.dtype([(a.name, *storage(a)) for a in attributes])
+        self.columns = sum(a.columns for a in attributes)
+
+    @property
+    def stride(self) -> int:
+        """bytes per vertex"""
+        return self.dtype.itemsize
+
+    def pack(self, rows: np.ndarray) -> np.ndarray:
+        """(vertex_count, columns) floats -> (vertex_count,) structured array of self.dtype"""
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, self.columns)
+        vertices = np.zeros(len(rows), dtype=self.dtype)
+        column = 0
+        for attribute in self.attributes.values():
+            values = rows[:, column:column + attribute.columns]
+            column += attribute.columns
+            field = vertices[attribute.name]
+            if attribute.gl_type == gl.GL_INT_2_10_10_10_REV:
+                field[:] = pack_normals(values)
+            elif attribute.gl_type == gl.GL_UNSIGNED_BYTE:
+                field[:, :values.shape[1]] = unorm8(values)
+                field[:, values.shape[1]:] = 255  # e.g. opaque alpha for an rgb colour
+            else:
+                field[:, :values.shape[1]] = values
+        return vertices
+
+    def vertices(self, data: np.ndarray) -> np.ndarray:
+        """data as an array of self.dtype; data can already be packed, or be rows of floats for pack"""
+        data = np.asarray(data)
+        if data.dtype == self.dtype:
+            return data.reshape(-1)
+        return self.pack(data)
+
+    def bind(self, offset: int = 0):
+        """Points each attribute at the vertex buffer bound to GL_ARRAY_BUFFER, starting at byte offset"""
+        for attribute in self.attributes.values():
+            field_offset = self.dtype.fields[attribute.name][1]
+            gl.glEnableVertexAttribArray(attribute.location)
+            gl.glVertexAttribPointer(attribute.location, attribute.size, attribute.gl_type, attribute.normalized,
+                                     self.stride, gl.GLvoidp(offset + field_offset))
+
+
+normal_shifts = np.array([1, 1 << 10, 1 << 20], dtype=np.int64)
+
+
+def pack_normals(normals: np.ndarray) -> np.ndarray:
+    """(N, 3) unit vectors -> (N,) uint32 for GL_INT_2_10_10_10_REV; x in the lowest 10 bits"""
+    snorm = np.rint(np.clip(normals, -1, 1) * 511).astype(np.int64) & 0x3FF  # two's complement
+    return (snorm @ normal_shifts).astype(np.uint32)
+
+
+def unorm8(values: np.ndarray) -> np.ndarray:
+    """0-1 floats -> 0-255 bytes"""
+    return np.round(np.clip(values, 0, 1) * 255).astype(np.uint8)
+
+
+normal = Attribute("normal", 1, 3, gl.GL_INT_2_10_10_10_REV, 4, True)
+# ^ 10 bits per axis is plenty for lighting, & 1/3 the size of 3 floats
+formats = {"brush": VertexFormat(Attribute("position", 0, 3, gl.GL_FLOAT, 3),
+                                 normal,
+                                 Attribute("uv", 2, 2, gl.GL_FLOAT, 2),
+                                 # ^ brush uvs tile across whole faces, half floats would lose texels
+                                 Attribute("colour", 3, 3, gl.GL_UNSIGNED_BYTE, 4, True)),
+           "displacement": VertexFormat(Attribute("position", 0, 3, gl.GL_FLOAT, 3),
+                                        normal,
+                                        Attribute("uv", 2, 2, gl.GL_FLOAT, 2),
+                                        Attribute("blend_alpha", 4, 1, gl.GL_UNSIGNED_BYTE, 1, True)),
+           # ^ displacement colour comes from blend_alpha, see displacement.vert
+           "obj_model": VertexFormat(Attribute("position", 0, 3, gl.GL_FLOAT, 3),
+                                     normal,
+                                     Attribute("uv", 2, 2, gl.GL_HALF_FLOAT, 2),
+                                     Attribute("colour", 3, 3, gl.GL_UNSIGNED_BYTE, 4, True))}
+# ^ {renderable_type: VertexFormat}
@@ -0,0 +1,507 @@
+"""One viewport's camera & render mode, drawing from a Manager's shared geometry"""
+import numpy as np
+import OpenGL.GL as gl
+
+from .. import transform
+from ..physics import Frustum
+from . import bufferize
+from . import draw
+from .instances import Instances
+from .picking import closest_hit, Pick, pick_matrix, Picker
+from .profiler import Profiler
+from .vertex_format import formats
+
+
+class View:
+    """Everything one viewport's OpenGL context needs to draw a Manager's renderables
+    a Manager's buffers, programs & textures live in one share group (Qt.AA_ShareOpenGLContexts)
+    vertex arrays, helpers & queries can't be shared between contexts, so each View makes it's own"""
+    def __init__(self, manager):
+        self.manager = manager
+        manager.views.add(self)
+        self.draw_distance = manager.draw_distance
+        self.field_of_view = manager.field_of_view
+        self.aspect = 1  # width / height, set by the viewport when it resizes
+        self.view_matrix = transform.identity()
+        # ^ set by the viewport each frame, from it's camera
+        self.projection_matrix = transform.CachedMatrix(transform.perspective)
+        # ^ .projection_matrix(field_of_view, aspect, near, far)
+        self.view_projection = transform.identity()
+        # ^ projection @ view, from the last update_camera
+        self.camera_buffer = None
+        # ^ OpenGL uniform buffer holding the "Camera" block every shader shares, see update_camera
+        self.camera_matrices = None
+        # ^ (view, projection) last written to camera_buffer, only written again when either changes
+        self.render_mode = "flat"
+        # ^ which variant of each shader to draw with, see set_render_mode
+        self.shader = dict()
+        # ^ {renderable_type: program} for the current render_mode
+        self.vertex_arrays = dict()
+        # ^ {renderable_type: vertex array}, reading that type's vertex format, see bind_buffers
+        self.bound_buffers = None
+        # ^ (vertex, index) buffer handles vertex_arrays point at; compaction & growth replace them
+        self.frustum_slots = {renderable_type: np.zeros(0, dtype=np.int64) for renderable_type in manager.tables}
+        # ^ {renderable_type: slots}, of renderables inside the view frustum; visible or not
+        self.cull_cache = None
+        # ^ (matrix, bvh.version), only cull again when one of these changes
+        self.commands_cache = dict()
+        # ^ {renderable_type: (frustum_slots, table.version, lod_distance, view_matrix, commands)}, see draw_commands
+        # -- view_matrix is None for renderable types without levels of detail
+        self.command_buffer = None
+        # ^ OpenGL GL_DRAW_INDIRECT_BUFFER, holding the commands from draw_commands
+        self.uploaded_commands = None
+        # ^ {pass: [(index_type, commands)]} last written to command_buffer, see upload_commands
+        self.command_batches = dict()
+        # ^ {pass: [(index_type, byte offset, draw count)]}, one glMultiDrawElementsIndirect each
+        # -- passes are each renderable_type, then "faces" & "translucent"
+        self.frustum_translucent = []
+        # ^ [renderable] in manager.translucent, inside the view frustum; hidden or not
+        self.translucent_cache = (None, None, None, None, [])
+        # ^ (frustum_translucent, view_matrix, tables["brush"].version, transparency, runs), see translucent_draws
+        self.faces_cache = (None, None, None, [])
+        # ^ (frustum_slots["brush"], tables["brush"].version, manager.faces_version, runs), see face_draws
+        self.transparency = True
+        # ^ False draws translucent brushes opaque & unsorted
+        self.translucent_alpha = 0.4
+        # ^ how much of a translucent brush covers what's behind it
+
+        self.grid = draw.dot_grid()
+        self.grid_bounds = (-2048, -2048, 2048, 2048)
+        # ^ (min_x, min_y, max_x, max_y)
+        self.grid_scale = 64
+        self.origin_marker = draw.origin_marker()
+        # ^ draw.Helpers, only regenerated when their settings change
+
+        self.profiler = Profiler()
+        # ^ times each stage of update & draw, once profiler.enable() is called
+        self.picker = Picker()
+        # ^ draws the renderables under the cursor into a tiny framebuffer, see pick
+        self.on_change = None
+        # ^ callable, run whenever what's drawn changes; viewports use it to schedule a repaint
+
+    @property
+    def camera_position(self) -> np.ndarray:
+        """Where view_matrix looks from, in world space"""
+        return np.linalg.inv(self.view_matrix)[:3, 3]
+
+    def changed(self):
+        """Something visible has changed, the next frame will look different"""
+        if self.on_change is not None:
+            self.on_change()
+
+    @property
+    def busy(self) -> bool:
+        """Work left for update & draw, which needs more frames to finish"""
+        return self.manager.busy or len(self.picker) > 0
+
+    def initialise(self, shader_folder, glsl_version):
+        """Sets up this view's context, and the manager's shared resources if no other view has"""
+        if not self.manager.initialised:
+            self.manager.initialise(shader_folder, glsl_version)
+        gl.glClearColor(0.0, 0.0, 0.0, 0.0)
+        gl.glEnable(gl.GL_CULL_FACE)
+        gl.glEnable(gl.GL_DEPTH_TEST)
+        gl.glFrontFace(gl.GL_CW)
+        gl.glCullFace(gl.GL_BACK)
+        gl.glPointSize(4)
+        gl.glPolygonMode(gl.GL_BACK, gl.GL_LINE)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.manager.placeholder_texture)
+        self.camera_buffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, self.camera_buffer)
+        gl.glBufferData(gl.GL_UNIFORM_BUFFER, 3 * 64, None, gl.GL_DYNAMIC_DRAW)
+        self.camera_matrices = None
+        self.command_buffer = gl.glGenBuffers(1)
+        self.uploaded_commands = None
+        self.vertex_arrays = {renderable_type: gl.glGenVertexArrays(1) for renderable_type in formats}
+        self.bind_buffers()
+        self.picker.initialise()
+        self.set_render_mode(self.render_mode)
+
+    def set_render_mode(self, render_mode):
+        """Needs a current context; renderables without a render_mode variant are drawn flat"""
+        self.shader = {renderable_type: self.manager.shaders.program(render_mode, renderable_type)
+                       for renderable_type in self.manager.tables}
+        self.render_mode = render_mode
+        self.changed()
+
+    def bind_buffers(self):
+        """Points each vertex array at the manager's current vertex & index buffers
+        and at it's renderable type's states & the manager's slot ids, one per instance
+        each draw command's base_instance is a slot, so every draw reads it's own state & slot"""
+        manager = self.manager
+        vertex_buffer, index_buffer = manager.buffer["vertex"], manager.buffer["index"]
+        for renderable_type, vertex_array in self.vertex_arrays.items():
+            gl.glBindVertexArray(vertex_array)
+            if manager.base_vertex:
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, manager.state_buffer[renderable_type])
+                gl.glEnableVertexAttribArray(state_location)
+                gl.glVertexAttribIPointer(state_location, 4, gl.GL_UNSIGNED_BYTE, 4, gl.GLvoidp(0))
+                gl.glVertexAttribDivisor(state_location, 1)
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, manager.slot_buffer)
+                gl.glEnableVertexAttribArray(slot_location)
+                gl.glVertexAttribIPointer(slot_location, 1, gl.GL_UNSIGNED_INT, 4, gl.GLvoidp(0))
+                gl.glVertexAttribDivisor(slot_location, 1)
+            # ^ GLES has no base instance, states are set between draws instead, see submit
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vertex_buffer)
+            gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, index_buffer)
+            formats[renderable_type].bind()
+            Instances.unbind()  # obj_models in tables are drawn as one instance at the origin
+        gl.glBindVertexArray(0)
+        self.bound_buffers = (vertex_buffer, index_buffer)
+
+    def update(self):
+        """Runs the manager's shared uploads & updates this view's camera uniform buffer"""
+        with self.profiler.cpu("uploads"):
+            self.manager.update()
+        with self.profiler.cpu("uniforms"):
+            self.update_camera()
+
+    def update_camera(self):
+        """Writes view & projection into camera_buffer, once, for every shader to read"""
+        projection = self.projection_matrix(self.field_of_view, self.aspect, 0.1, self.draw_distance)
+        if self.camera_matrices is not None:
+            last_view, last_projection = self.camera_matrices
+            if self.view_matrix is last_view and projection is last_projection:
+                return  # cameras & CachedMatrix hand back the same matrix until something changes
+        self.view_projection = projection @ self.view_matrix
+        data = np.concatenate([transform.column_major(m) for m in (self.view_matrix, projection, self.view_projection)])
+        # ^ std140 "Camera" block: mat4 view, projection, view_projection; column-major
+        gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, self.camera_buffer)
+        gl.glBufferSubData(gl.GL_UNIFORM_BUFFER, 0, data.nbytes, data)
+        self.camera_matrices = (self.view_matrix, projection)
+
+    def cull(self, matrix):
+        """Fills frustum_slots with the slots of renderables inside the frustum of matrix (column-major MVP)
+        hiding & showing doesn't change what's culled, draw_commands skips slots that aren't visible"""
+        manager = self.manager
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if self.cull_cache is not None:
+            cached_matrix, cached_version = self.cull_cache
+            if cached_version == manager.bvh.version and np.array_equal(cached_matrix, matrix):
+                return  # nothing has moved
+        self.cull_cache = (matrix, manager.bvh.version)
+        frustum_slots = {renderable_type: [] for renderable_type in manager.tables}
+        frustum_translucent = []
+        for renderable in manager.bvh.query(Frustum.from_matrix(matrix)):
+            if renderable in manager.translucent:
+                frustum_translucent.append(renderable)
+            else:
+                frustum_slots[renderable[0]].append(manager.tables[renderable[0]].slots[renderable])
+        self.frustum_slots = {renderable_type: np.sort(np.array(slots, dtype=np.int64))
+                              for renderable_type, slots in frustum_slots.items()}
+        # ^ sorted, so draws follow the order renderables were added in
+        self.frustum_translucent = frustum_translucent
+
+    def draw(self):
+        manager = self.manager
+        profiler = self.profiler
+        for ids, callback in self.picker.poll():
+            callback(self.resolve_pick(ids))
+        with profiler.cpu("cull"):
+            self.cull(transform.column_major(self.view_projection))
+            passes = {renderable_type: list(self.draw_commands(renderable_type).items())
+                      for renderable_type in manager.tables}
+        with profiler.cpu("sort"):
+            passes["faces"] = self.face_draws()
+            passes["translucent"] = self.translucent_draws()
+        if manager.base_vertex:
+            self.upload_commands(passes)
+        gl.glBindBufferBase(gl.GL_UNIFORM_BUFFER, manager.camera_binding, self.camera_buffer)
+        with profiler.gpu("helpers"):
+            gl.glUseProgram(manager.helper_shader)
+            self.grid.set(*self.grid_bounds, self.grid_scale)
+            self.grid.draw()
+            self.origin_marker.set(128)
+            self.origin_marker.draw()
+        if self.bound_buffers != (manager.buffer["vertex"], manager.buffer["index"]):
+            self.bind_buffers()  # another view grew or compacted the buffers
+        if manager.base_vertex:
+            gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.command_buffer)
+        for renderable_type in manager.tables:
+            if len(passes[renderable_type]) == 0:
+                continue
+            with profiler.gpu(renderable_type):
+                gl.glBindVertexArray(self.vertex_arrays[renderable_type])
+                gl.glUseProgram(self.shader[renderable_type])
+                self.submit(renderable_type, renderable_type, passes[renderable_type])
+        # render models separately, one call draws every instance of a model
+        instanced = [r for r, i in manager.dynamics.items() if len(i) > 0 and r in manager.buffer_location]
+        if len(instanced) > 0:
+            with profiler.gpu("instanced"):
+                self.draw_instanced(instanced)
+        if len(passes["faces"]) > 0:
+            with profiler.gpu("faces"):
+                self.draw_faces(passes["faces"])
+        # translucent brushes go last, so everything opaque behind them is already drawn
+        if len(passes["translucent"]) > 0:
+            with profiler.gpu("translucent"):
+                self.draw_translucent(passes["translucent"])
+        if len(self.picker.requests) > 0:
+            with profiler.gpu("pick"):
+                self.draw_picks(passes)
+        if manager.base_vertex:
+            gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, 0)
+        gl.glBindVertexArray(0)
+
+    def submit(self, name, renderable_type, runs, picking=False):
+        """Draws runs = [(index_type, commands)] of pass name, with the bound vertex array & program
+        with base vertex, from the copy upload_commands put in command_buffer
+        GLES has no indirect draws, base instance or (without GL_EXT_multi_draw_arrays) multi draws;
+        so each renderable is drawn by itself, setting the "renderable_state" attribute whenever it changes
+        picking sets the "renderable_slot" attribute instead"""
+        if self.manager.base_vertex:
+            for index_type, offset, draw_count in self.command_batches.get(name, []):
+                gl.glMultiDrawElementsIndirect(gl.GL_TRIANGLES, index_type, gl.GLvoidp(offset), draw_count, 0)
+            return
+        states = self.manager.tables[renderable_type].states
+        for index_type, commands in runs:
+            counts = commands[:, 0].tolist()
+            offsets = (commands[:, 2] * index_type_sizes[index_type]).tolist()
+            if picking:
+                location, values = slot_location, np.zeros((len(commands), 4), dtype=np.uint32)
+                values[:, 0] = commands[:, 4]
+            else:
+                location, values = state_location, states[commands[:, 4]]
+            previous = None
+            for count, offset, value in zip(counts, offsets, values.tolist()):
+                if value != previous:  # neighbours mostly share a state; when picking, every slot differs
+                    gl.glVertexAttribI4ui(location, *value)
+                    previous = value
+                gl.glDrawElements(gl.GL_TRIANGLES, count, index_type, gl.GLvoidp(offset))
+        gl.glVertexAttribI4ui(state_location, 0, 0, 0, 0)
+
+    def pick(self, x, y, callback):
+        """Calls callback(render.picking.Pick) with what's under pixel (x, y), counted from the bottom left
+        drawn with the next frame & read back a frame or more later, without waiting on the GPU"""
+        self.picker.request(x, y, callback)
+        self.changed()
+
+    def draw_picks(self, passes):
+        """Draws every waiting pick request with the "pick" shader, reusing this frame's draw commands
+        the view's culling covers every pick inside it, so nothing has to be culled again"""
+        manager = self.manager
+        program = manager.shaders.program("flat", "pick")
+        x, y, width, height = gl.glGetIntegerv(gl.GL_VIEWPORT)
+        framebuffer = gl.glGetIntegerv(gl.GL_DRAW_FRAMEBUFFER_BINDING)
+        gl.glUseProgram(program)
+        matrix_location = gl.glGetUniformLocation(program, "pick_matrix")
+        type_location = gl.glGetUniformLocation(program, "renderable_type")
+        while len(self.picker.requests) > 0:
+            pick_x, pick_y, callback = self.picker.requests.popleft()
+            self.picker.begin()
+            matrix = pick_matrix(pick_x, pick_y, width, height, self.picker.size)
+            gl.glUniformMatrix4fv(matrix_location, 1, gl.GL_FALSE, transform.column_major(matrix))
+            for type_index, renderable_type in enumerate(manager.tables):
+                gl.glBindVertexArray(self.vertex_arrays[renderable_type])
+                gl.glUniform1ui(type_location, type_index + 1)
+                self.submit(renderable_type, renderable_type, passes[renderable_type], picking=True)
+                if renderable_type == "brush":  # translucent brushes can be picked too
+                    self.submit("translucent", "brush", passes["translucent"], picking=True)
+            self.picker.end(callback)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, framebuffer)
+        gl.glViewport(x, y, width, height)
+
+    def resolve_pick(self, ids):
+        """The Pick closest to the middle of ids, from Picker.poll"""
+        hit = closest_hit(ids)
+        if hit is None:
+            return Pick(None, None)
+        type_index, slot, vertex = hit
+        table = self.manager.tables[list(self.manager.tables)[type_index - 1]]
+        if slot >= len(table.renderables) or table.renderables[slot] is None:
+            return Pick(None, None)  # removed since it was drawn
+        renderable, vertex = table.renderables[slot], vertex - int(table.rows[slot, 2])
+        # ^ gl_VertexID counts from the start of the vertex buffer
+        face_vertices = self.manager.face_vertices.get(renderable)
+        return Pick(renderable, vertex, None if face_vertices is None else bufferize.face_at(face_vertices, vertex))
+
+    def draw_faces(self, runs):
+        """runs = [(index_type, commands)] from face_draws; darkens each selected face by manager.face_tint
+        redrawn over it's brush, so any render mode is tinted without changing the shaders"""
+        gl.glBindVertexArray(self.vertex_arrays["brush"])
+        gl.glUseProgram(self.shader["brush"])
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendColor(*self.manager.face_tint, 1)
+        gl.glBlendFunc(gl.GL_ZERO, gl.GL_CONSTANT_COLOR)  # what's drawn *= face_tint
+        gl.glDepthFunc(gl.GL_LEQUAL)  # the same triangles, at the same depth
+        gl.glDepthMask(gl.GL_FALSE)
+        self.submit("faces", "brush", runs)
+        gl.glDepthMask(gl.GL_TRUE)
+        gl.glDepthFunc(gl.GL_LESS)
+        gl.glDisable(gl.GL_BLEND)
+
+    def draw_translucent(self, runs):
+        """runs = [(index_type, commands)], back to front, from translucent_draws"""
+        gl.glBindVertexArray(self.vertex_arrays["brush"])
+        gl.glUseProgram(self.shader["brush"])
+        if self.transparency:
+            gl.glEnable(gl.GL_BLEND)
+            gl.glBlendColor(0, 0, 0, self.translucent_alpha)
+            gl.glBlendFunc(gl.GL_CONSTANT_ALPHA, gl.GL_ONE_MINUS_CONSTANT_ALPHA)
+            # ^ constant alpha works for every render mode, without touching the shaders
+            gl.glDepthMask(gl.GL_FALSE)  # depth tested against opaque geometry, but don't hide each other
+        self.submit("translucent", "brush", runs)
+        if self.transparency:
+            gl.glDepthMask(gl.GL_TRUE)
+            gl.glDisable(gl.GL_BLEND)
+
+    def draw_instanced(self, instanced):
+        """instanced = [renderable], each with at least one instance in manager.dynamics"""
+        manager = self.manager
+        gl.glBindVertexArray(self.vertex_arrays["obj_model"])
+        gl.glUseProgram(self.shader["obj_model"])
+        gl.glDisableVertexAttribArray(state_location)  # instances have their own tint
+        gl.glVertexAttribI4ui(state_location, 0, 0, 0, 0)
+        gl.glDisableVertexAttribArray(slot_location)
+        for renderable in instanced:
+            instances = manager.dynamics[renderable]
+            instances.bind()
+            location = manager.buffer_location[renderable]
+            start, length = location["index"]
+            vertex_start, vertex_length = location["vertex"]
+            stride = formats[renderable[0]].stride
+            index_dtype = np.dtype(manager.index_dtype(vertex_length // stride))
+            count = length // index_dtype.itemsize
+            if manager.base_vertex:
+                gl.glDrawElementsInstancedBaseVertex(gl.GL_TRIANGLES, count, index_types[index_dtype.itemsize],
+                                                     gl.GLvoidp(start), len(instances), vertex_start // stride)
+            else:
+                gl.glDrawElementsInstanced(gl.GL_TRIANGLES, count, gl.GL_UNSIGNED_INT, gl.GLvoidp(start), len(instances))
+        Instances.unbind()
+        if manager.base_vertex:
+            gl.glEnableVertexAttribArray(state_location)
+            gl.glEnableVertexAttribArray(slot_location)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, manager.buffer["vertex"])
+
+    def translucent_draws(self):
+        """[(index_type, commands)] drawing visible translucent brushes back to front, see draw_commands
+        only sorted again when the camera moves or what's visible changes"""
+        manager = self.manager
+        table = manager.tables["brush"]
+        frustum = self.frustum_translucent
+        cached_frustum, cached_view, cached_version, cached_transparency, runs = self.translucent_cache
+        if cached_frustum is frustum and cached_view is self.view_matrix \
+                and (cached_version, cached_transparency) == (table.version, self.transparency):
+            return runs  # the camera is still
+        runs = []
+        visible = [renderable for renderable in frustum if renderable not in manager.dont_draw]
+        if len(visible) > 0:
+            slots = table.slots_of(visible)
+            if self.transparency:
+                offsets = table.centres[slots] - self.camera_position
+                distances = np.einsum("ij,ij->i", offsets, offsets)
+                slots = slots[np.argsort(-distances, kind="stable")]  # furthest first
+            index_sizes = table.rows[slots, 4]
+            for run in np.split(slots, np.flatnonzero(np.diff(index_sizes)) + 1):
+                # ^ one multi draw per run of the same index type, keeping the sorted order
+                index_size = int(table.rows[run[0], 4])
+                runs.append((index_types[index_size], self.commands(table, run)))
+        self.translucent_cache = (frustum, self.view_matrix, table.version, self.transparency, runs)
+        return runs
+
+    def face_draws(self):
+        """[(index_type, commands)] drawing the faces in manager.selected_faces of visible brushes in the view frustum"""
+        manager = self.manager
+        table = manager.tables["brush"]
+        frustum = self.frustum_slots["brush"]
+        cached_frustum, cached_version, cached_faces, runs = self.faces_cache
+        if cached_frustum is frustum and (cached_version, cached_faces) == (table.version, manager.faces_version):
+            return runs
+        runs = []
+        slots, spans = [], []
+        # ^ [slot], [(first_index, index_count)]; a row each
+        frustum_translucent = set(self.frustum_translucent)
+        for renderable, faces in manager.selected_faces.items():
+            slot = table.slots.get(renderable)
+            if slot is None or renderable in manager.dont_draw:
+                continue
+            if not (table.visible[slot] and slot in frustum) and renderable not in frustum_translucent:
+                continue
+            for span in sorted(faces):
+                slots.append(slot)
+                spans.append(span)
+        if len(slots) > 0:
+            slots, spans = np.array(slots, dtype=np.int64), np.array(spans, dtype=np.int64)
+            for index_size, index_type in index_types.items():
+                group = table.rows[slots, 4] == index_size
+                if np.any(group):
+                    commands = self.commands(table, slots[group])
+                    commands[:, 0] = spans[group, 1]
+                    commands[:, 2] += spans[group, 0].astype(np.uint32)
+                    runs.append((index_type, commands))
+        self.faces_cache = (frustum, table.version, manager.faces_version, runs)
+        return runs
+
+    def draw_commands(self, renderable_type):
+        """{index_type: uint32 (N, 5) DrawElementsIndirectCommands} for visible renderables inside the view frustum
+        each command is (count, instance_count, first_index, base_vertex, base_instance)
+        base_instance is the renderable's slot, so shaders read it's state from manager.state_buffer
+        rebuilt in one vectorized step when culling, visibility or (for displacements) the camera changes
+        displacements are drawn at the level of detail manager.level_of_detail picks"""
+        manager = self.manager
+        table = manager.tables[renderable_type]
+        slots = self.frustum_slots[renderable_type]
+        camera = self.view_matrix if renderable_type == "displacement" else None
+        key = (slots, table.version, manager.lod_distance, camera)
+        cached = self.commands_cache.get(renderable_type)
+        if cached is not None and cached[0] is slots and cached[1:3] == key[1:3] and cached[3] is camera:
+            return cached[4]
+        slots = slots[table.visible[slots]]
+        index_sizes = table.rows[slots, 4]
+        lod = None
+        if renderable_type == "displacement":
+            lod = manager.level_of_detail(slots, self.camera_position)
+        commands = dict()
+        for index_size, index_type in index_types.items():
+            group = index_sizes == index_size
+            if np.any(group):
+                commands[index_type] = self.commands(table, slots[group], None if lod is None else
+                                                     (lod[0][group], lod[1][group]))
+        self.commands_cache[renderable_type] = (*key, commands)
+        return commands
+
+    def commands(self, table, slots, index_spans=None):
+        """uint32 (N, 5) DrawElementsIndirectCommands drawing slots of table, which all share one index size
+        index_spans = (index_starts, index_lengths) in bytes, to draw part of each slot's indices"""
+        index_starts, index_lengths, base_vertices, vertex_counts, index_sizes = table.rows[slots].T
+        if index_spans is not None:
+            index_starts, index_lengths = index_spans
+        commands = np.zeros((len(slots), 5), dtype=np.uint32)
+        commands[:, 0] = index_lengths // index_sizes
+        commands[:, 1] = 1
+        commands[:, 2] = index_starts // index_sizes
+        if self.manager.base_vertex:
+            commands[:, 3] = base_vertices
+        commands[:, 4] = slots
+        return commands
+
+    def upload_commands(self, passes):
+        """Writes passes = {pass: [(index_type, commands)]} into command_buffer & fills command_batches
+        only uploads when some pass's commands have changed"""
+        uploaded = self.uploaded_commands
+        if uploaded is not None and uploaded.keys() == passes.keys() \
+                and all(len(uploaded[p]) == len(runs) and all(a[1] is b[1] for a, b in zip(uploaded[p], runs))
+                        for p, runs in passes.items()):
+            return
+        batches, data, offset = dict(), [], 0
+        for name, runs in passes.items():
+            for index_type, commands in runs:
+                batches.setdefault(name, []).append((index_type, offset, len(commands)))
+                data.append(commands)
+                offset += commands.nbytes
+        if len(data) > 0:
+            data = np.concatenate(data)
+            gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.command_buffer)
+            gl.glBufferData(gl.GL_DRAW_INDIRECT_BUFFER, data.nbytes, data, gl.GL_STREAM_DRAW)
+            gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, 0)
+        self.command_batches = batches
+        self.uploaded_commands = passes
+
+
+index_types = {2: gl.GL_UNSIGNED_SHORT, 4: gl.GL_UNSIGNED_INT}
+# ^ {bytes per index: index type}
+index_type_sizes = {index_type: index_size for index_size, index_type in index_types.items()}
+state_location = 9
+# ^ layout(location = 9) in uvec4 renderable_state; see shaders/glsl/brush.vert & DrawTable.states
+slot_location = 10
+# ^ layout(location = 10) in uint renderable_slot; see shaders/glsl/pick.vert
@@ -0,0 +1,72 @@
+"""4x4 transform matrices, built on the CPU with NumPy
+matrices are row-major & multiply column vectors (matrix @ vector), like the OpenGL spec writes them
+transpose before handing them to OpenGL, which expects column-major"""
+from __future__ import annotations
+import math
+from typing import Callable, Iterable, Tuple, Union
+
+import numpy as np
+
+
+class CachedMatrix:
+    """Wraps a function that builds a matrix, only calling it again when it's arguments change
+    the returned matrix is shared between calls, so it's read-only"""
+    build: Callable[..., np.ndarray]
+    key: Union[Tuple, None]  # arguments of the last build
+    matrix: Union[np.ndarray, None]
+
+    def __init__(self, build: Callable[..., np.ndarray]):
+        self.build = build
+        self.key = None
+        self.matrix = None
+
+    def __call__(self, *args) -> np.ndarray:
+        if args != self.key:
+            self.matrix = self.build(*args)
+            self.matrix.flags.writeable = False
+            self.key = args
+        return self.matrix
+
+
+def identity() -> np.ndarray:
+    return np.identity(4, dtype=np.float32)
+
+
+def perspective(field_of_view: float, aspect: float, near: float, far: float) -> np.ndarray:
+    """same as gluPerspective; field_of_view is vertical, in degrees"""
+    f = 1 / math.tan(math.radians(field_of_view) / 2)
+    return np.array([[f / aspect, 0, 0, 0],
+                     [0, f, 0, 0],
+                     [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+                     [0, 0, -1, 0]], dtype=np.float32)
+
+
+def rotate(degrees: float, x: float, y: float, z: float) -> np.ndarray:
+    """same as glRotate; counter-clockwise around the axis (x, y, z)"""
+    axis = np.array([x, y, z], dtype=np.float64)
+    x, y, z = axis / np.linalg.norm(axis)
+    theta = math.radians(degrees)
+    c, s = math.cos(theta), math.sin(theta)
+    t = 1 - c
+    return np.array([[x * x * t + c, x * y * t - z * s, x * z * t + y * s, 0],
+                     [y * x * t + z * s, y * y * t + c, y * z * t - x * s, 0],
+                     [z * x * t - y * s, z * y * t + x * s, z * z * t + c, 0],
+                     [0, 0, 0, 1]], dtype=np.float32)
+
+
+def translate(x: float, y: float, z: float) -> np.ndarray:
+    """same as glTranslate"""
+    matrix = identity()
+    matrix[:3, 3] = x, y, z
+    return matrix
+
+
+def column_major(matrix: np.ndarray) -> np.ndarray:
+    """float32 bytes in the order glUniformMatrix4fv & std140 uniform blocks expect"""
+    return np.ascontiguousarray(np.asarray(matrix, dtype=np.float32).T)
+
+
+def transform_point(matrix: np.ndarray, point: Iterable[float]) -> np.ndarray:
+    """matrix @ (*point, 1), with the perspective divide"""
+    x, y, z, w = matrix @ np.array([*point, 1], dtype=np.float32)
+    return np.array([x, y, z], dtype=np.float32) / w
@@ -0,0 +1,169 @@
+"""Compares the throughput of render.bufferize against the original list-based implementation
+
+usage: python benchmarks/bufferize.py [--vmf VMF] [--obj OBJ] [--repeat N] [--size TRIANGLES] [--full]
+run from the root of the repo"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+import vmf_tool
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from QtPyHammer.utilities import vector  # noqa: E402
+from QtPyHammer.utilities.obj import Obj  # noqa: E402
+from QtPyHammer.utilities.render import bufferize  # noqa: E402
+from QtPyHammer.utilities.render.vertex_format import formats  # noqa: E402
+
+
+# original implementations, kept as a baseline
+def legacy_brush(brush):
+    vertices = []  # [(*position, *normal, *uv, *colour), ...]
+    indices = []
+    for face in brush.faces:
+        polygon_indices = []
+        normal = face.plane[0]
+        for i, vertex in enumerate(face.polygon):
+            uv = face.uv_at(vertex)
+            assembled_vertex = (*vertex, *normal, *uv, *brush.colour)
+            if assembled_vertex not in vertices:
+                vertices.append(assembled_vertex)
+                polygon_indices.append(len(vertices) - 1)
+            else:
+                polygon_indices.append(vertices.index(assembled_vertex))
+        indices.extend(bufferize.loop_triangle_fan(polygon_indices))
+    vertices = tuple(itertools.chain(*vertices))
+    return vertices, indices
+
+
+def legacy_displacement(face):
+    vertices = []
+    # ^ [(*position, *normal, *uv, blend_alpha, 0, 0), ...]
+    quad = tuple(vector.vec3(*P) for P in face.polygon)
+    start = vector.vec3(*face.displacement.start)
+    if start not in quad:  # start = closest point on quad to start
+        start = sorted(quad, key=lambda P: (start - P).magnitude())[0]
+    starting_index = quad.index(start) - 1
+    quad = quad[starting_index:] + quad[:starting_index]
+    A, B, C, D = quad
+    DA = D - A
+    CB = C - B
+    displacement = face.displacement
+    power2 = 2 ** displacement.power
+    for i, normal_row, distance_row, alpha_row in zip(itertools.count(), displacement.normals,
+                                                      displacement.distances, displacement.alphas):
+        left_vert = A + (DA * i / power2)
+        right_vert = B + (CB * i / power2)
+        for j, normal, distance, alpha in zip(itertools.count(), normal_row,
+                                              distance_row, alpha_row):
+            barymetric = vector.lerp(right_vert, left_vert, j / power2)
+            position = vector.vec3(*barymetric) + (normal * distance)
+            normal = face.plane[0]
+            uv = face.uv_at(barymetric)
+            alpha = alpha / 255
+            vertices.append((*position, *normal, *uv, alpha, 0, 0))
+    vertices = list(itertools.chain(*vertices))
+    indices = legacy_disp_indices(displacement.power)
+    return vertices, indices
+
+
+def legacy_disp_indices(power):
+    return list(bufferize.disp_indices.__wrapped__(power))
+
+
+def legacy_obj_model(obj_model):
+    vertex_data = []  # [(*position, *normal, *uv, *colour)]
+    index_data = []
+    for polygon in obj_model.faces:
+        indices = []
+        for v_index, vn_index, vt_index in polygon:
+            position = obj_model.vertices[v_index] if v_index is not None else (0, 0, 0)
+            normal = obj_model.normals[vn_index] if vn_index is not None else (0, 0, 0)
+            uv = obj_model.uvs[vt_index] if vt_index is not None else (0, 0)
+            vertex = (*position, *normal, *uv, *(.75, .75, .75))
+            if vertex not in vertex_data:
+                vertex_data.append(vertex)
+                indices.append(len(vertex_data) - 1)
+            else:
+                vertex_index = vertex_data.index(vertex)
+                indices.append(vertex_index)
+        index_data.extend(bufferize.loop_triangle_fan(indices))
+    vertex_data = tuple(itertools.chain(*vertex_data))
+    return vertex_data, index_data
+
+
+def grid_obj(triangle_count):
+    """A flat grid of quads with shared vertices, normals & uvs"""
+    side = max(int((triangle_count / 2) ** 0.5), 1)
+    vertices = [(x, y, 0) for y in range(side + 1) for x in range(side + 1)]
+    uvs = [(x / side, y / side) for x, y, z in vertices]
+    faces = []
+    for y in range(side):
+        for x in range(side):
+            corners = (y * (side + 1) + x, y * (side + 1) + x + 1,
+                       (y + 1) * (side + 1) + x + 1, (y + 1) * (side + 1) + x)
+            faces.append([(i, 0, i) for i in corners])
+    return Obj(f"grid_{side}x{side}.obj", v=vertices, vn=[(0, 0, 1)], vt=uvs, f=faces,
+               o={None: [0, len(faces)]}, g={None: [0, len(faces)]})
+
+
+def time_it(function, objects, batched=False):
+    """batched functions take the whole list of objects at once, like bufferize.brushes"""
+    start = time.perf_counter()
+    outputs = function(objects) if batched else [function(o) for o in objects]
+    return time.perf_counter() - start, outputs
+
+
+def brush_batch(brushes):
+    return [(vertices, indices) for vertices, indices, face_vertices in bufferize.brush_batch(brushes)]
+
+
+def compare(label, legacy_function, function, objects, renderable_type, batched=False):
+    new_time, new_outputs = time_it(function, objects, batched)
+    triangles = sum(len(indices) // 3 for vertices, indices in new_outputs)
+    result = {"triangles": triangles, "new": new_time}
+    if legacy_function is not None:
+        old_time, old_outputs = time_it(legacy_function, objects)
+        vertex_format = formats[renderable_type]
+        for (old_vertices, old_indices), (new_vertices, new_indices) in zip(old_outputs, new_outputs):
+            old_rows = np.array(old_vertices, dtype=np.float32).reshape(-1, 11)[:, :vertex_format.columns]
+            old_vertices = vertex_format.pack(old_rows)  # legacy vertices are 11 floats, whatever their type
+            for name in vertex_format.dtype.names:
+                if renderable_type == "displacement" and name == "normal":
+                    continue  # smoothed per vertex, the legacy version used the face normal
+                assert np.allclose(old_vertices[name].astype(np.float64), new_vertices[name].astype(np.float64))
+            assert np.array_equal(np.array(old_indices, dtype=np.uint32), new_indices[:len(old_indices)])
+            # ^ displacements follow their full resolution indices with every lower level of detail
+        result["old"] = old_time
+    print(f"{label}: {triangles} triangles")
+    for version in ("old", "new"):
+        if version in result:
+            seconds = result[version]
+            rate = triangles / seconds if seconds > 0 else float("inf")
+            print(f"  {version}: {seconds * 1000:9.2f} ms ({rate:,.0f} triangles/s)")
+    if "old" in result and new_time > 0:
+        print(f"  speedup: {result['old'] / new_time:.1f}x")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--vmf", default="Team Fortress 2/tf/mapsrc/test2.vmf")
+    parser.add_argument("--obj", default="prototypes/demo_viewer/scout.obj")
+    parser.add_argument("--repeat", type=int, default=100, help="times to bufferize each brush & displacement")
+    parser.add_argument("--size", type=int, default=100_000, help="triangles in the generated .obj")
+    parser.add_argument("--full", action="store_true", help="run the old implementation on the generated .obj (slow!)")
+    args = parser.parse_args()
+
+    vmf = vmf_tool.Vmf(args.vmf)
+    compare(f"{args.vmf} brushes (x{args.repeat})", legacy_brush, brush_batch,
+            list(vmf.brushes.values()) * args.repeat, "brush", batched=True)
+    # ^ render.Manager bufferizes brushes in batches
+    faces = [f for b in vmf.brushes.values() for f in b.faces if hasattr(f, "displacement")]
+    compare(f"{args.vmf} displacements (x{args.repeat})", legacy_displacement, bufferize.displacement,
+            faces * args.repeat, "displacement")
+    compare(args.obj, legacy_obj_model, bufferize.obj_model, [Obj.load_from_file(args.obj)], "obj_model")
+    large_obj = grid_obj(args.size)
+    compare(large_obj.name, legacy_obj_model if args.full else None, bufferize.obj_model, [large_obj], "obj_model")
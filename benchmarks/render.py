@@ -0,0 +1,198 @@
+"""Renders a .vmf offscreen along a scripted camera path & reports frame times as JSON
+
+usage: python benchmarks/render.py [--vmf VMF] [--frames N] [--size WIDTH HEIGHT] [--output FILE] [--hardware]
+run from the root of the repo; uses Mesa's llvmpipe unless --hardware is given, so results are comparable across machines"""
+import argparse
+import datetime
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def offscreen_context(width, height):
+    """Make a hidden OpenGL context current, rendering into a framebuffer object"""
+    from PyQt5 import QtGui
+    surface_format = QtGui.QSurfaceFormat()
+    surface_format.setVersion(4, 5)
+    surface_format.setProfile(QtGui.QSurfaceFormat.CompatibilityProfile)
+    surface_format.setDepthBufferSize(24)
+    context = QtGui.QOpenGLContext()
+    context.setFormat(surface_format)
+    if not context.create():
+        raise RuntimeError("Couldn't create an OpenGL context")
+    surface = QtGui.QOffscreenSurface()
+    surface.setFormat(context.format())
+    surface.create()
+    if not context.makeCurrent(surface):
+        raise RuntimeError("Couldn't make the OpenGL context current")
+    framebuffer = QtGui.QOpenGLFramebufferObject(width, height, QtGui.QOpenGLFramebufferObject.CombinedDepthStencil)
+    framebuffer.bind()
+    return context, surface, framebuffer
+    # ^ keep these alive for as long as you are rendering
+
+
+shader_folder = os.path.join(os.path.dirname(__file__), "..", "shaders", "glsl", "")
+
+
+def glsl_version():
+    """same choice as ui.viewport.MapViewport3D.initializeGL"""
+    import OpenGL.GL as gl
+    major = gl.glGetIntegerv(gl.GL_MAJOR_VERSION)
+    minor = gl.glGetIntegerv(gl.GL_MINOR_VERSION)
+    return "GLSL_450" if (major, minor) >= (4, 5) else "GLES_300"
+
+
+def camera_path(brushes, frames):
+    """yields a (position, rotation) for each frame, orbiting the centre of brushes & looking at it"""
+    mins = [min(min(v[i] for f in b.faces for v in f.polygon) for b in brushes) for i in range(3)]
+    maxs = [max(max(v[i] for f in b.faces for v in f.polygon) for b in brushes) for i in range(3)]
+    centre = [(a + b) / 2 for a, b in zip(mins, maxs)]
+    radius = max(maxs[0] - mins[0], maxs[1] - mins[1]) * .75 + 64
+    height = (maxs[2] - mins[2]) / 2 + radius / 2
+    pitch = math.degrees(math.atan2(height, radius))
+    for frame in range(frames):
+        angle = 360 * frame / frames
+        x = centre[0] + math.sin(math.radians(angle)) * radius
+        y = centre[1] - math.cos(math.radians(angle)) * radius
+        yield (x, y, centre[2] + height), (pitch, 0, -angle)
+
+
+def percentiles(samples, *ps):
+    samples = sorted(samples)
+    return {f"p{p}": samples[min(len(samples) - 1, int(len(samples) * p / 100))] for p in ps}
+
+
+def draws_submitted(view):
+    """indirect draw commands + instanced models + grid & origin marker"""
+    manager = view.manager
+    sub_draws = sum(len(commands) for renderable_type in manager.tables
+                    for commands in view.draw_commands(renderable_type).values())
+    instanced = sum(1 for r, i in manager.dynamics.items() if len(i) > 0 and r in manager.buffer_location)
+    return sub_draws + instanced + 2
+
+
+def visibility_toggle(manager):
+    """milliseconds to hide & then show every brush, like toggling a visgroup holding the whole map"""
+    brushes = list(manager.tables["brush"].slots)
+    start = time.perf_counter()
+    manager.hide(*brushes)
+    hidden = time.perf_counter()
+    manager.show(*brushes)
+    shown = time.perf_counter()
+    return {"brushes": len(brushes), "hide_ms": (hidden - start) * 1000, "show_ms": (shown - hidden) * 1000}
+
+
+def selection_toggle(manager):
+    """milliseconds to select & then deselect every brush, & the bytes of renderable state uploaded after"""
+    brushes = list(manager.tables["brush"].slots)
+    start = time.perf_counter()
+    manager.select(*brushes)
+    selected = time.perf_counter()
+    manager.deselect(*brushes)
+    deselected = time.perf_counter()
+    changed = [table.changed_states for table in manager.tables.values() if table.changed_states is not None]
+    return {"brushes": len(brushes), "select_ms": (selected - start) * 1000, "deselect_ms": (deselected - selected) * 1000,
+            "state_bytes": sum((end - first) * 4 for first, end in changed)}
+
+
+def shader_startup(manager):
+    """milliseconds to compile_shaders without & with a program binary cache"""
+    from QtPyHammer.utilities.render.shader_cache import ProgramCache
+    times = dict()
+    with tempfile.TemporaryDirectory() as cache_folder:
+        for run in ("cold", "warm"):  # cold fills the cache, warm loads from it
+            manager.shader_cache = ProgramCache(cache_folder)
+            manager.compile_shaders(shader_folder, glsl_version())
+            times[f"{run}_ms"] = manager.shader_init_time
+        return {**times, "binaries_loaded": manager.shader_cache.stats["hits"]}
+
+
+def run(vmf_filename, frames=600, width=1280, height=720, draw_distance=4096, field_of_view=90, memory_limit=128):
+    """Load vmf_filename & render it; an OpenGL context must already be current"""
+    import OpenGL.GL as gl
+    from QtPyHammer.ops.vmf import VmfInterface
+    from QtPyHammer.utilities import camera
+    from QtPyHammer.utilities import render
+    from QtPyHammer.utilities import vector
+
+    manager = render.Manager(draw_distance, field_of_view, memory_limit)
+    view = render.View(manager)
+    view.initialise(shader_folder, glsl_version())
+    view.aspect = width / height
+    gl.glViewport(0, 0, width, height)
+    shaders = shader_startup(manager)
+    freecam = camera.freecam((0, 0, 0), (0, 0, 0))
+
+    def frame():
+        start = time.perf_counter()
+        view.view_matrix = freecam.view_matrix()  # same order of operations as MapViewport3D.paintGL
+        view.update()
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+        view.draw()
+        gl.glFinish()  # wait for the GPU, so the frame is really done
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    parent = types.SimpleNamespace(viewport=types.SimpleNamespace(render_manager=manager))
+    vmf = VmfInterface(parent, vmf_filename)  # as ui.workspace.VmfTab does
+    bufferize_time = (time.perf_counter() - start) * 1000
+    load_frames = 0
+    while len(manager.buffer_update_queue) > 0 or manager.compaction_pending:
+        frame()
+        load_frames += 1
+    load_time = (time.perf_counter() - start) * 1000
+
+    visibility = visibility_toggle(manager)
+    selection = selection_toggle(manager)
+    frame_times, draws = list(), list()
+    for position, rotation in camera_path(list(vmf.brushes), frames):
+        freecam.position, freecam.rotation = vector.vec3(*position), vector.vec3(*rotation)
+        frame_times.append(frame())
+        draws.append(draws_submitted(view))
+
+    return {"vmf": os.path.basename(vmf_filename),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "renderer": gl.glGetString(gl.GL_RENDERER).decode(),
+            "version": gl.glGetString(gl.GL_VERSION).decode(),
+            "resolution": [width, height],
+            "shaders": shaders,
+            "load": {"bufferize_ms": bufferize_time, "total_ms": load_time, "frames": load_frames,
+                     "bytes_uploaded": manager.buffer_update_queue.bytes_uploaded},
+            "frames": frames,
+            "frame_time_ms": {"mean": sum(frame_times) / frames, **percentiles(frame_times, 50, 90, 99),
+                              "max": max(frame_times)},
+            "draws": {"mean": sum(draws) / frames, "max": max(draws)},
+            "visibility": visibility,
+            "selection": selection,
+            "buffers": manager.buffer_stats()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--vmf", default="Team Fortress 2/tf/mapsrc/test2.vmf")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--size", type=int, nargs=2, default=(1280, 720), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--output", help="write JSON here, instead of stdout")
+    parser.add_argument("--hardware", action="store_true", help="render on the GPU, instead of llvmpipe")
+    args = parser.parse_args()
+
+    if not args.hardware:
+        os.environ["LIBGL_ALWAYS_SOFTWARE"] = "1"
+        os.environ.setdefault("GALLIUM_DRIVER", "llvmpipe")
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5 import QtGui
+    app = QtGui.QGuiApplication(sys.argv)
+    context = offscreen_context(*args.size)
+    results = run(args.vmf, args.frames, *args.size)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as json_file:
+            json.dump(results, json_file, indent=2)
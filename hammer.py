@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 import sys
 
@@ -21,6 +22,8 @@ class QtPyHammerApp(QtWidgets.QApplication):
     # code anywhere in QtPyHammer can access the app by calling:
     # -- QtWidgets.QApplication.instance()
     def __init__(self, argv):
+        QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
+        # ^ every viewport can draw from the same buffers, programs & textures; must be set before the app exists
         super(QtWidgets.QApplication, self).__init__(argv)
         self.folder = os.path.dirname(__file__)
         self.preferences = load_ini("configs/preferences.ini")
@@ -57,6 +60,8 @@ class QtPyHammerApp(QtWidgets.QApplication):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    # ^ frozen builds (build.py) would otherwise run the whole editor in each bufferize worker, see ui/viewport.py
     app = QtPyHammerApp([])  # sys.argv is for filenames only
     window = MainWindow()
     window.showMaximized()
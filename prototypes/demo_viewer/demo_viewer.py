@@ -8,7 +8,7 @@ from PyQt5 import QtCore, QtWidgets
 import vmf_tool
 
 sys.path.insert(0, "../../")  # run this script from tests/prototypes/
-from QtPyHammer.ui.viewport import MapViewport3D  # noqa: E402
+from QtPyHammer.ui.viewport import MapViewport3D, new_render_manager  # noqa: E402
 from QtPyHammer.utilities.obj import Obj  # noqa: E402
 
 
@@ -76,13 +76,16 @@ window.setMenuBar(menu)
 splitter = QtWidgets.QSplitter()
 window.setCentralWidget(splitter)
 
-viewport = MapViewport3D()
+render_manager = new_render_manager()
+render_manager.executor = None
+# ^ bufferize here; this script isn't behind `if __name__ == "__main__":`, so spawned workers would run it again
+viewport = MapViewport3D(render_manager)
 viewport.setMinimumSize(512, 512)
 # we need to update the render manager
 tf2_scout = Obj.load_from_file("scout.obj")
 viewport.render_manager.add_obj_models(tf2_scout)
-viewport.render_manager.dynamics[("obj_model", "scout.obj")] = {"position": [0, 128, -64]}
-viewport.render_manager.draw_calls["obj_model"] = []
+scout = viewport.render_manager.add_instance(("obj_model", "scout.obj"), position=[0, 128, -64])
+viewport.render_manager.hide(("obj_model", "scout.obj"))  # only draw the instance
 test2_vmf = vmf_tool.Vmf("../../Team Fortress 2/tf/mapsrc/test2.vmf")
 viewport.render_manager.add_brushes(*test2_vmf.brushes.values())
 splitter.addWidget(viewport)
@@ -129,7 +132,7 @@ def update_player_models(json_text):
     frame = json.load(io.StringIO(json_text))
     position = frame["result"]["player_entities"][0]["position"]
     x, y, z = position["x"], position["y"], position["z"]
-    viewport.render_manager.dynamics[("obj_model", "scout.obj")]["position"] = [x, y, z]
+    viewport.render_manager.update_instance(("obj_model", "scout.obj"), scout, position=[x, y, z])
 
 
 def get_tickrate(json_text):
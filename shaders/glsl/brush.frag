@@ -0,0 +1,29 @@
+// render modes: flat stripey textured
+layout(location = 0) out vec4 outColour;
+
+in vec3 position;
+in vec3 normal;
+in vec2 uv;
+in vec3 colour;
+
+in float Kd;
+in vec4 highlight;
+
+#ifdef TEXTURED
+uniform sampler2D albedo_texture;  // Texture Atlas or Array
+#endif
+
+void main()
+{
+    vec4 Ka = vec4(0.25, 0.25, 0.25, 1);
+#if defined(TEXTURED)
+    outColour = texture(albedo_texture, uv) * (Kd + Ka);
+#elif defined(STRIPEY)
+    float stripe = mod((uv.x + uv.y) / 64.0, 1.0);
+    stripe = (stripe > 0.5 ? 1.0 : 0.25);
+    outColour = stripe * vec4(colour, 1) * (Kd + Ka);
+#else  // FLAT
+    outColour = vec4(colour, 1) * (Kd + Ka);
+#endif
+    outColour.rgb = mix(outColour.rgb, highlight.rgb, highlight.a);
+}
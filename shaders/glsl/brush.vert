@@ -0,0 +1,37 @@
+layout(location = 0) in vec3 vertex_position;
+layout(location = 1) in vec3 vertex_normal;
+layout(location = 2) in vec2 vertex_uv;
+layout(location = 3) in vec3 vertex_colour;
+layout(location = 9) in uvec4 renderable_state;  // flags, then a tint's r, g, b; see render/draw_table.py
+
+layout(std140) uniform Camera  // shared by every program, see render.Manager.update_camera
+{
+    mat4 view;
+    mat4 projection;
+    mat4 view_projection;
+};
+
+out vec3 position;
+out vec3 normal;
+out vec2 uv;
+out vec3 colour;
+
+out float Kd;
+out vec4 highlight;  // rgb, & how much of it covers colour
+
+void main()
+{
+    position = vertex_position;
+    normal = vertex_normal;
+    uv = vec2(vertex_uv.x, -vertex_uv.y);
+    colour = vertex_colour;
+
+    Kd = dot(normal, vec3(.05, .35, .60)) / 3.0 + 0.5;
+
+    bool selected = (renderable_state.x & 1u) != 0u;  // SELECTED
+    bool hovered = (renderable_state.x & 2u) != 0u;  // HOVERED
+    highlight = vec4(selected ? vec3(renderable_state.yzw) / 255.0 : vec3(1),
+                     (selected ? 0.5 : 0.0) + (hovered ? 0.25 : 0.0));
+
+    gl_Position = view_projection * vec4(vertex_position, 1);
+}
@@ -0,0 +1,29 @@
+// render modes: flat textured
+layout(location = 0) out vec4 outColour;
+
+in vec3 position;
+in vec3 normal;
+in vec2 uv;
+in float blend;
+
+in vec3 colour;
+in float Kd;
+in vec4 highlight;
+
+#ifdef TEXTURED
+uniform sampler2D blend_texture1;
+uniform sampler2D blend_texture2;
+#endif
+
+void main()
+{
+    vec4 Ka = vec4(0.25, 0.25, 0.25, 1);
+#if defined(TEXTURED)
+    vec4 albedo1 = texture(blend_texture1, uv);
+    vec4 albedo2 = texture(blend_texture2, uv);
+    outColour = mix(albedo1, albedo2, blend) * (Kd + Ka);
+#else  // FLAT
+    outColour = vec4(colour, 1) * (Kd + Ka);
+#endif
+    outColour.rgb = mix(outColour.rgb, highlight.rgb, highlight.a);
+}
@@ -0,0 +1,9 @@
+// render modes: flat
+layout(location = 0) out vec4 outColour;
+
+in vec3 colour;
+
+void main()
+{
+    outColour = vec4(colour, 1);
+}
@@ -0,0 +1,18 @@
+layout(location = 0) in vec3 vertex_position;
+layout(location = 3) in vec3 vertex_colour;
+
+layout(std140) uniform Camera  // shared by every program, see render.Manager.update_camera
+{
+    mat4 view;
+    mat4 projection;
+    mat4 view_projection;
+};
+
+out vec3 colour;
+
+void main()
+{
+    colour = vertex_colour;
+    gl_PointSize = 4.0;
+    gl_Position = view_projection * vec4(vertex_position, 1);
+}
@@ -0,0 +1,53 @@
+layout(location = 0) in vec3 vertex_position;
+layout(location = 1) in vec3 vertex_normal;
+layout(location = 2) in vec2 vertex_uv;
+layout(location = 3) in vec3 vertex_colour;
+// per-instance attributes (see render/instances.py)
+layout(location = 5) in vec3 instance_position;
+layout(location = 6) in vec3 instance_rotation;  // pitch, yaw, roll (degrees)
+layout(location = 7) in float instance_scale;
+layout(location = 8) in vec3 instance_tint;
+layout(location = 9) in uvec4 renderable_state;  // flags, then a tint's r, g, b; see render/draw_table.py
+
+layout(std140) uniform Camera  // shared by every program, see render.Manager.update_camera
+{
+    mat4 view;
+    mat4 projection;
+    mat4 view_projection;
+};
+
+out vec3 position;
+out vec3 normal;
+out vec2 uv;
+out vec3 colour;
+
+out float Kd;
+out vec4 highlight;  // rgb, & how much of it covers colour
+
+mat3 rotation_matrix(vec3 angles)
+{
+    vec3 r = radians(angles);
+    mat3 pitch = mat3(cos(r.x), 0, -sin(r.x),  0, 1, 0,  sin(r.x), 0, cos(r.x));  // around Y
+    mat3 yaw = mat3(cos(r.y), sin(r.y), 0,  -sin(r.y), cos(r.y), 0,  0, 0, 1);  // around Z
+    mat3 roll = mat3(1, 0, 0,  0, cos(r.z), sin(r.z),  0, -sin(r.z), cos(r.z));  // around X
+    return yaw * pitch * roll;
+}
+
+void main()
+{
+    mat3 rotation = rotation_matrix(instance_rotation);
+    vec3 true_position = instance_position + rotation * (vertex_position * instance_scale);
+    position = true_position;
+    normal = rotation * vertex_normal;
+    uv = vec2(vertex_uv.x, -vertex_uv.y);
+    colour = vertex_colour * instance_tint;
+
+    Kd = dot(normal, vec3(.05, .35, .60)) / 3.0 + 0.5;
+
+    bool selected = (renderable_state.x & 1u) != 0u;  // SELECTED
+    bool hovered = (renderable_state.x & 2u) != 0u;  // HOVERED
+    highlight = vec4(selected ? vec3(renderable_state.yzw) / 255.0 : vec3(1),
+                     (selected ? 0.5 : 0.0) + (hovered ? 0.25 : 0.0));
+
+    gl_Position = view_projection * vec4(true_position, 1);
+}
@@ -0,0 +1,12 @@
+// render modes: flat
+precision highp int;  // slots & vertices can need more than 16 bits
+layout(location = 0) out uvec4 outId;  // renderable type + 1 (0 for nothing), slot, vertex; see render.picking
+
+flat in uvec2 id;
+
+uniform uint renderable_type;  // 1 + index into render.Manager.tables
+
+void main()
+{
+    outId = uvec4(renderable_type, id, 0);
+}
@@ -0,0 +1,20 @@
+layout(location = 0) in vec3 vertex_position;
+layout(location = 10) in uint renderable_slot;  // the draw's base instance, see render.View.bind_buffers
+
+layout(std140) uniform Camera  // shared by every program, see render.Manager.update_camera
+{
+    mat4 view;
+    mat4 projection;
+    mat4 view_projection;
+};
+
+uniform mat4 pick_matrix;  // crops clip space to the pixels around the cursor, see render.picking.pick_matrix
+
+flat out uvec2 id;  // slot, vertex
+
+void main()
+{
+    id = uvec2(renderable_slot, uint(gl_VertexID));
+    // ^ the provoking vertex's; faces don't share vertices, so it's enough to tell which face was hit
+    gl_Position = pick_matrix * view_projection * vec4(vertex_position, 1);
+}
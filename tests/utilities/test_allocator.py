@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from QtPyHammer.utilities.render.allocator import Allocator
+from QtPyHammer.utilities.render.manager import add_span, remove_span
+
+
+def coalesce(spans):
+    """merge touching spans, so different span lists covering the same bytes compare equal"""
+    out = []
+    for start, length in sorted(spans):
+        if len(out) > 0 and sum(out[-1]) == start:
+            out[-1] = (out[-1][0], out[-1][1] + length)
+        else:
+            out.append((start, length))
+    return out
+
+
+class TestAllocator:
+    def test_best_fit(self):
+        allocator = Allocator(100)
+        for start in (0, 10, 30, 40, 70):
+            allocator.reserve(start, 5)
+        # gaps: (5, 5), (15, 15), (35, 5), (45, 25), (75, 25)
+        assert allocator.allocate(12) == 15  # smallest gap that fits
+        assert allocator.allocate(5) == 5  # exact fit
+        assert allocator.allocate(30) is None
+
+    def test_alignment(self):
+        allocator = Allocator(100)
+        allocator.reserve(0, 3)
+        assert allocator.allocate(8, alignment=4) == 4
+        assert list(allocator.gaps()) == [(3, 1), (12, 88)]
+
+    def test_coalescing(self):
+        allocator = Allocator(30)
+        spans = [(allocator.allocate(10), 10) for i in range(3)]
+        assert list(allocator.gaps()) == []
+        allocator.free(*spans[0])
+        allocator.free(*spans[2])
+        assert list(allocator.gaps()) == [(0, 10), (20, 10)]
+        allocator.free(*spans[1])
+        assert list(allocator.gaps()) == [(0, 30)]
+        assert allocator.stats()["used"] == 0
+
+    def test_errors(self):
+        allocator = Allocator(10)
+        with pytest.raises(RuntimeError):
+            allocator.allocate(0)
+        with pytest.raises(RuntimeError):
+            allocator.free(0, 5)  # double free
+        allocator.reserve(2, 4)
+        with pytest.raises(RuntimeError):
+            allocator.reserve(4, 4)  # overlaps a used span
+
+    def test_stats(self):
+        allocator = Allocator(100)
+        allocator.reserve(50, 10)
+        stats = allocator.stats()
+        assert stats["used"] == 10
+        assert stats["free"] == 90
+        assert stats["gaps"] == 2
+        assert stats["largest_gap"] == 50
+        assert stats["fragmentation"] == pytest.approx(1 - 50 / 90)
+
+    def test_span_semantics(self):
+        """allocate & free must track the same bytes as add_span & remove_span"""
+        random.seed(0)
+        allocator = Allocator(4096)
+        span_list = []
+        live = []
+        for i in range(500):
+            if len(live) > 0 and random.random() < 0.4:
+                span = live.pop(random.randrange(len(live)))
+                allocator.free(*span)
+                span_list = remove_span(span_list, span)
+            else:
+                length = random.randint(1, 64)
+                start = allocator.allocate(length)
+                if start is None:
+                    continue
+                live.append((start, length))
+                span_list = add_span(span_list, (start, length))
+            assert list(allocator.spans()) == coalesce(span_list)
+
+    def test_grow(self):
+        allocator = Allocator(10)
+        allocator.reserve(0, 4)
+        allocator.grow(20)  # coalesces with the gap at the end
+        assert list(allocator.gaps()) == [(4, 16)]
+        allocator.reserve(4, 16)
+        allocator.grow(30)
+        assert list(allocator.gaps()) == [(20, 10)]
+        with pytest.raises(RuntimeError):
+            allocator.grow(10)
@@ -0,0 +1,160 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from QtPyHammer.utilities.obj import Obj
+from QtPyHammer.utilities.render import bufferize
+from QtPyHammer.utilities.render.vertex_format import formats
+
+
+no_uv = SimpleNamespace(vector=(0, 0, 0), offset=0, scale=1)  # like a vmf_tool TextureVector, maps all to 0
+
+
+class TestWeld:
+    def test_duplicates_merged(self):
+        corners = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0],
+                            [0, 1, 0], [1, 0, 0], [1, 1, 0]], dtype=np.float32)
+        vertices, indices = bufferize.weld(corners)
+        assert vertices.dtype == np.float32
+        assert indices.dtype == np.uint32
+        assert vertices.tolist() == [0, 0, 0, 1, 0, 0, 0, 1, 0, 1, 1, 0]
+        assert indices.tolist() == [0, 1, 2, 2, 1, 3]
+
+    def test_negative_zero(self):
+        corners = np.array([[0.0, 1.0], [-0.0, 1.0]], dtype=np.float32)
+        vertices, indices = bufferize.weld(corners)
+        assert indices.tolist() == [0, 0]
+
+
+class TestObjModel:
+    def test_quad(self):
+        quad = Obj("quad.obj", v=[(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)],
+                   vn=[(0, 0, 1)], vt=[], f=[[(0, 0, None), (1, 0, None), (2, 0, None), (3, 0, None)]],
+                   o={None: [0, 1]}, g={None: [0, 1]})
+        vertices, indices = bufferize.obj_model(quad)
+        assert vertices.dtype == formats["obj_model"].dtype
+        assert len(vertices) == 4
+        assert vertices[0]["position"].tolist() == [0, 0, 0]
+        assert vertices[0]["normal"] == 511 << 20  # (0, 0, 1)
+        assert vertices[0]["colour"].tolist() == [191, 191, 191, 255]
+        assert indices.tolist() == [0, 1, 2, 0, 2, 3]
+
+
+class TestDispIndices:
+    def test_shared(self):
+        indices = bufferize.disp_indices(4)
+        assert indices is bufferize.disp_indices(4)
+        assert not indices.flags.writeable
+
+    def test_length(self):
+        for power in (2, 3, 4):
+            indices = bufferize.disp_indices(power)
+            assert indices.dtype == np.uint32
+            assert len(indices) == (2 ** power) ** 2 * 2 * 3  # 2 triangles per quad
+            assert indices.max() == ((2 ** power) + 1) ** 2 - 1
+
+    def test_lods(self):
+        indices, level_lengths = bufferize.disp_lods(4)
+        assert level_lengths == (512 * 3, 160 * 3, 80 * 3, 64 * 3)
+        assert len(indices) == sum(level_lengths)
+        assert np.array_equal(indices[:level_lengths[0]], bufferize.disp_indices(4))
+        assert not indices.flags.writeable
+        edge = {i for i in range(17 ** 2) if i // 17 in (0, 16) or i % 17 in (0, 16)}
+        start = 0
+        for length in level_lengths:
+            level = indices[start:start + length].reshape(-1, 3)
+            start += length
+            rows, columns = level // 17, level % 17
+            ab_r, ab_c, ac_r, ac_c = rows[:, 1] - rows[:, 0], columns[:, 1] - columns[:, 0], \
+                rows[:, 2] - rows[:, 0], columns[:, 2] - columns[:, 0]
+            areas = (ab_r * ac_c - ab_c * ac_r) / 2
+            assert areas.min() > 0  # same winding as disp_indices, nothing degenerate
+            assert areas.sum() == 16 ** 2  # covers the whole displacement, without overlaps
+            assert edge <= set(level.flatten().tolist())  # every edge vertex is used, so neighbours stitch
+
+
+def test_translucent():
+    def brush(*materials):
+        return SimpleNamespace(faces=[SimpleNamespace(material=m) for m in materials])
+    assert bufferize.translucent(brush("TOOLS/TOOLSTRIGGER", "tools/toolstrigger"))
+    assert bufferize.translucent(brush("TOOLS/TOOLSHINT", "TOOLS/TOOLSSKIP"))
+    assert not bufferize.translucent(brush("TOOLS/TOOLSTRIGGER", "DEV/DEV_MEASUREGENERIC01"))
+    assert not bufferize.translucent(brush("TOOLS/TOOLSNODRAW"))  # drawn solid, like in Hammer
+    assert not bufferize.translucent(brush())
+
+
+def test_face_spans():
+    def face(_id, normal, *polygon):
+        return SimpleNamespace(id=_id, plane=(normal, 0), polygon=polygon, uaxis=no_uv, vaxis=no_uv)
+    quad = face(7, (0, 0, 1), (0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0))
+    triangle = face(9, (0, 1, 0), (0, 0, 0), (1, 0, 0), (0, 0, 1))
+    brush = SimpleNamespace(faces=[quad, triangle], colour=(1, 1, 1))
+    spans = bufferize.face_spans(brush)
+    assert spans == {7: (0, 6), 9: (6, 3)}
+    vertices, indices = bufferize.brush(brush)
+    assert len(indices) == 9
+    assert set(indices[6:9].tolist()).isdisjoint(indices[:6].tolist())  # faces don't share vertices
+
+
+def test_face_at():
+    def face(_id, normal, *polygon):
+        return SimpleNamespace(id=_id, plane=(normal, 0), polygon=polygon, uaxis=no_uv, vaxis=no_uv)
+    brush = SimpleNamespace(faces=[face(7, (0, 0, 1), (0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)),
+                                   face(9, (0, 1, 0), (0, 0, 0), (1, 0, 0), (0, 0, 1))], colour=(1, 1, 1))
+    vertices, indices, face_vertices = bufferize.brush_faces(brush)
+    assert face_vertices == {7: (0, 4), 9: (4, 3)}
+    assert indices.tolist() == bufferize.brush(brush)[1].tolist()
+    assert [bufferize.face_at(face_vertices, vertex) for vertex in range(7)] == [7, 7, 7, 7, 9, 9, 9]
+    assert bufferize.face_at(face_vertices, 7) is None
+
+
+def test_brush_batch():
+    def face(_id, normal, *polygon):
+        return SimpleNamespace(id=_id, plane=(normal, 0), polygon=polygon,
+                               uaxis=SimpleNamespace(vector=(1, 0, 0), offset=2, scale=0.5),
+                               vaxis=SimpleNamespace(vector=(0, -1, 0), offset=0, scale=0.25))
+    quad = SimpleNamespace(faces=[face(7, (0, 0, 1), (0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0))], colour=(1, 0, 0))
+    wedge = SimpleNamespace(faces=[face(8, (0, 0, 1), (0, 0, 0), (1, 0, 0), (0, 1, 0)),
+                                   face(9, (0, 1, 0), (0, 0, 0), (1, 0, 0), (0, 0, 1))], colour=(0, 1, 0))
+    batch = bufferize.brush_batch([quad, wedge])
+    # ^ brushes touching at (0, 0, 0), (1, 0, 0) & (0, 1, 0) with matching vertices, which must stay apart
+    for brush, (vertices, indices, face_vertices) in zip([quad, wedge], batch):
+        alone = bufferize.brush_faces(brush)
+        assert np.array_equal(vertices, alone[0])
+        assert indices.tolist() == alone[1].tolist()
+        assert face_vertices == alone[2]
+    vertices, indices, face_vertices = batch[0]
+    assert np.allclose(vertices["uv"], [(4, 0), (6, 0), (6, -4), (4, -4)])
+    # ^ (dot(position, axis.vector) + axis.offset) / axis.scale
+    assert indices.tolist() == [0, 1, 2, 0, 2, 3]
+    assert face_vertices == {7: (0, 4)}
+    assert batch[1][2] == {8: (0, 3), 9: (3, 3)}
+    assert bufferize.brush_batch([]) == []
+
+
+def test_brushes():
+    def face(_id, material, normal, *polygon):
+        return SimpleNamespace(id=_id, material=material, plane=(normal, 0), polygon=polygon,
+                               uaxis=no_uv, vaxis=no_uv)
+    wall = SimpleNamespace(id=1, faces=[face(7, "DEV/DEV_MEASUREGENERIC01", (0, 0, 1), (0, 0, 0), (1, 0, 0), (0, 1, 0))],
+                           colour=(1, 1, 1), is_displacement=False)
+    trigger = SimpleNamespace(id=2, faces=[face(9, "TOOLS/TOOLSTRIGGER", (0, 1, 0), (0, 0, 0), (1, 0, 0), (0, 0, 1))],
+                              colour=(1, 1, 1), is_displacement=False)
+    brush_data, displacement_data, translucent_ids, face_vertices = bufferize.brushes([wall, trigger])
+    assert list(brush_data) == [1, 2]
+    assert brush_data[1][1].tolist() == bufferize.brush(wall)[1].tolist()
+    assert displacement_data == dict()
+    assert translucent_ids == [2]
+    assert face_vertices == {1: {7: (0, 3)}, 2: {9: (0, 3)}}
+
+
+def test_smooth_normals():
+    columns, rows = np.meshgrid(np.arange(5, dtype=np.float64), np.arange(5, dtype=np.float64))
+    flat = np.stack([columns, rows, np.zeros_like(rows)], axis=-1)
+    assert np.allclose(bufferize.smooth_normals(flat, flat, (0, 0, 1)), (0, 0, 1))
+    assert np.allclose(bufferize.smooth_normals(flat, flat, (0, 0, -1)), (0, 0, -1))  # out is the face's way
+    slope = flat.copy()
+    slope[..., 2] = columns  # rises 1 unit per column
+    assert np.allclose(bufferize.smooth_normals(slope, flat, (0, 0, 1)), np.array([-1, 0, 1]) / np.sqrt(2))
+    pinched = np.zeros_like(flat)  # every vertex in one spot, no normal to find
+    assert np.allclose(bufferize.smooth_normals(pinched, flat, (0, 0, 1)), (0, 0, 1))
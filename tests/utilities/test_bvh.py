@@ -0,0 +1,96 @@
+import math
+import random
+
+import numpy as np
+
+from QtPyHammer.utilities.physics import AxisAlignedBoundingBox, Frustum
+from QtPyHammer.utilities.render.bvh import BoundingVolumeHierarchy
+
+
+def perspective(fov, aspect, near, far):
+    """column-major, like gluPerspective leaves in GL_MODELVIEW_MATRIX"""
+    f = 1 / math.tan(math.radians(fov) / 2)
+    matrix = np.array([[f / aspect, 0, 0, 0],
+                       [0, f, 0, 0],
+                       [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+                       [0, 0, -1, 0]])
+    return matrix.T
+
+
+def random_boxes(count):
+    random.seed(0)
+    boxes = dict()
+    for i in range(count):
+        mins = [random.uniform(-4096, 4096) for axis in range(3)]
+        maxs = [x + random.uniform(8, 256) for x in mins]
+        boxes[i] = AxisAlignedBoundingBox(mins, maxs)
+    return boxes
+
+
+def check_bounds(node):
+    """every branch must bound both of it's children"""
+    if node.is_leaf:
+        return
+    left, right = node.children
+    assert left.parent is node and right.parent is node
+    assert node.bounds == left.bounds + right.bounds
+    check_bounds(left)
+    check_bounds(right)
+
+
+def depth(node):
+    return 0 if node.is_leaf else 1 + max(depth(child) for child in node.children)
+
+
+class TestBoundingVolumeHierarchy:
+    frustum = Frustum.from_matrix(perspective(90, 1, 1, 4096))
+
+    def visible(self, boxes):
+        return {i for i, box in boxes.items() if self.frustum.classify(box) != Frustum.OUTSIDE}
+
+    def test_insert(self):
+        boxes = random_boxes(500)
+        bvh = BoundingVolumeHierarchy()
+        for item, box in boxes.items():
+            bvh.insert(item, box)
+        check_bounds(bvh.root)
+        assert len(bvh) == 500
+        assert set(bvh.query(self.frustum)) == self.visible(boxes)
+
+    def test_insert_many(self):
+        boxes = random_boxes(500)
+        bvh = BoundingVolumeHierarchy()
+        bvh.insert_many({i: boxes[i] for i in range(250)})
+        bvh.insert_many({i: boxes[i] for i in range(250, 500)})  # joins the existing tree
+        check_bounds(bvh.root)
+        assert set(bvh.query(self.frustum)) == self.visible(boxes)
+
+    def test_rebuild(self):
+        boxes = random_boxes(512)
+        bvh = BoundingVolumeHierarchy()
+        for start in range(0, 512, 8):  # streamed in as small batches, each joining the root
+            bvh.insert_many({i: boxes[i] for i in range(start, start + 8)})
+        assert depth(bvh.root) > 60
+        version = bvh.version
+        bvh.rebuild()
+        assert bvh.version > version
+        assert bvh.root.parent is None
+        check_bounds(bvh.root)
+        assert depth(bvh.root) == 9  # balanced, 2 ** 9 = 512 leaves
+        assert set(bvh.query(self.frustum)) == self.visible(boxes)
+
+    def test_remove(self):
+        boxes = random_boxes(500)
+        bvh = BoundingVolumeHierarchy()
+        bvh.insert_many(boxes)
+        version = bvh.version
+        for i in range(0, 500, 2):
+            bvh.remove(i)
+            del boxes[i]
+        assert bvh.version > version
+        check_bounds(bvh.root)
+        assert set(bvh.query(self.frustum)) == self.visible(boxes)
+        for i in list(boxes):
+            bvh.remove(i)
+        assert bvh.root is None
+        assert list(bvh.query(self.frustum)) == []
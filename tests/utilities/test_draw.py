@@ -0,0 +1,23 @@
+from QtPyHammer.utilities.render import draw
+
+
+class TestDotGrid:
+    def test_bounds(self):
+        points = list(draw.dot_grid_generator(0, -64, 128, 64, 64))
+        assert len(points) == 3 * 3
+        assert min(points) == (0, -64)
+        assert max(points) == (128, 64)
+
+    def test_vertices(self):
+        vertices = draw.dot_grid_vertices(-100, 0, 100, 256, 64)
+        points = [(int(x), int(y)) for x, y in vertices[:, :2]]
+        assert points == list(draw.dot_grid_generator(-100, 0, 100, 256, 64))
+        assert (vertices[:, 2] == 0).all()
+        assert (vertices[:, 3:] == .5).all()
+
+
+def test_origin_marker_vertices():
+    vertices = draw.origin_marker_vertices(128)
+    assert vertices.shape == (6, 6)
+    assert vertices[1].tolist() == [128, 0, 0, 1, 0, 0]
+    assert vertices[5].tolist() == [0, 0, 128, 0, 0, 1]
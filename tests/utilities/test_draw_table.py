@@ -0,0 +1,50 @@
+import numpy as np
+
+from QtPyHammer.utilities.render.draw_table import DrawTable, HOVERED, SELECTED
+
+
+class TestDrawTable:
+    def test_place(self):
+        table = DrawTable()
+        slot = table.place(("brush", 0), (8, 6), (56, 84), 28, 2)
+        assert slot == 0
+        assert table.rows[slot].tolist() == [8, 6, 2, 3, 2]  # vertices, not bytes
+        assert not table.visible[slot]  # until set_visible
+        assert table.place(("brush", 0), (0, 6), (0, 84), 28, 2) == slot  # moved, keeps it's slot
+        assert table.rows[slot, 0] == 0
+        assert ("brush", 0) in table and len(table) == 1
+
+    def test_slots_reused(self):
+        table = DrawTable()
+        for _id in range(100):  # more than the first 64 slots
+            table.place(("brush", _id), (_id * 8, 6), (_id * 84, 84), 28, 2)
+        assert len(table.renderables) == 128
+        table.remove(("brush", 10))
+        assert table.renderables[10] is None
+        assert table.place(("brush", 100), (800, 6), (8400, 84), 28, 2) == 10
+
+    def test_visible(self):
+        table = DrawTable()
+        for _id in range(3):
+            table.place(("brush", _id), (_id * 8, 6), (_id * 84, 84), 28, 2)
+        version = table.version
+        table.set_visible(table.slots_of([("brush", 0), ("brush", 2)]))
+        assert table.version == version + 1
+        assert table.spans() == [(0, 6), (16, 6)]
+        table.set_visible(np.array([0]), False)
+        assert table.spans() == [(16, 6)]
+        table.remove(("brush", 2))
+        assert table.spans() == []
+
+    def test_states(self):
+        table = DrawTable()
+        for _id in range(3):
+            table.place(("brush", _id), (_id * 8, 6), (_id * 84, 84), 28, 2)
+        table.set_state(np.array([0, 2]), SELECTED, tint=(255, 0, 0))
+        table.set_state(np.array([2]), HOVERED)
+        assert table.states[:3].tolist() == [[1, 255, 0, 0], [0, 0, 0, 0], [3, 255, 0, 0]]
+        assert table.changed_states == (0, 3)
+        table.changed_states = None
+        table.set_state(np.array([2]), SELECTED, False)
+        assert table.states[2].tolist() == [2, 255, 0, 0]  # still hovered
+        assert table.changed_states == (2, 3)
@@ -0,0 +1,35 @@
+import pytest
+
+from QtPyHammer.utilities.render.instances import Instances
+
+
+class TestInstances:
+    def test_add(self):
+        instances = Instances()
+        first = instances.add()
+        second = instances.add(position=(1, 2, 3), rotation=(0, 90, 0), scale=2, tint=(1, 0, 0))
+        assert len(instances) == 2
+        assert instances.data[instances.rows[first]].tolist() == [0, 0, 0, 0, 0, 0, 1, 1, 1, 1]
+        assert instances.data[instances.rows[second]].tolist() == [1, 2, 3, 0, 90, 0, 2, 1, 0, 0]
+        assert instances.dirty
+
+    def test_update(self):
+        instances = Instances()
+        instance_id = instances.add()
+        instances.dirty = False
+        instances.update(instance_id, position=(4, 5, 6))
+        assert instances.data[instances.rows[instance_id], :3].tolist() == [4, 5, 6]
+        assert instances.dirty
+        with pytest.raises(RuntimeError):
+            instances.update(instance_id, colour=(1, 1, 1))
+
+    def test_remove(self):
+        instances = Instances()
+        ids = [instances.add(position=(i, 0, 0)) for i in range(4)]
+        instances.remove(ids[1])  # last instance fills the gap
+        assert len(instances) == 3
+        assert instances.data[:, 0].tolist() == [0, 3, 2]
+        assert instances.rows == {ids[0]: 0, ids[3]: 1, ids[2]: 2}
+        instances.remove(ids[2])
+        instances.update(ids[3], position=(7, 0, 0))
+        assert instances.data[:, 0].tolist() == [0, 7]
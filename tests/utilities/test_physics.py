@@ -1,4 +1,6 @@
-from QtPyHammer.utilities.physics import AxisAlignedBoundingBox
+import numpy as np
+
+from QtPyHammer.utilities.physics import AxisAlignedBoundingBox, Frustum
 from QtPyHammer.utilities import vector
 
 
@@ -12,3 +14,15 @@ class TestAxisAlignedBoundingBox:
         aabb = AxisAlignedBoundingBox((-.5, -.5, 0), (0.5, 0.5, 2))
         result = AxisAlignedBoundingBox((-.5, -.5, 1), (0.5, 0.5, 3))
         assert aabb + vector.vec3(0, 0, 1) == result
+
+
+class TestFrustum:
+    def test_from_matrix(self):
+        frustum = Frustum.from_matrix(np.identity(4))  # clip space: a cube from -1 to +1
+        assert len(frustum.planes) == 6
+        inside = AxisAlignedBoundingBox((-.5, -.5, -.5), (.5, .5, .5))
+        intersects = AxisAlignedBoundingBox((.5, .5, .5), (1.5, 1.5, 1.5))
+        outside = AxisAlignedBoundingBox((2, 2, 2), (3, 3, 3))
+        assert frustum.classify(inside) == Frustum.INSIDE
+        assert frustum.classify(intersects) == Frustum.INTERSECTS
+        assert frustum.classify(outside) == Frustum.OUTSIDE
@@ -0,0 +1,31 @@
+import numpy as np
+
+from QtPyHammer.utilities.render.picking import closest_hit, pick_matrix, Picker
+
+
+def test_pick_matrix():
+    matrix = pick_matrix(10, 20, 100, 50, 5)
+    # the middle of pixel (10, 20) in clip space, moves to the middle of the pick framebuffer
+    centre = np.array([21 / 100 - 1, 41 / 50 - 1, 0.5, 1])
+    assert np.allclose(matrix @ centre, [0, 0, 0.5, 1], atol=1e-6)  # float32
+    corner = centre + np.array([5 / 100, 5 / 50, 0, 0])  # 2.5 pixels right & up, the edge of the region
+    assert np.allclose((matrix @ corner)[:2], [1, 1], atol=1e-6)
+
+
+class TestPicker:
+    def test_closest_hit(self):
+        ids = np.zeros((Picker.size, Picker.size, 4), dtype=np.uint32)
+        assert closest_hit(ids) is None
+        ids[0, 0] = (1, 7, 3, 0)
+        assert closest_hit(ids) == (1, 7, 3)  # nothing closer to the cursor
+        ids[1, 2] = (2, 5, 9, 0)
+        assert closest_hit(ids) == (2, 5, 9)
+        ids[2, 2] = (1, 8, 0, 0)
+        assert closest_hit(ids) == (1, 8, 0)  # right under the cursor
+
+    def test_requests(self):
+        picker = Picker()
+        assert len(picker) == 0
+        picker.request(3, 4, print)
+        assert len(picker) == 1  # keeps the viewport drawing until it's answered
+        assert picker.poll() == []  # nothing drawn yet
@@ -0,0 +1,60 @@
+import time
+
+from QtPyHammer.utilities.render.profiler import Profiler, format_stats, null_context, summarise
+
+
+class TestProfiler:
+    def test_disabled(self):
+        profiler = Profiler()
+        assert profiler.cpu("update") is null_context
+        assert profiler.gpu("brush") is null_context  # no GL calls while disabled
+        with profiler.cpu("update"):
+            pass
+        profiler.end_frame()
+        assert profiler.stats() == {"cpu": {}, "gpu": {}, "frame": summarise([])}
+
+    def test_cpu(self):
+        profiler = Profiler(history=2)
+        profiler.enable()
+        for i in range(3):
+            with profiler.cpu("update"):
+                time.sleep(0.002)
+            profiler.end_frame()
+        stats = profiler.stats()
+        assert list(stats["cpu"]) == ["update"]
+        assert len(profiler.cpu_times["update"]) == 2  # only history frames are kept
+        assert stats["cpu"]["update"]["mean"] >= 2
+        assert len(profiler.frame_times) == 2  # first end_frame only starts the clock
+        assert stats["frame"]["max"] >= stats["cpu"]["update"]["last"]
+
+    def test_idle(self):
+        profiler = Profiler()
+        profiler.enable()
+        profiler.end_frame()
+        profiler.idle()
+        time.sleep(0.01)
+        profiler.end_frame()  # restarts the clock, instead of recording the wait
+        assert len(profiler.frame_times) == 0
+
+    def test_enable_resets(self):
+        profiler = Profiler()
+        profiler.enable()
+        with profiler.cpu("draw"):
+            pass
+        profiler.enable(False)
+        assert "draw" in profiler.stats()["cpu"]  # stats are still readable while disabled
+        profiler.enable()
+        assert profiler.stats()["cpu"] == {}
+
+
+def test_summarise():
+    assert summarise([1.0, 3.0, 2.0]) == {"last": 2.0, "mean": 2.0, "max": 3.0}
+
+
+def test_format_stats():
+    stats = {"cpu": {"draw": summarise([1.0])}, "gpu": {"brush": summarise([0.5])}, "frame": summarise([20.0])}
+    lines = format_stats(stats).split("\n")
+    assert len(lines) == 3
+    assert "50 fps" in lines[0]
+    assert lines[1].startswith("cpu draw")
+    assert lines[2].startswith("gpu brush")
@@ -1,12 +1,345 @@
-# from PyQt5 import QtWidgets
+import concurrent.futures
+import os
+from types import SimpleNamespace
 
-# from QtPyHammer.utilities import render
+import numpy as np
+import OpenGL.GL as gl
+from PyQt5 import QtGui
+import pytest
+
+from QtPyHammer.utilities import render, transform
+from QtPyHammer.utilities.render import bufferize
+
+
+no_uv = SimpleNamespace(vector=(0, 0, 0), offset=0, scale=1)  # like a vmf_tool TextureVector, maps all to 0
 
 
 class TestRenderManager:
-    def test_init(self, qtbot):  # WIP
-        pass
-        # gl_widget = QtWidgets.QOpenGLWidget()
-        # render_manager = render.Manager(2048, 90, 256)
-        # gl_widget.initializeGL = render_manager.initialise("shaders")
-        # qtbot.addWidget(gl_widget)
+    def test_init(self, qapp):
+        context = QtGui.QOpenGLContext()
+        if not context.create():
+            pytest.skip("Couldn't create an OpenGL context")
+        surface = QtGui.QOffscreenSurface()
+        surface.setFormat(context.format())
+        surface.create()
+        assert context.makeCurrent(surface)
+        framebuffer = QtGui.QOpenGLFramebufferObject(64, 64, QtGui.QOpenGLFramebufferObject.CombinedDepthStencil)
+        framebuffer.bind()
+        version = (gl.glGetIntegerv(gl.GL_MAJOR_VERSION), gl.glGetIntegerv(gl.GL_MINOR_VERSION))
+        shader_version = "GLSL_450" if version >= (4, 5) else "GLES_300"
+        shader_folder = os.path.join(os.path.dirname(__file__), "../../shaders/glsl/")
+        render_manager = render.Manager(2048, 90, 256)
+        views = [render.View(render_manager) for i in range(2)]
+        for view in views:
+            view.initialise(shader_folder, shader_version)
+        for render_mode in ("flat", "textured", "flat"):
+            for view in views:  # both draw from the same buffers
+                view.set_render_mode(render_mode)
+                view.update()
+                view.draw()
+        assert gl.glGetError() == gl.GL_NO_ERROR
+        context.doneCurrent()
+
+    def test_draw_commands(self):
+        render_manager = render.Manager(2048, 90, 256)
+        view = render.View(render_manager)
+        indices = np.arange(3, dtype=np.uint32)
+        small, large = np.zeros((3, 11), dtype=np.float32), np.zeros((2 ** 16 + 1, 11), dtype=np.float32)
+        render_manager.add_renderables("brush", {0: (small, indices), 1: (small, indices), 2: (large, indices)})
+        assert render_manager.draw_calls["brush"] == [(0, 6), (8, 6), (16, 12)]
+        view.cull(np.identity(4))
+        commands = view.draw_commands("brush")
+        # (count, instance_count, first_index, base_vertex, base_instance)
+        assert commands[gl.GL_UNSIGNED_SHORT].tolist() == [[3, 1, 0, 0, 0], [3, 1, 4, 3, 1]]
+        # ^ indices stay local, each command says where it's vertices are; base_instance is the slot
+        assert commands[gl.GL_UNSIGNED_INT].tolist() == [[3, 1, 4, 6, 2]]  # too many vertices for uint16
+        assert view.draw_commands("brush") is commands  # cached
+        render_manager.hide(("brush", 0))
+        commands = view.draw_commands("brush")
+        assert commands[gl.GL_UNSIGNED_SHORT].tolist() == [[3, 1, 4, 3, 1]]
+
+    def test_draw_commands_without_base_vertex(self):
+        render_manager = render.Manager(2048, 90, 256, base_vertex=False)
+        view = render.View(render_manager)
+        vertices, indices = np.zeros((3, 11), dtype=np.float32), np.arange(3, dtype=np.uint32)
+        render_manager.add_renderables("brush", {0: (vertices, indices), 1: (vertices, indices)})
+        view.cull(np.identity(4))
+        commands = view.draw_commands("brush")
+        assert list(commands) == [gl.GL_UNSIGNED_INT]
+        assert commands[gl.GL_UNSIGNED_INT].tolist() == [[3, 1, 0, 0, 0], [3, 1, 3, 0, 1]]
+        # ^ indices already point past the vertices before them
+        assert render_manager.local_indices[("brush", 1)].tolist() == [0, 1, 2]  # kept for compaction to rebase
+        render_manager.remove(("brush", 1))
+        assert list(render_manager.local_indices) == [("brush", 0)]
+        assert render.Manager(2048, 90, 256).local_indices == dict()  # base vertex never rebases
+
+    def test_hide_many(self):
+        render_manager = render.Manager(2048, 90, 256)
+        view = render.View(render_manager)
+        vertices, indices = np.zeros((3, 11), dtype=np.float32), np.arange(3, dtype=np.uint32)
+        render_manager.add_renderables("brush", {_id: (vertices, indices) for _id in range(5000)})
+        brushes = [("brush", _id) for _id in range(5000)]
+        view.cull(np.identity(4))
+        assert len(view.draw_commands("brush")[gl.GL_UNSIGNED_SHORT]) == 5000
+        version = render_manager.tables["brush"].version
+        render_manager.hide(*brushes[::2])
+        assert render_manager.tables["brush"].version == version + 1  # one step, not one per brush
+        assert len(view.draw_commands("brush")[gl.GL_UNSIGNED_SHORT]) == 2500
+        render_manager.show(*brushes[::2])
+        assert len(view.draw_commands("brush")[gl.GL_UNSIGNED_SHORT]) == 5000
+
+    def test_buffer_growth(self):
+        render_manager = render.Manager(2048, 90, 1)  # 1MB, 500KB per buffer
+        render_manager.buffer_allocation_map["vertex"] = render.allocator.Allocator(44 * 10)
+        starts = render_manager.allocate("vertex", [44 * 8, 44 * 8], alignment=44)
+        assert starts == [0, 44 * 8]
+        assert render_manager.buffer_allocation_map["vertex"].size == 44 * 20  # doubled
+        assert render_manager.allocate("vertex", [render_manager.buffer_size_limit]) is None
+        assert render_manager.buffer_allocation_map["vertex"].size == render_manager.buffer_size_limit
+        assert render_manager.buffer_allocation_map["vertex"].used == 44 * 16  # failed allocation is undone
+
+    def test_deferred_for_compaction(self):
+        render_manager = render.Manager(2048, 90, 1)
+        limit = render_manager.buffer_size_limit
+        for buffer in ("vertex", "index"):  # fragment both buffers, leaving 2 gaps
+            allocator = render.allocator.Allocator(limit)
+            allocator.reserve(0, 4)
+            allocator.reserve(limit // 2, 4)
+            render_manager.buffer_allocation_map[buffer] = allocator
+        stride = render.vertex_format.formats["brush"].stride
+        vertices, indices = np.zeros((limit // 2 // stride + 1, 11), np.float32), np.arange(3, dtype=np.uint32)
+        render_manager.add_renderables("brush", {0: (vertices, indices)})
+        assert render_manager.compaction_pending
+        assert render_manager.deferred_renderables == [("brush", {0: (vertices, indices)})]
+        render_manager.add_renderables("brush", {1: (vertices[:33], indices)})
+        assert len(render_manager.deferred_renderables) == 2  # queued behind, to keep the order
+        render_manager.deferred_renderables = []
+        with pytest.raises(RuntimeError):  # more than could ever fit
+            render_manager.add_renderables("brush", {2: (np.zeros((limit // stride + 1, 11), np.float32), indices)})
+
+    def test_grow_then_compact(self, monkeypatch):
+        render_manager = render.Manager(90, 90, 20)  # 10MB per buffer, starting at 8MB
+        fits = []  # does each write land inside the buffer on the GPU?
+
+        def buffer_sub_data(target, start, length, data):
+            buffer = {t: b for b, t in render_manager.buffer_target.items()}[target]
+            fits.append(start + length <= render_manager.buffer_gpu_size[buffer])
+        for function in ("glBindBuffer", "glBufferData", "glCopyBufferSubData", "glDeleteBuffers"):
+            monkeypatch.setattr(gl, function, lambda *args: None)
+        monkeypatch.setattr(gl, "glGenBuffers", lambda count: 1)
+        monkeypatch.setattr(gl, "glBufferSubData", buffer_sub_data)
+        render_manager.state_buffer = {renderable_type: 1 for renderable_type in render_manager.tables}
+        stride = render.vertex_format.formats["brush"].stride
+        indices = np.arange(3, dtype=np.uint32)
+
+        def brush(megabytes):
+            return np.zeros((int(megabytes * 10 ** 6) // stride, 11), np.float32), indices
+        render_manager.add_renderables("brush", {0: brush(3), 1: brush(0.5), 2: brush(4)})
+        render_manager.update()
+        render_manager.remove(("brush", 1))
+        render_manager.add_renderables("brush", {3: brush(1)})  # grows the vertex buffer
+        render_manager.add_renderables("brush", {4: brush(2)})  # waits for compaction
+        render_manager.update()  # grows the GPU buffer, then compacts, in the same frame
+        assert render_manager.buffer_update_queue.bytes_pending == 0
+        assert len(fits) > 0 and all(fits)
+
+    def test_rebuild_draw_calls(self):
+        render_manager = render.Manager(2048, 90, 256)
+        render_manager.buffer_location = {("brush", 0): {"vertex": (0, 44), "index": (0, 12)},
+                                          ("brush", 1): {"vertex": (44, 44), "index": (12, 12)},
+                                          ("brush", 2): {"vertex": (88, 44), "index": (24, 12)},
+                                          ("displacement", (2, 5)): {"vertex": (132, 44), "index": (36, 12)},
+                                          ("obj_model", "a"): {"vertex": (176, 44), "index": (48, 12)}}
+        render_manager.dont_draw = {("brush", 1)}
+        render_manager.rebuild_draw_calls()
+        assert render_manager.draw_calls == {"brush": [(0, 12)], "displacement": [(36, 12)], "obj_model": [(48, 12)]}
+
+    def test_cull(self):
+        render_manager = render.Manager(2048, 90, 256)
+        vertices = np.zeros((3, 11), dtype=np.float32)
+        indices = np.arange(3, dtype=np.uint32)
+        near, far = vertices.copy(), vertices.copy()
+        near[:, :3] = [(0, 0, .1), (.1, 0, .1), (0, .1, .1)]
+        far[:, :3] = [(0, 0, 5), (.1, 0, 5), (0, .1, 5)]  # outside clip space
+        render_manager.add_renderables("brush", {0: (near, indices), 1: (far, indices)})
+        view, other_view = render.View(render_manager), render.View(render_manager)
+        view.cull(np.identity(4))
+        assert render_manager.draw_calls["brush"] == [(0, 6), (8, 6)]  # uint16 indices, 4 byte aligned
+        assert view.frustum_slots["brush"].tolist() == [0]
+        frustum = view.frustum_slots
+        view.cull(np.identity(4))
+        assert view.frustum_slots is frustum  # cached, nothing moved
+        other_view.cull(np.diag([.1, .1, .1, 1]))  # sees both brushes, without changing what view sees
+        assert other_view.frustum_slots["brush"].tolist() == [0, 1]
+        assert view.frustum_slots is frustum
+        render_manager.hide(("brush", 0))
+        view.cull(np.identity(4))
+        assert view.frustum_slots is frustum  # hiding doesn't need another cull
+        assert view.draw_commands("brush") == dict()
+
+    def test_translucent(self):
+        render_manager = render.Manager(2048, 90, 256)
+        view = render.View(render_manager)
+        indices = np.arange(3, dtype=np.uint32)
+        brushes = dict()
+        for _id, z in enumerate((.2, .1, .3)):
+            vertices = np.zeros((3, 11), dtype=np.float32)
+            vertices[:, :3] = [(0, 0, z), (.1, 0, z), (0, .1, z)]
+            brushes[_id] = (vertices, indices)
+        render_manager.translucent = {("brush", 0), ("brush", 2)}
+        render_manager.add_renderables("brush", brushes)
+        assert render_manager.draw_calls["brush"] == [(8, 6)]  # only the opaque brush
+        view.cull(np.identity(4))
+        assert set(view.frustum_translucent) == {("brush", 0), ("brush", 2)}
+        (index_type, commands), = view.translucent_draws()
+        assert index_type == gl.GL_UNSIGNED_SHORT
+        assert commands[:, 2].tolist() == [8, 0]  # back to front, from the camera at the origin
+        assert commands[:, 3].tolist() == [6, 0]
+        draws = view.translucent_draws()
+        assert view.translucent_draws() is draws  # camera hasn't moved
+        view.view_matrix = transform.translate(0, 0, -1)  # camera at z=1, between the brushes & the origin
+        assert view.translucent_draws()[0][1][:, 2].tolist() == [0, 8]
+        render_manager.hide(("brush", 0))
+        render_manager.show(("brush", 0))
+        assert render_manager.draw_calls["brush"] == [(8, 6)]  # still not opaque
+
+    @staticmethod
+    def triangle_brushes(count):
+        def face(_id):
+            return SimpleNamespace(id=_id, material="DEV/DEV_MEASUREGENERIC01", plane=((0, 0, 1), 0),
+                                   polygon=((0, 0, 0), (1, 0, 0), (0, 1, 0)), uaxis=no_uv, vaxis=no_uv)
+        return [SimpleNamespace(id=_id, faces=[face(_id)], colour=(1, 1, 1), is_displacement=False)
+                for _id in range(count)]
+
+    def test_bufferize_small_map(self):
+        brushes = self.triangle_brushes(70)
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            render_manager = render.Manager(2048, 90, 256, executor=executor)
+            render_manager.add_brushes(*brushes)  # starting workers would take longer than the whole map
+            assert render_manager.bufferizing == []
+            assert len(render_manager.buffer_location) == 70
+
+    def test_bufferize_in_background(self):
+        brushes = self.triangle_brushes(9)
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            render_manager = render.Manager(2048, 90, 256, executor=executor)
+            render_manager.bufferize_batch = 2
+            render_manager.add_brushes(brushes[0])
+            assert ("brush", 0) in render_manager.buffer_location  # a small edit is added right away
+            render_manager.add_brushes(*brushes[1:])
+            assert len(render_manager.bufferizing) == 4  # batches of 2
+            assert render_manager.busy
+            concurrent.futures.wait(render_manager.bufferizing)
+        render_manager.collect_bufferized()
+        assert render_manager.bufferizing == []
+        assert set(render_manager.buffer_location) == {("brush", _id) for _id in range(9)}
+        assert len(render_manager.tables["brush"]) == 9
+
+        def depth(node):
+            return 0 if node.is_leaf else 1 + max(depth(child) for child in node.children)
+        assert depth(render_manager.bvh.root) == 4  # rebuilt once the last batch arrived, not a spine of 5
+
+    def test_select(self):
+        render_manager = render.Manager(2048, 90, 256)
+        vertices, indices = np.zeros((3, 11), dtype=np.float32), np.arange(3, dtype=np.uint32)
+        render_manager.add_renderables("brush", {_id: (vertices, indices) for _id in range(100)})
+        table = render_manager.tables["brush"]
+        table.changed_states = None  # as if uploaded
+        render_manager.select(("brush", 10), ("brush", 20))
+        assert table.states[10].tolist() == [1, *render.Manager.selection_tint]
+        assert table.changed_states == (10, 21)  # only these bytes are uploaded again
+        render_manager.hover(("brush", 20))
+        render_manager.hover(("brush", 30))
+        assert table.states[20, 0] == 1 and table.states[30, 0] == 2  # SELECTED, HOVERED
+        render_manager.deselect(("brush", 10), ("brush", 20))
+        assert table.states[:, 0].nonzero()[0].tolist() == [30]
+        render_manager.remove(("brush", 30))
+        assert table.states[30].tolist() == [0, 0, 0, 0]  # the next renderable in that slot starts plain
+
+    def test_select_displaced(self):
+        render_manager = render.Manager(2048, 90, 256)
+        vertices, indices = np.zeros((3, 11), dtype=np.float32), np.arange(3, dtype=np.uint32)
+        render_manager.add_renderables("brush", {0: (vertices, indices), 1: (vertices, indices)})
+        render_manager.add_renderables("displacement", {(0, 1): (np.zeros((3, 9), np.float32), indices)})
+        render_manager.select(("brush", 0))
+        assert render_manager.tables["displacement"].states[0, 0] == 1  # drawn in place of it's brush
+
+    def test_face_draws(self):
+        render_manager = render.Manager(2048, 90, 256)
+        view = render.View(render_manager)
+        vertices, indices = np.zeros((4, 11), dtype=np.float32), np.array([0, 1, 2, 0, 2, 3], dtype=np.uint32)
+        render_manager.add_renderables("brush", {0: (vertices, indices), 1: (vertices, indices)})
+        view.cull(np.identity(4))
+        assert view.face_draws() == []
+        render_manager.select_faces(("brush", 1), [(3, 3)])  # the 2nd triangle
+        (index_type, commands), = view.face_draws()
+        assert commands.tolist() == [[3, 1, 6 + 3, 4, 1]]  # brush 1's indices start at byte 12
+        assert view.face_draws() is view.face_draws()  # cached
+        render_manager.hide(("brush", 1))
+        assert view.face_draws() == []
+        render_manager.show(("brush", 1))
+        render_manager.deselect_faces(("brush", 1))
+        assert view.face_draws() == []
+
+    def test_resolve_pick(self):
+        render_manager = render.Manager(2048, 90, 256)
+        view = render.View(render_manager)
+        vertices, indices = np.zeros((3, 11), dtype=np.float32), np.arange(3, dtype=np.uint32)
+        render_manager.add_renderables("brush", {0: (vertices, indices), 1: (vertices, indices)})
+        ids = np.zeros((5, 5, 4), dtype=np.uint32)
+        assert view.resolve_pick(ids) == render.picking.Pick(None, None)
+        ids[2, 2] = (1, 1, 4, 0)  # brushes, slot 1, the 2nd vertex of brush 1 (after brush 0's 3)
+        assert view.resolve_pick(ids) == render.picking.Pick(("brush", 1), 1)
+        render_manager.face_vertices[("brush", 1)] = {7: (0, 1), 9: (1, 2)}
+        assert view.resolve_pick(ids).face == 9  # without bufferizing the brush again
+        render_manager.remove(("brush", 1))
+        assert view.resolve_pick(ids).renderable is None  # removed before the pick was read back
+
+    def test_level_of_detail(self):
+        render_manager = render.Manager(2048, 90, 256)
+        view = render.View(render_manager)
+        indices, level_lengths = bufferize.disp_lods(2)
+        brush = (np.zeros((3, 11), dtype=np.float32), np.arange(3, dtype=np.uint32))
+        render_manager.add_renderables("brush", {_id: brush for _id in range(3)})  # displacements replace a brush
+        displacements = dict()
+        for _id, x in enumerate((0, 3000, 5000)):  # lod_distance is 1024, so full, half & quarter resolution
+            vertices = np.zeros((25, 9), dtype=np.float32)
+            vertices[:, 0] = x
+            displacements[(_id, 0)] = (vertices, indices)
+        render_manager.add_renderables("displacement", displacements)
+        view.cull(np.diag([1e-4, 1e-4, 1e-4, 1]))  # sees everything
+        commands = view.draw_commands("displacement")[gl.GL_UNSIGNED_SHORT]
+        counts, first_indices = commands[:, 0], commands[:, 2]
+        assert counts.tolist() == [level_lengths[0], level_lengths[1], level_lengths[1]]  # power 2 has 2 levels
+        span = len(indices)
+        assert (first_indices - first_indices[0]).tolist() == [0, span + level_lengths[0], span * 2 + level_lengths[0]]
+        assert view.draw_commands("displacement")[gl.GL_UNSIGNED_SHORT] is commands  # camera hasn't moved
+        view.view_matrix = transform.translate(-5000, 0, 0)
+        counts = view.draw_commands("displacement")[gl.GL_UNSIGNED_SHORT][:, 0]
+        assert counts.tolist() == [level_lengths[1], level_lengths[0], level_lengths[0]]
+
+    def test_on_change(self):
+        render_manager = render.Manager(2048, 90, 256)
+        changes, other_changes = list(), list()
+        view, other_view = render.View(render_manager), render.View(render_manager)
+        view.on_change = lambda: changes.append(view.busy)
+        other_view.on_change = lambda: other_changes.append(other_view.busy)
+        vertices, indices = np.zeros((3, 11), dtype=np.float32), np.arange(3, dtype=np.uint32)
+        render_manager.add_renderables("brush", {0: (vertices, indices)})
+        assert changes == [True]  # uploads are waiting for the next update
+        render_manager.hide(("brush", 0))
+        render_manager.show(("brush", 0))
+        instance_id = render_manager.add_instance(("obj_model", "a"))
+        render_manager.update_instance(("obj_model", "a"), instance_id, scale=2)
+        render_manager.remove(("brush", 0))
+        assert len(changes) == 6
+        assert other_changes == changes  # every view of the map repaints
+
+
+def test_merge_spans():
+    assert render.manager.merge_spans([(10, 5), (0, 10), (20, 5), (22, 1)]) == [(0, 15), (20, 5)]
+
+
+def test_merge_moves():
+    moves = [(100, 0, 10), (110, 10, 10), (130, 20, 10)]
+    assert render.manager.merge_moves(moves) == [(100, 0, 20), (130, 20, 10)]
@@ -0,0 +1,13 @@
+from QtPyHammer.utilities.render.shader_cache import ProgramCache
+
+
+def test_key():
+    cache = ProgramCache()
+    cache.driver = b"vendor|renderer|version"
+    vertex, fragment = (b"void main() {}", 0x8B31), (b"void main() {}", 0x8B30)
+    assert cache.key([vertex, fragment]) == cache.key([vertex, fragment])
+    assert cache.key([vertex, fragment]) != cache.key([fragment, vertex])  # stage types are part of the key
+    assert cache.key([vertex]) != cache.key([(b"void main() { }", 0x8B31)])
+    other_driver = ProgramCache()
+    other_driver.driver = b"vendor|renderer|newer version"
+    assert cache.key([vertex]) != other_driver.key([vertex])
@@ -0,0 +1,34 @@
+import os
+
+import OpenGL.GL as gl
+import pytest
+
+from QtPyHammer.utilities.render.shader_cache import ProgramCache
+from QtPyHammer.utilities.render.shaders import ShaderLibrary
+
+
+shader_folder = os.path.join(os.path.dirname(__file__), "../../shaders/glsl/")
+
+
+class TestShaderLibrary:  # nothing here needs an OpenGL context, programs are only compiled on request
+    def test_discover(self):
+        library = ShaderLibrary(shader_folder, "GLSL_450", ProgramCache())
+        assert library.render_modes["brush"] == {"flat", "stripey", "textured"}
+        assert library.render_modes["helper"] == {"flat"}
+        assert library.programs == dict()
+
+    def test_variant(self):
+        library = ShaderLibrary(shader_folder, "GLSL_450", ProgramCache())
+        assert library.variant("stripey", "brush") == "stripey"
+        assert library.variant("stripey", "displacement") == "flat"  # no stripey displacements
+
+    def test_stage(self):
+        library = ShaderLibrary(shader_folder, "GLES_300", ProgramCache())
+        lines = library.stage("brush.frag", gl.GL_FRAGMENT_SHADER, "textured").decode().split("\n")
+        assert lines[:4] == ["#version 300 es", "precision mediump float;", "#define TEXTURED", "#line 1"]
+
+    def test_missing_render_modes(self, tmp_path):
+        for filename in ("brush.vert", "brush.frag"):
+            (tmp_path / filename).write_text("void main() {}\n")
+        with pytest.raises(RuntimeError):
+            ShaderLibrary(str(tmp_path), "GLSL_450", ProgramCache())
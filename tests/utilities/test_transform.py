@@ -0,0 +1,84 @@
+import numpy as np
+
+from QtPyHammer.utilities import camera
+from QtPyHammer.utilities import transform
+from QtPyHammer.utilities import vector
+
+
+def test_cached_matrix():
+    calls = list()
+
+    def build(x):
+        calls.append(x)
+        return transform.translate(x, 0, 0)
+
+    cached = transform.CachedMatrix(build)
+    first = cached(1)
+    assert cached(1) is first  # not rebuilt
+    assert not first.flags.writeable
+    assert cached(2)[0, 3] == 2
+    assert calls == [1, 2]
+
+
+def test_rotate():
+    quarter_turn = transform.rotate(90, 0, 0, 1)
+    np.testing.assert_allclose(quarter_turn @ [1, 0, 0, 1], [0, 1, 0, 1], atol=1e-6)  # counter-clockwise
+    np.testing.assert_allclose(transform.rotate(90, 0, 0, 2), quarter_turn, atol=1e-6)  # axis is normalised
+
+
+def test_translate():
+    assert (transform.translate(1, 2, 3) @ [1, 1, 1, 1]).tolist() == [2, 3, 4, 1]
+
+
+def test_perspective():
+    projection = transform.perspective(90, 2, 1, 100)
+    np.testing.assert_allclose(transform.transform_point(projection, (0, 0, -1)), [0, 0, -1], atol=1e-6)
+    np.testing.assert_allclose(transform.transform_point(projection, (0, 0, -100)), [0, 0, 1], atol=1e-6)
+    np.testing.assert_allclose(transform.transform_point(projection, (2, 1, -1)), [1, 1, -1], atol=1e-6)
+    # ^ edges of the view, 90 degrees vertically & stretched by aspect horizontally
+
+
+def test_column_major():
+    matrix = np.arange(16).reshape(4, 4)
+    assert transform.column_major(matrix).flatten().tolist()[:4] == [0, 4, 8, 12]
+
+
+class TestCameraMatrices:
+    def test_freecam(self):
+        view = camera.freecam((0, 0, 0), (0, 0, 0)).view_matrix()
+        np.testing.assert_allclose(view @ [0, 10, 0, 1], [0, 0, -10, 1], atol=1e-5)  # Y+ is forward
+        view = camera.freecam((0, -64, 0), (0, 0, 90)).view_matrix()
+        np.testing.assert_allclose(view @ [10, -64, 0, 1], [0, 0, -10, 1], atol=1e-5)  # turned to face X+
+
+    def test_cached(self):
+        freecam = camera.freecam((0, 0, 0), (0, 0, 0))
+        view = freecam.view_matrix()
+        assert freecam.view_matrix() is view
+        freecam.rotation.z += 10  # vec3s are changed in place, the cache still notices
+        assert freecam.view_matrix() is not view
+
+    def test_basis(self):
+        freecam = camera.freecam((0, 0, 0), (30, 0, 45))
+        right, up, forward = freecam.basis()
+        for axis, expected in zip((right, up, forward), (vector.vec3(x=1), vector.vec3(z=1), vector.vec3(y=1))):
+            np.testing.assert_allclose([*axis], [*expected.rotate(*-freecam.rotation)], atol=1e-5)
+            # ^ same axes the old trig based raycast used
+
+    def test_update(self, monkeypatch):
+        monkeypatch.setitem(camera.keybinds, camera.FORWARD, ["w"])  # restored afterwards, even if an assert fails
+        freecam = camera.freecam((0, 0, 0), (0, 0, 90), speed=2)
+        view = freecam.view_matrix()
+        freecam.update(vector.vec2(), set(), 1)
+        assert freecam.view_matrix() is view  # standing still doesn't rebuild the view
+        freecam.update(vector.vec2(), {"w"}, 1)
+        np.testing.assert_allclose([*freecam.position], [2, 0, 0], atol=1e-5)
+
+    def test_firstperson(self):
+        first = camera.firstperson((15, 0, 30)).view_matrix(camera.vector.vec3(1, 2, 3))
+        free = camera.freecam((1, 2, 3), (15, 0, 30)).view_matrix()
+        np.testing.assert_allclose(first, free, atol=1e-5)
+
+    def test_thirdperson(self):
+        thirdperson = camera.thirdperson((1, 2, 3), (-90, 0, 0), 64)
+        x, y, z, w = thirdperson.view_matrix() @ [1, 2, 3, 1]
+        assert np.isclose(np.linalg.norm([x, y, z]), 64)  # orbits position at radius
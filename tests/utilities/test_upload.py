@@ -0,0 +1,37 @@
+import numpy as np
+
+from QtPyHammer.utilities.render import upload
+
+
+class TestUploadScheduler:
+    def uploads(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(upload.gl, "glBufferSubData",
+                            lambda target, start, length, data: calls.append((target, start, length, bytes(data))))
+        return calls
+
+    def test_merge(self, monkeypatch):
+        calls = self.uploads(monkeypatch)
+        scheduler = upload.UploadScheduler()
+        a = np.arange(4, dtype=np.uint32)
+        b = np.arange(4, 8, dtype=np.uint32)
+        scheduler.append((1, 0, a.nbytes, a))
+        scheduler.append((1, a.nbytes, b.nbytes, b))  # contiguous, merged
+        scheduler.append((2, 0, a.nbytes, a))  # another buffer
+        assert len(scheduler) == 2
+        assert scheduler.progress().bytes_pending == 48
+        scheduler.flush()
+        assert calls == [(1, 0, 32, np.arange(8, dtype=np.uint32).tobytes()), (2, 0, 16, a.tobytes())]
+        assert scheduler.progress() == (0, 48, 0.0)
+
+    def test_budget(self, monkeypatch):
+        calls = self.uploads(monkeypatch)
+        scheduler = upload.UploadScheduler(budget=0)
+        data = np.zeros(scheduler.minimum_chunk * 3, dtype=np.uint8)
+        scheduler.append((1, 0, data.nbytes, data))
+        scheduler.drain()  # no time to spare, but always uploads at least one chunk
+        assert len(calls) == 1
+        assert calls[0][2] == scheduler.minimum_chunk
+        assert scheduler.progress().bytes_pending == scheduler.minimum_chunk * 2
+        scheduler.drain()
+        assert calls[1][1] == scheduler.minimum_chunk  # picks up where it left off
@@ -0,0 +1,32 @@
+import numpy as np
+
+from QtPyHammer.utilities.render import vertex_format
+from QtPyHammer.utilities.render.vertex_format import formats
+
+
+def test_strides():
+    assert formats["brush"].stride == 28
+    assert formats["displacement"].stride == 28
+    assert formats["obj_model"].stride == 24  # vs. 44 bytes for 11 floats
+
+
+def test_pack_normals():
+    packed = vertex_format.pack_normals(np.array([(1, 0, 0), (0, -1, 0), (0, 0, 0.5)]))
+    assert packed.tolist() == [511, (-511 & 0x3FF) << 10, 256 << 20]
+
+
+def test_pack():
+    row = [1, 2, 3, 0, 0, 1, .5, .25, 1, 0, .5]  # (*position, *normal, *uv, *colour)
+    vertices = formats["brush"].pack([row, row])
+    assert len(vertices) == 2
+    assert vertices[0]["position"].tolist() == [1, 2, 3]
+    assert vertices[0]["uv"].tolist() == [.5, .25]
+    assert vertices[0]["colour"].tolist() == [255, 0, 128, 255]  # alpha padded to opaque
+    assert formats["brush"].vertices(vertices) is not None
+    assert formats["brush"].vertices(vertices).dtype == formats["brush"].dtype  # already packed
+
+
+def test_half_float_uvs():
+    vertices = formats["obj_model"].pack([[0, 0, 0, 0, 0, 1, 1 / 3, 2, 0, 0, 0]])
+    assert vertices["uv"].dtype == np.float16
+    assert np.allclose(vertices[0]["uv"], [1 / 3, 2], atol=1e-3)